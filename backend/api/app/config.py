@@ -27,6 +27,10 @@ class Settings(BaseSettings):
         """Construct SQL Server connection string"""
         return f"mssql+pyodbc://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_SERVER}:{self.DB_PORT}/{self.DB_NAME}?driver=ODBC+Driver+17+for+SQL+Server"
     
+    # Read replicas (SQLAlchemy URLs; empty = every read goes to the primary)
+    DATABASE_READ_URLS: List[str] = []
+    READ_YOUR_WRITES_SECONDS: int = 10  # a client that wrote reads from the primary this long
+
     # RabbitMQ
     RABBITMQ_HOST: str = "localhost"
     RABBITMQ_PORT: int = 5672
@@ -38,6 +42,12 @@ class Settings(BaseSettings):
     def RABBITMQ_URL(self) -> str:
         """Construct RabbitMQ connection URL"""
         return f"amqp://{self.RABBITMQ_USER}:{self.RABBITMQ_PASSWORD}@{self.RABBITMQ_HOST}:{self.RABBITMQ_PORT}/{self.RABBITMQ_VHOST}"
+
+    # Publisher confirms (one long-lived confirm-mode connection instead of connect/publish/close)
+    RABBITMQ_PUBLISHER_CONFIRMS: bool = False
+    RABBITMQ_CONFIRM_MAX_IN_FLIGHT: int = 1000  # unconfirmed messages before publish() blocks
+    RABBITMQ_CONFIRM_MAX_RETRIES: int = 3  # republishes of a nacked message
+    RABBITMQ_CONFIRM_BLOCK_SECONDS: float = 1.0  # how long publish() waits for a free slot
     
     # Security & JWT
     SECRET_KEY: str = "your-secret-key-change-in-production"
@@ -54,7 +64,44 @@ class Settings(BaseSettings):
     SMTP_PORT: int = 587
     SMTP_USER: str = "your-email@gmail.com"
     SMTP_PASSWORD: str = "your-app-password"
+    SMTP_FROM: str = "Distribuidora Perros y Gatos <no-reply@example.com>"
+    SMTP_TIMEOUT_SECONDS: float = 30.0
+
+    # Event encoding (app.events)
+    EVENT_CONTENT_TYPE: str = "application/json"  # or "application/msgpack" (needs msgpack installed)
+    EVENT_COMPRESS_MIN_BYTES: int = 8192  # gzip larger bodies; 0 disables (JSON-only queues never are)
+
+    # Consumer runtime (carrusel.* queues; in-process or python -m app.consumers)
+    CONSUMER_IN_PROCESS: bool = False
+    CONSUMER_PREFETCH: int = 100  # unacked deliveries per round
+    CONSUMER_CONCURRENCY: int = 8  # handlers running at once
+    CONSUMER_MAX_WAIT_SECONDS: float = 0.5  # a round closes after this long even if not full
+    CONSUMER_MAX_RETRIES: int = 3  # then the message goes to <queue>.dlq
+
+    # Email dispatcher (email.verification consumer)
+    EMAIL_BATCH_SIZE: int = 50  # messages coalesced per SMTP session (also the prefetch)
+    EMAIL_BATCH_MAX_WAIT_SECONDS: float = 2.0  # a partial batch is sent after this long
+    EMAIL_RESEND_DEDUPE_SECONDS: int = 120  # same address + same code within this window is sent once
     
+    # Response compression (gzip, plus br when the brotli package is installed)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_BYTES: int = 1024  # smaller bodies go out as they are
+    COMPRESSION_GZIP_LEVEL: int = 6  # per-request compression; cached payloads use the maximum
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # Catalog response caches (carousel, categories, product browsing, /api/home/bundle)
+    CATALOG_CACHE_TTL_SECONDS: int = 30
+    CATALOG_CACHE_MAX_ENTRIES: int = 256  # per cache (one entry per filter/page combination)
+    CATALOG_CACHE_STALE_SECONDS: int = 300  # expired pages still served while one refresh runs
+    CATALOG_CACHE_NEGATIVE_TTL_SECONDS: int = 5  # a failed load is re-raised for this long
+
+    # Idempotency-Key for retried writes (per-process store of responses)
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_TTL_SECONDS: int = 86400  # how long a key's response is replayed
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000
+    IDEMPOTENCY_WAIT_SECONDS: float = 30  # duplicates wait this long for the first request, then 409
+    IDEMPOTENCY_MAX_BODY_BYTES: int = 1048576  # larger responses are not stored
+
     # File Upload
     UPLOAD_DIR: str = "./uploads"
     MAX_FILE_SIZE: int = 10485760  # 10 MB
@@ -63,7 +110,54 @@ class Settings(BaseSettings):
     # Rate Limiting
     MAX_LOGIN_ATTEMPTS: int = 5
     LOGIN_LOCKOUT_DURATION_MINUTES: int = 15
-    
+    RESTOCK_RATE_LIMIT: int = 10  # per product
+    RESTOCK_RATE_WINDOW_SECONDS: int = 3600
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (single replica) or "sql" (shared)
+
+    # Inventory reservations
+    INVENTORY_RESERVATION_TTL_SECONDS: int = 900  # 15 min
+    INVENTORY_RESERVATION_SWEEP_SECONDS: int = 60
+    INVENTORY_RESERVATION_BATCH_SIZE: int = 400  # products per UPDATE; capped at 400 (5 params each, SQL Server allows 2100)
+
+    # Inventory history journal (write-behind)
+    INVENTORY_JOURNAL_DIR: str = "./data/inventory-journal"
+    INVENTORY_JOURNAL_BATCH_SIZE: int = 200
+    INVENTORY_JOURNAL_FLUSH_SECONDS: float = 2.0
+    INVENTORY_JOURNAL_STALE_SECONDS: float = 60.0  # WAL files untouched this long belong to a dead process
+
+    # Cart engine (hot tier + debounced persistence to Carts/CartItems)
+    CART_RESERVE_STOCK: bool = True  # cart mutations hold stock (reservation_service.hold)
+    CART_BACKEND: str = "memory"  # "memory" (sticky sessions) or "sql" (CartSnapshots shared by replicas)
+    CART_FLUSH_INTERVAL_SECONDS: float = 10.0
+    CART_FLUSH_DEBOUNCE_SECONDS: float = 30.0  # persist once a cart has been quiet this long
+    CART_FLUSH_MAX_DELAY_SECONDS: float = 300.0  # ...or has been dirty this long
+    CART_IDLE_TTL_SECONDS: int = 3600  # clean carts are dropped from memory after this
+
+    # Order statistics (PedidosEstadisticas counters)
+    ORDER_STATS_RECONCILE_SECONDS: int = 3600
+    ORDER_STATS_RECONCILE_DAYS: int = 7  # recent days recomputed from Pedidos by each reconciliation
+    USER_STATS_REBUILD_SECONDS: int = 86400  # full recompute of UsuariosEstadisticas
+
+    # Order export (streamed CSV/JSON Lines)
+    ORDER_EXPORT_CHUNK_SIZE: int = 1000  # rows fetched per round trip from the server-side cursor
+
+    # Archival of cold history (moved to the *Archivo tables)
+    ARCHIVE_HORIZON_DAYS: int = 365  # rows older than this leave the hot tables
+    ARCHIVE_BATCH_SIZE: int = 1000
+    ARCHIVE_INTERVAL_SECONDS: int = 3600
+
+    # Admin user search (UsuariosBusqueda / UsuariosTrigramas)
+    USER_SEARCH_REFRESH_SECONDS: int = 60  # picks up users written outside the API
+    USER_SEARCH_BATCH_SIZE: int = 500
+
+    # Email verification codes (hot store + VerificationCodes)
+    VERIFICATION_CODE_TTL_SECONDS: int = 600  # 10 min
+    VERIFICATION_MAX_ATTEMPTS: int = 5  # wrong codes per email within the TTL
+    VERIFICATION_STORE_BACKEND: str = "memory"  # "memory" (cache over the table) or "sql" (table only)
+    VERIFICATION_STORE_MAX_ENTRIES: int = 10000
+    VERIFICATION_PURGE_SECONDS: int = 600
+    VERIFICATION_PURGE_BATCH_SIZE: int = 500
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,18 @@
+"""
+__init__.py for consumers package
+RabbitMQ consumers that run next to the API (or from their own entry point)
+"""
+from app.consumers.runtime import consumer_runtime, ConsumerRuntime, QueueConsumer, Delivery
+from app.consumers.email_dispatcher import email_dispatcher, EmailDispatcher, SMTPTransport
+# Registers the carrusel.imagen.* handlers on consumer_runtime
+from app.consumers import carousel  # noqa: F401
+
+__all__ = [
+    'consumer_runtime',
+    'ConsumerRuntime',
+    'QueueConsumer',
+    'Delivery',
+    'email_dispatcher',
+    'EmailDispatcher',
+    'SMTPTransport',
+]
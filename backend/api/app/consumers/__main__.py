@@ -0,0 +1,14 @@
+"""
+Standalone consumer process: python -m app.consumers
+"""
+import asyncio
+import logging
+
+from app.consumers import consumer_runtime
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(consumer_runtime.run())
+    except KeyboardInterrupt:
+        pass
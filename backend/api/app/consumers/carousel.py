@@ -0,0 +1,81 @@
+"""
+Handlers for the carrusel.imagen.* queues
+The API has already committed each change when it publishes, so handlers only do the
+follow-up work: removing files of deleted images and closing gaps in `orden`.
+Reorder events carry a full snapshot, so a burst of them collapses to the newest.
+"""
+from typing import Any, Dict
+import logging
+import os
+
+from app import database
+from app.config import settings
+from app.consumers.runtime import consumer_runtime, keep_latest
+from app.models import CarruselImagen
+
+logger = logging.getLogger(__name__)
+
+
+def _remove_upload(path: str) -> None:
+    """Delete a file only if it lives under UPLOAD_DIR"""
+    if not path:
+        return
+    root = os.path.abspath(settings.UPLOAD_DIR)
+    path = os.path.abspath(path)
+    if os.path.commonpath([root, path]) != root:
+        logger.warning(f"Refusing to delete file outside {root}: {path}")
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@consumer_runtime.handler("carrusel.imagen.crear")
+def on_image_created(message: Dict[str, Any]) -> None:
+    logger.info(f"Carousel image created: {message['payload'].get('imagenPath')}")
+
+
+@consumer_runtime.handler("carrusel.imagen.actualizar")
+def on_image_updated(message: Dict[str, Any]) -> None:
+    logger.info(f"Carousel image {message['payload'].get('id')} updated")
+
+
+@consumer_runtime.handler("carrusel.imagen.eliminar")
+def on_image_deleted(message: Dict[str, Any]) -> None:
+    """Remove the files of a deactivated image (idempotent)"""
+    db = database.SessionLocal()
+    try:
+        img = db.get(CarruselImagen, message["payload"]["id"])
+        if img is None or img.activo:
+            return
+        _remove_upload(img.imagen_url)
+        _remove_upload(img.thumbnail_url)
+    finally:
+        db.close()
+
+
+@consumer_runtime.handler("carrusel.imagen.reordenar", coalesce=keep_latest)
+def on_images_reordered(message: Dict[str, Any]) -> None:
+    """Renumber active images 1..n in their current order (repairs gaps left by partial reorders)"""
+    db = database.SessionLocal()
+    try:
+        activas = (
+            db.query(CarruselImagen)
+            .filter(CarruselImagen.activo == True)  # noqa: E712
+            .order_by(CarruselImagen.orden.asc(), CarruselImagen.id.asc())
+            .all()
+        )
+        cambios = 0
+        for orden, img in enumerate(activas, start=1):
+            if img.orden != orden:
+                img.orden = orden
+                cambios += 1
+        if cambios:
+            db.commit()
+            logger.info(f"Renumbered {cambios} carousel images")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
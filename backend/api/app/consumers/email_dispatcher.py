@@ -0,0 +1,196 @@
+"""
+email.verification dispatcher
+Python counterpart of the worker's email consumer. Messages are pulled in batches
+(up to EMAIL_BATCH_SIZE, or whatever arrived within EMAIL_BATCH_MAX_WAIT_SECONDS),
+coalesced, and sent over a single SMTP session per batch; the batch is then acked
+with one multiple-ack. Coalescing keeps only the newest code per address (older ones
+were already replaced by the API) and drops a resend of the same code to the same
+address within EMAIL_RESEND_DEDUPE_SECONDS.
+
+Run with: python -m app.consumers.email_dispatcher
+"""
+from collections import OrderedDict
+from email.message import EmailMessage
+from typing import Dict, List, Optional, Tuple
+import html
+import logging
+import smtplib
+import time
+
+import pika
+
+from app import events
+from app.config import settings
+from app.events import EMAIL_VERIFICATION_QUEUE, EmailVerificationEvent
+
+logger = logging.getLogger(__name__)
+
+# Per-recipient rejections: the message is dropped, the session and the batch go on
+_RECIPIENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+
+class SMTPTransport:
+    """Sends a list of messages over one SMTP session"""
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, user: Optional[str] = None,
+                 password: Optional[str] = None, timeout: Optional[float] = None):
+        self.host = host or settings.SMTP_SERVER
+        self.port = port or settings.SMTP_PORT
+        self.user = settings.SMTP_USER if user is None else user
+        self.password = settings.SMTP_PASSWORD if password is None else password
+        self.timeout = timeout or settings.SMTP_TIMEOUT_SECONDS
+
+    def send_all(self, messages: List[EmailMessage]) -> List[str]:
+        """
+        Returns the recipients that were rejected. Connection-level failures raise,
+        so the caller can requeue the whole batch.
+        """
+        rechazados = []
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.ehlo()
+            if smtp.has_extn("starttls"):
+                smtp.starttls()
+                smtp.ehlo()
+            if self.user and smtp.has_extn("auth"):
+                smtp.login(self.user, self.password)
+            for message in messages:
+                try:
+                    smtp.send_message(message)
+                except _RECIPIENT_ERRORS as e:
+                    logger.warning(f"SMTP rejected email to {message['To']}: {str(e)}")
+                    rechazados.append(message["To"])
+                    smtp.rset()
+        return rechazados
+
+
+def render(event: EmailVerificationEvent) -> EmailMessage:
+    """Verification email (plain text plus HTML alternative)"""
+    minutos = settings.VERIFICATION_CODE_TTL_SECONDS // 60
+    message = EmailMessage()
+    message["From"] = settings.SMTP_FROM
+    message["To"] = event.email
+    message["Subject"] = "Código de verificación - Distribuidora Perros y Gatos"
+    message.set_content(
+        f"Hola {event.nombre},\n\nTu código de verificación es {event.codigo}.\n"
+        f"Expira en {minutos} minutos.\n"
+    )
+    message.add_alternative(
+        f"<p>Hola {html.escape(event.nombre)},</p>"
+        f"<p>Tu código de verificación es <strong>{html.escape(event.codigo)}</strong>.</p>"
+        f"<p>Expira en {minutos} minutos.</p>",
+        subtype="html",
+    )
+    return message
+
+
+def parse(body: bytes, content_type: Optional[str] = None,
+          content_encoding: Optional[str] = None) -> Optional[EmailVerificationEvent]:
+    """Payload of an email.verification message, or None if it is malformed"""
+    try:
+        return events.parse(EMAIL_VERIFICATION_QUEUE, events.decode(body, content_type, content_encoding))
+    except Exception as e:
+        logger.error(f"Discarding malformed {EMAIL_VERIFICATION_QUEUE} message: {str(e)}")
+        return None
+
+
+class EmailDispatcher:
+    """Coalesces email.verification messages and sends them in SMTP batches"""
+
+    def __init__(self, transport: Optional[SMTPTransport] = None, batch_size: Optional[int] = None,
+                 max_wait_seconds: Optional[float] = None, dedupe_seconds: Optional[float] = None,
+                 max_tracked: int = 100000):
+        self.transport = transport or SMTPTransport()
+        self.batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+        self.max_wait_seconds = max_wait_seconds or settings.EMAIL_BATCH_MAX_WAIT_SECONDS
+        self.dedupe_seconds = settings.EMAIL_RESEND_DEDUPE_SECONDS if dedupe_seconds is None else dedupe_seconds
+        self.max_tracked = max_tracked
+        # address -> (code, sent at), oldest first
+        self._sent: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def _recently_sent(self, address: str, codigo: str, now: float) -> bool:
+        sent = self._sent.get(address)
+        return sent is not None and sent[0] == codigo and now - sent[1] < self.dedupe_seconds
+
+    def _remember(self, address: str, codigo: str, now: float) -> None:
+        self._sent.pop(address, None)
+        self._sent[address] = (codigo, now)
+        while self._sent:
+            oldest, (_, sent_at) = next(iter(self._sent.items()))
+            if now - sent_at < self.dedupe_seconds and len(self._sent) <= self.max_tracked:
+                break
+            del self._sent[oldest]
+
+    def coalesce(self, events: List[EmailVerificationEvent], now: float) -> List[EmailVerificationEvent]:
+        """Newest event per address, minus resends of a code that was just delivered"""
+        latest: Dict[str, EmailVerificationEvent] = {}
+        for event in events:
+            address = event.email.lower()
+            latest.pop(address, None)
+            latest[address] = event
+        return [e for address, e in latest.items() if not self._recently_sent(address, e.codigo, now)]
+
+    def dispatch(self, events: List[EmailVerificationEvent], now: Optional[float] = None) -> int:
+        """Send one batch over one SMTP session; returns how many emails were accepted"""
+        now = time.time() if now is None else now
+        pendientes = self.coalesce(events, now)
+        if not pendientes:
+            return 0
+        rechazados = {r.lower() for r in self.transport.send_all([render(e) for e in pendientes])}
+        enviados = 0
+        for event in pendientes:
+            if event.email.lower() not in rechazados:
+                self._remember(event.email.lower(), event.codigo, now)
+                enviados += 1
+        logger.info(f"Sent {enviados} verification emails ({len(events)} messages coalesced)")
+        return enviados
+
+    def _next_batch(self, channel) -> List[Tuple[int, Optional[EmailVerificationEvent]]]:
+        batch = []
+        deadline = time.monotonic() + self.max_wait_seconds
+        for method, properties, body in channel.consume(EMAIL_VERIFICATION_QUEUE,
+                                                        inactivity_timeout=self.max_wait_seconds):
+            if method is None:
+                break
+            batch.append((method.delivery_tag, parse(body, properties.content_type, properties.content_encoding)))
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                break
+        return batch
+
+    def run(self, connection_parameters: Optional[pika.ConnectionParameters] = None) -> None:
+        """Blocking consume loop (one batch in flight: prefetch == batch_size)"""
+        if connection_parameters is None:
+            connection_parameters = pika.URLParameters(settings.RABBITMQ_URL)
+        connection = pika.BlockingConnection(connection_parameters)
+        channel = connection.channel()
+        channel.queue_declare(queue=EMAIL_VERIFICATION_QUEUE, durable=True)
+        channel.basic_qos(prefetch_count=self.batch_size)
+        logger.info(f"Waiting for messages in {EMAIL_VERIFICATION_QUEUE}")
+        try:
+            while True:
+                batch = self._next_batch(channel)
+                if not batch:
+                    continue
+                last_tag = batch[-1][0]
+                try:
+                    # Malformed messages are acked with the batch: redelivering them cannot help
+                    self.dispatch([event for _, event in batch if event is not None])
+                    channel.basic_ack(last_tag, multiple=True)
+                except Exception as e:
+                    logger.error(f"Email batch failed, requeueing {len(batch)} messages: {str(e)}")
+                    channel.basic_nack(last_tag, multiple=True, requeue=True)
+                    time.sleep(self.max_wait_seconds)
+        finally:
+            try:
+                channel.cancel()
+                connection.close()
+            except Exception:
+                pass
+
+
+# Global email dispatcher instance
+email_dispatcher = EmailDispatcher()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    email_dispatcher.run()
@@ -0,0 +1,234 @@
+"""
+Consumer runtime for RabbitMQ queues handled by the API package
+One pika connection and channel, owned by a single I/O thread, pulls deliveries for every
+registered queue (up to CONSUMER_PREFETCH unacked, or whatever arrived within
+CONSUMER_MAX_WAIT_SECONDS). The round is then processed on the event loop: each queue's
+optional coalesce hook drops superseded messages, and handlers run with at most
+CONSUMER_CONCURRENCY in flight. Settlement is one multiple-ack for the whole round;
+failed messages are first republished (x-retries + 1) or, past CONSUMER_MAX_RETRIES,
+moved to "<queue>.dlq". Dead-lettering by republish keeps the queues' declaration
+identical to the producer's (no x-dead-letter arguments to mismatch).
+
+Handlers are registered with the @consumer_runtime.handler(queue) decorator; sync
+handlers run in the threadpool. Start it in-process (CONSUMER_IN_PROCESS) or run
+python -m app.consumers
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import logging
+import time
+
+import pika
+from fastapi.concurrency import run_in_threadpool
+
+from app import events
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRIES_HEADER = "x-retries"
+ERROR_HEADER = "x-error"
+
+
+class Delivery(NamedTuple):
+    queue: str
+    tag: int
+    message: Optional[Dict[str, Any]]  # None when the body does not decode to an object
+    body: bytes
+    retries: int = 0
+
+
+class QueueConsumer(NamedTuple):
+    queue: str
+    handler: Callable[[Dict[str, Any]], Any]
+    # Deliveries of one round, oldest first -> the ones that still need to run
+    coalesce: Optional[Callable[[List[Delivery]], List[Delivery]]] = None
+
+
+def decode(queue: str, tag: int, body: bytes, headers: Optional[Dict[str, Any]] = None,
+           content_type: Optional[str] = None, content_encoding: Optional[str] = None) -> Delivery:
+    try:
+        message = events.decode(body, content_type, content_encoding)
+    except Exception:
+        message = None
+    if not isinstance(message, dict):
+        message = None
+    return Delivery(queue, tag, message, body, int((headers or {}).get(RETRIES_HEADER, 0)))
+
+
+def keep_latest(deliveries: List[Delivery]) -> List[Delivery]:
+    """Coalesce hook for snapshot-style events: only the newest one matters"""
+    return deliveries[-1:]
+
+
+class ConsumerRuntime:
+    """Prefetching, concurrency-limited consumer with batched acks and dead-lettering"""
+
+    def __init__(self, prefetch: Optional[int] = None, concurrency: Optional[int] = None,
+                 max_wait_seconds: Optional[float] = None, max_retries: Optional[int] = None):
+        self.prefetch = prefetch or settings.CONSUMER_PREFETCH
+        self.concurrency = concurrency or settings.CONSUMER_CONCURRENCY
+        self.max_wait_seconds = max_wait_seconds or settings.CONSUMER_MAX_WAIT_SECONDS
+        self.max_retries = settings.CONSUMER_MAX_RETRIES if max_retries is None else max_retries
+        self.consumers: Dict[str, QueueConsumer] = {}
+        self._connection: Optional[pika.BlockingConnection] = None
+        self._channel = None
+        self._buffer: List[Delivery] = []
+        self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="consumer-io")
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, queue: str, handler: Callable, coalesce: Optional[Callable] = None) -> None:
+        self.consumers[queue] = QueueConsumer(queue, handler, coalesce)
+
+    def handler(self, queue: str, coalesce: Optional[Callable] = None):
+        """Decorator form of register()"""
+        def decorator(func):
+            self.register(queue, func, coalesce)
+            return func
+        return decorator
+
+    # -- processing (event loop) --
+
+    async def _run_one(self, semaphore: asyncio.Semaphore, consumer: QueueConsumer,
+                       delivery: Delivery) -> Optional[str]:
+        async with semaphore:
+            try:
+                if asyncio.iscoroutinefunction(consumer.handler):
+                    await consumer.handler(delivery.message)
+                else:
+                    await run_in_threadpool(consumer.handler, delivery.message)
+                return None
+            except Exception as e:
+                logger.warning(f"Handler for {delivery.queue} failed on delivery {delivery.tag}: {str(e)}")
+                return str(e) or e.__class__.__name__
+
+    async def process(self, deliveries: List[Delivery]) -> List[Tuple[Delivery, str, bool]]:
+        """Run one round; returns the failures as (delivery, error, retriable)"""
+        failures: List[Tuple[Delivery, str, bool]] = []
+        runnable: List[Tuple[QueueConsumer, Delivery]] = []
+        por_cola: Dict[str, List[Delivery]] = {}
+        for delivery in deliveries:
+            if delivery.message is None:
+                failures.append((delivery, "Mensaje malformado", False))
+            elif delivery.queue not in self.consumers:
+                failures.append((delivery, "Cola sin consumidor", False))
+            else:
+                por_cola.setdefault(delivery.queue, []).append(delivery)
+        for queue, items in por_cola.items():
+            consumer = self.consumers[queue]
+            vigentes = consumer.coalesce(items) if consumer.coalesce else items
+            if len(vigentes) < len(items):
+                logger.info(f"Coalesced {len(items)} {queue} messages into {len(vigentes)}")
+            runnable += [(consumer, d) for d in vigentes]
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        errores = await asyncio.gather(*(self._run_one(semaphore, c, d) for c, d in runnable))
+        failures += [(d, error, True) for (_, d), error in zip(runnable, errores) if error is not None]
+        return failures
+
+    # -- broker I/O (single thread) --
+
+    def _connect(self):
+        self._connection = pika.BlockingConnection(pika.URLParameters(settings.RABBITMQ_URL))
+        self._channel = self._connection.channel()
+        self._channel.basic_qos(prefetch_count=self.prefetch)
+        for queue in self.consumers:
+            self._channel.queue_declare(queue=queue, durable=True)
+            self._channel.queue_declare(queue=f"{queue}.dlq", durable=True)
+            self._channel.basic_consume(queue, self._on_message)
+        logger.info(f"Consuming {', '.join(self.consumers)} (prefetch {self.prefetch})")
+
+    def _on_message(self, channel, method, properties, body):
+        self._buffer.append(decode(method.routing_key, method.delivery_tag, body, properties.headers,
+                                   properties.content_type, properties.content_encoding))
+
+    def fetch(self) -> List[Delivery]:
+        """Deliveries received within max_wait_seconds (at most prefetch, by broker flow control)"""
+        if self._connection is None or self._connection.is_closed:
+            self._connect()
+        deadline = time.monotonic() + self.max_wait_seconds
+        while len(self._buffer) < self.prefetch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._connection.process_data_events(time_limit=remaining)
+        deliveries, self._buffer = self._buffer, []
+        return deliveries
+
+    def settle(self, channel, deliveries: List[Delivery], failures: List[Tuple[Delivery, str, bool]]) -> None:
+        """Republish failures (retry or .dlq), then ack the whole round with one multiple-ack"""
+        for delivery, error, retriable in failures:
+            retries = delivery.retries + 1
+            destino = delivery.queue if retriable and retries <= self.max_retries else f"{delivery.queue}.dlq"
+            if delivery.message is None:
+                body, content_type, content_encoding = delivery.body, None, None
+            else:
+                body, content_type, content_encoding = events.encode(delivery.queue, delivery.message)
+            channel.basic_publish(
+                exchange='',
+                routing_key=destino,
+                body=body,
+                properties=pika.BasicProperties(
+                    delivery_mode=2,
+                    content_type=content_type,
+                    content_encoding=content_encoding,
+                    headers={RETRIES_HEADER: retries, ERROR_HEADER: error[:500]},
+                ),
+            )
+            if destino.endswith(".dlq"):
+                logger.error(f"Dead-lettered {delivery.queue} delivery {delivery.tag}: {error}")
+        if deliveries:
+            channel.basic_ack(max(d.tag for d in deliveries), multiple=True)
+
+    def _close(self):
+        try:
+            if self._connection is not None and not self._connection.is_closed:
+                self._connection.close()
+        except Exception as e:
+            logger.warning(f"Error closing consumer connection: {str(e)}")
+        self._connection = self._channel = None
+        self._buffer = []
+
+    # -- lifecycle --
+
+    async def run(self) -> None:
+        """Consume until cancelled, reconnecting after broker errors"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    deliveries = await loop.run_in_executor(self._io, self.fetch)
+                    if not deliveries:
+                        continue
+                    failures = await self.process(deliveries)
+                    await loop.run_in_executor(self._io, self.settle, self._channel, deliveries, failures)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Unacked deliveries are redelivered by the broker once the channel is gone
+                    logger.error(f"Consumer runtime error, reconnecting: {str(e)}")
+                    await loop.run_in_executor(self._io, self._close)
+                    await asyncio.sleep(5)
+        finally:
+            await loop.run_in_executor(self._io, self._close)
+
+    def start(self):
+        """Run inside the API's event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+            logger.info("Consumer runtime started")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info("Consumer runtime stopped")
+
+
+# Global consumer runtime instance (handlers register on import of app.consumers)
+consumer_runtime = ConsumerRuntime()
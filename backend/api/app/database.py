@@ -1,11 +1,22 @@
 """
 Database connection and session management using SQLAlchemy
+Writes (and everything using get_db) go to the primary engine. Read-only endpoints use
+get_read_db, which rotates over the DATABASE_READ_URLS replicas; a client that wrote within
+the last READ_YOUR_WRITES_SECONDS (tracked by cookie, and per session/token in-process) is
+kept on the primary so it always sees its own writes.
 """
+from collections import OrderedDict
 from sqlalchemy import create_engine
+from fastapi import Request
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
-from typing import Generator
+from starlette.requests import HTTPConnection
+from typing import Generator, List, Optional
 from app.config import settings
+import hashlib
+import itertools
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +31,17 @@ engine = create_engine(
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read replicas (none configured: reads use the primary)
+read_engines = [
+    create_engine(url, echo=settings.DEBUG, pool_pre_ping=True, pool_recycle=3600)
+    for url in settings.DATABASE_READ_URLS
+]
+ReadSessionLocals = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in read_engines]
+_next_replica = itertools.count()
+
+# Cookie holding the end (epoch seconds) of the client's read-your-writes window
+READ_YOUR_WRITES_COOKIE = "rw_primary_until"
+
 # Base class for models
 Base = declarative_base()
 
@@ -36,6 +58,73 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+class ReadYourWrites:
+    """Clients (session id or bearer token, hashed) that wrote recently, with their window end"""
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._until: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def client_key(conn: HTTPConnection) -> Optional[str]:
+        identity = (conn.headers.get("authorization") or conn.headers.get("session-id")
+                    or conn.cookies.get("session_id"))
+        if not identity:
+            return None
+        return hashlib.blake2b(identity.encode(), digest_size=16).hexdigest()
+
+    def mark(self, conn: HTTPConnection, now: Optional[float] = None) -> float:
+        """Record a write by this client; returns the end of its window"""
+        now = time.time() if now is None else now
+        until = now + settings.READ_YOUR_WRITES_SECONDS
+        key = self.client_key(conn)
+        if key is not None:
+            with self._lock:
+                self._until.pop(key, None)
+                self._until[key] = until
+                while self._until and (len(self._until) > self.max_entries
+                                       or next(iter(self._until.values())) <= now):
+                    self._until.popitem(last=False)
+        return until
+
+    def needs_primary(self, conn: HTTPConnection, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        try:
+            if float(conn.cookies.get(READ_YOUR_WRITES_COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        key = self.client_key(conn)
+        if key is None:
+            return False
+        with self._lock:
+            return self._until.get(key, 0) > now
+
+
+# Global read-your-writes tracker
+read_your_writes = ReadYourWrites()
+
+
+def read_session_factory(conn: Optional[HTTPConnection] = None) -> sessionmaker:
+    """Next replica's session factory, or the primary's (no replicas, or a recent writer)"""
+    if not ReadSessionLocals or (conn is not None and read_your_writes.needs_primary(conn)):
+        return SessionLocal
+    return ReadSessionLocals[next(_next_replica) % len(ReadSessionLocals)]
+
+
+def get_read_db(request: Request) -> Generator[Session, None, None]:
+    """
+    Dependency for read-only endpoints: a session on a read replica
+    (the primary for clients inside their read-your-writes window)
+    """
+    db = read_session_factory(request)()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 def init_db():
     """Initialize database by creating all tables"""
     try:
@@ -54,4 +143,6 @@ def init_db():
 def close_db():
     """Close database engine connection"""
     engine.dispose()
+    for read_engine in read_engines:
+        read_engine.dispose()
     logger.info("Database connection closed")
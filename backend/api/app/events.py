@@ -0,0 +1,189 @@
+"""
+Event schemas and wire encoding for RabbitMQ messages
+Every queue has a registered, versioned payload schema; envelope() validates a payload
+and wraps it as {"requestId", "action", "version", "payload", "meta": {"timestamp"}}.
+
+encode() picks the body format from EVENT_CONTENT_TYPE (application/json through orjson,
+or application/msgpack when the msgpack package is installed) and gzips bodies above
+EVENT_COMPRESS_MIN_BYTES. Queues read by the TypeScript worker are marked json_only and
+are always plain JSON. decode() reads any of these from the message's content_type and
+content_encoding, so JSON producers keep working.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Type
+import gzip
+import uuid
+
+import orjson
+from pydantic import BaseModel, EmailStr, Field
+
+from app.config import settings
+
+try:
+    import msgpack
+except ImportError:  # optional: without it everything goes out as JSON
+    msgpack = None
+
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_MSGPACK = "application/msgpack"
+ENCODING_GZIP = "gzip"
+
+
+# Payload schemas (field names are the wire keys)
+class CarruselImagenCreadaEvent(BaseModel):
+    imagenPath: str
+    linkUrl: Optional[str] = None
+    created_by: Optional[str] = None
+
+
+class CarruselImagenActualizadaEvent(BaseModel):
+    id: int
+    orden: int
+    linkUrl: Optional[str] = None
+
+
+class CarruselImagenEliminadaEvent(BaseModel):
+    id: int
+
+
+class CarruselOrden(BaseModel):
+    id: int
+    orden: int
+
+
+class CarruselReordenadoEvent(BaseModel):
+    ordenes: List[CarruselOrden]
+
+
+class EmailVerificationEvent(BaseModel):
+    usuarioId: int
+    email: EmailStr
+    nombre: str
+    codigo: str = Field(..., pattern=r"^\d{6}$")
+    expiraEn: datetime
+
+
+class AuthLoginEvent(BaseModel):
+    usuarioId: Optional[int] = None
+
+
+class InventarioActualizadoEvent(BaseModel):
+    productoId: int
+    cantidad: int
+    cantidadNueva: int
+
+
+class PedidoEstadoEvent(BaseModel):
+    """pedido.crear and pedido.estado.cambiar (see order_service.estado_event)"""
+    pedidoId: int
+    estadoAnterior: Optional[str] = None
+    estadoNuevo: str
+    total: str
+    fechaPedido: str
+    usuarioId: Optional[int] = None
+    nota: Optional[str] = None
+
+
+class CartEvent(BaseModel):
+    """cart.vaciar; base of the cart.item.* events"""
+    cartId: Optional[int] = None
+    usuarioId: Optional[int] = None
+    sessionId: Optional[str] = None
+
+
+class CartItemEliminadoEvent(CartEvent):
+    productoId: int
+
+
+class CartItemEvent(CartItemEliminadoEvent):
+    cantidad: int
+
+
+class EventSpec(NamedTuple):
+    action: str
+    version: int
+    schemas: Dict[int, Type[BaseModel]]  # every version still accepted, by number
+    json_only: bool = False  # consumed by the TypeScript worker
+
+
+def _spec(action: str, schema: Type[BaseModel], json_only: bool = False) -> EventSpec:
+    return EventSpec(action, 1, {1: schema}, json_only)
+
+
+# Queue -> event spec
+EVENTS: Dict[str, EventSpec] = {
+    "carrusel.imagen.crear": _spec("crear_imagen", CarruselImagenCreadaEvent),
+    "carrusel.imagen.actualizar": _spec("actualizar_imagen", CarruselImagenActualizadaEvent),
+    "carrusel.imagen.eliminar": _spec("eliminar_imagen", CarruselImagenEliminadaEvent),
+    "carrusel.imagen.reordenar": _spec("reordenar", CarruselReordenadoEvent),
+    "email.verification": _spec("enviar_codigo", EmailVerificationEvent),
+    "auth.login": _spec("login", AuthLoginEvent, json_only=True),
+    "inventario.actualizar": _spec("reabastecer", InventarioActualizadoEvent, json_only=True),
+    "pedido.crear": _spec("crear_pedido", PedidoEstadoEvent, json_only=True),
+    "pedido.estado.cambiar": _spec("cambiar_estado_pedido", PedidoEstadoEvent, json_only=True),
+    "cart.item.agregar": _spec("agregar", CartItemEvent, json_only=True),
+    "cart.item.actualizar": _spec("actualizar", CartItemEvent, json_only=True),
+    "cart.item.eliminar": _spec("eliminar", CartItemEliminadoEvent, json_only=True),
+    "cart.vaciar": _spec("vaciar", CartEvent, json_only=True),
+}
+
+EMAIL_VERIFICATION_QUEUE = "email.verification"
+
+
+class EventError(ValueError):
+    """Unknown queue, or a payload that does not match its schema"""
+
+
+def _spec_for(queue: str) -> EventSpec:
+    spec = EVENTS.get(queue)
+    if spec is None:
+        raise EventError(f"No event schema registered for queue {queue}")
+    return spec
+
+
+def envelope(queue: str, payload: Any, action: Optional[str] = None, request_id: Optional[str] = None,
+             timestamp: Optional[str] = None) -> Dict[str, Any]:
+    """Validated message for queue (payload: dict or schema instance)"""
+    spec = _spec_for(queue)
+    schema = spec.schemas[spec.version]
+    if not isinstance(payload, schema):
+        payload = schema.model_validate(payload)
+    return {
+        "requestId": request_id or uuid.uuid4().hex,
+        "action": action or spec.action,
+        "version": spec.version,
+        "payload": payload.model_dump(mode="json"),
+        "meta": {"timestamp": timestamp or datetime.utcnow().isoformat()},
+    }
+
+
+def parse(queue: str, message: Dict[str, Any]) -> BaseModel:
+    """Payload of a decoded message as its schema (by the message's version; 1 if absent)"""
+    spec = _spec_for(queue)
+    schema = spec.schemas.get(int(message.get("version", 1)))
+    if schema is None:
+        raise EventError(f"Unsupported version {message.get('version')} for queue {queue}")
+    return schema.model_validate(message["payload"])
+
+
+def encode(queue: str, message: Dict[str, Any]) -> Tuple[bytes, str, Optional[str]]:
+    """(body, content_type, content_encoding) for a message published to queue"""
+    spec = EVENTS.get(queue)
+    if spec is None or spec.json_only or settings.EVENT_CONTENT_TYPE != CONTENT_TYPE_MSGPACK or msgpack is None:
+        body, content_type = orjson.dumps(message), CONTENT_TYPE_JSON
+    else:
+        body, content_type = msgpack.packb(message, use_bin_type=True), CONTENT_TYPE_MSGPACK
+    if spec is not None and not spec.json_only and 0 < settings.EVENT_COMPRESS_MIN_BYTES <= len(body):
+        return gzip.compress(body, compresslevel=5), content_type, ENCODING_GZIP
+    return body, content_type, None
+
+
+def decode(body: bytes, content_type: Optional[str] = None, content_encoding: Optional[str] = None) -> Any:
+    """Inverse of encode(); a body without content_type is taken as JSON"""
+    if content_encoding == ENCODING_GZIP:
+        body = gzip.decompress(body)
+    if content_type == CONTENT_TYPE_MSGPACK:
+        if msgpack is None:
+            raise EventError("msgpack message received but the msgpack package is not installed")
+        return msgpack.unpackb(body, raw=False)
+    return orjson.loads(body)
@@ -2,6 +2,24 @@
 Middleware package for FastAPI application
 """
 from app.middleware.error_handler import setup_error_handlers
+from app.middleware.rate_limiting import RateLimit, RateLimitExceeded, rate_limiter
+from app.middleware.auth_middleware import get_current_user_id, get_optional_user_id
+from app.middleware.compression import CompressionMiddleware, CompressedPayload
+from app.middleware.read_your_writes import ReadYourWritesMiddleware
+from app.middleware.idempotency import IdempotencyMiddleware, IdempotencyStore, idempotency_store
 
-__all__ = ['setup_error_handlers']
+__all__ = [
+    'setup_error_handlers',
+    'RateLimit',
+    'RateLimitExceeded',
+    'rate_limiter',
+    'get_current_user_id',
+    'get_optional_user_id',
+    'CompressionMiddleware',
+    'CompressedPayload',
+    'ReadYourWritesMiddleware',
+    'IdempotencyMiddleware',
+    'IdempotencyStore',
+    'idempotency_store',
+]
 
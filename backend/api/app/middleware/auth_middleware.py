@@ -0,0 +1,47 @@
+"""
+Authentication dependencies
+Extract the user id from the `Authorization: Bearer <jwt>` header issued by /api/auth/login.
+"""
+from typing import Optional
+
+from fastapi import Header, HTTPException, status
+
+from app.utils.security import security_utils
+
+
+def _user_id_from_header(authorization: Optional[str]) -> Optional[int]:
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    payload = security_utils.verify_token(token)
+    try:
+        return int(payload["sub"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+async def get_optional_user_id(authorization: Optional[str] = Header(None)) -> Optional[int]:
+    """User id for authenticated requests, None for anonymous ones (invalid tokens are rejected)"""
+    return _user_id_from_header(authorization)
+
+
+async def get_current_user_id(authorization: Optional[str] = Header(None)) -> int:
+    """User id of the authenticated caller; 401 when the request is anonymous"""
+    usuario_id = _user_id_from_header(authorization)
+    if usuario_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return usuario_id
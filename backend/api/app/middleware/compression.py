@@ -0,0 +1,226 @@
+"""
+Response compression
+- CompressionMiddleware: negotiates br (when the brotli package is installed) or gzip from
+  Accept-Encoding and compresses responses of at least COMPRESSION_MIN_BYTES. Media that is
+  already compressed (images, video, archives...) and responses that already carry a
+  Content-Encoding pass through untouched; streamed responses are compressed chunk by chunk.
+- CompressedPayload: a rendered body compressed once into every supported encoding, for
+  response caches. Serving one picks the variant for the request, so cached entries are
+  never recompressed (the middleware skips them: they already have a Content-Encoding).
+"""
+from typing import Dict, List, Optional, Tuple
+import gzip
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+ENCODING_BR = "br"
+ENCODING_GZIP = "gzip"
+
+# Precompressed entries are built once, so they use the slowest, smallest settings
+_PRECOMPRESS_GZIP_LEVEL = 9
+_PRECOMPRESS_BROTLI_QUALITY = 11
+
+# Content types that are already compressed (image/svg+xml is text and does compress)
+_COMPRESSED_PREFIXES = ("image/", "video/", "audio/", "font/woff")
+_COMPRESSED_TYPES = {
+    "application/zip", "application/gzip", "application/x-gzip", "application/x-7z-compressed",
+    "application/x-rar-compressed", "application/pdf", "application/octet-stream",
+    "application/vnd.rar", "application/x-bzip2", "application/x-xz",
+}
+
+
+def supported_encodings() -> List[str]:
+    """Encodings this process can produce, preferred first"""
+    return [ENCODING_BR, ENCODING_GZIP] if brotli is not None else [ENCODING_GZIP]
+
+
+def _accepted(accept_encoding: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q}"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def negotiate(accept_encoding: Optional[str], available: Optional[List[str]] = None) -> Optional[str]:
+    """Best of the available encodings (default: all supported) the client accepts, or None for identity"""
+    if not accept_encoding:
+        return None
+    accepted = _accepted(accept_encoding)
+    best, best_q = None, 0.0
+    for encoding in supported_encodings() if available is None else available:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type == "image/svg+xml":
+        return True
+    return not (media_type.startswith(_COMPRESSED_PREFIXES) or media_type in _COMPRESSED_TYPES)
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """One-shot compression (level: gzip level or brotli quality)"""
+    if encoding == ENCODING_BR:
+        return brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY if level is None else level)
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL if level is None else level)
+
+
+class _StreamCompressor:
+    """Incremental gzip / brotli for streamed bodies"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == ENCODING_BR:
+            self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == ENCODING_BR:
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == ENCODING_BR:
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """ASGI middleware: gzip/br with a size threshold, skipping already-compressed media"""
+
+    def __init__(self, app: ASGIApp, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_BYTES if minimum_size is None else minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedSend(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressedSend:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Send = None
+        self.start: Optional[Message] = None
+        self.passthrough = False
+        self.compressor: Optional[_StreamCompressor] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.on_send)
+
+    async def on_send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self.start = message
+            self.passthrough = (
+                message["status"] in (204, 304)
+                or "content-encoding" in headers
+                or not is_compressible(headers.get("content-type"))
+            )
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body:
+                # Whole body in one message: compress only past the threshold
+                if len(body) < self.minimum_size:
+                    await self.send(self.start)
+                    await self.send(message)
+                    return
+                body = compress(body, self.encoding)
+                headers = MutableHeaders(raw=self.start["headers"])
+                self._mark(headers)
+                headers["content-length"] = str(len(body))
+                await self.send(self.start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            # Streamed body: compress as it goes, without a Content-Length
+            self.compressor = _StreamCompressor(self.encoding)
+            headers = MutableHeaders(raw=self.start["headers"])
+            self._mark(headers)
+            del headers["content-length"]
+            await self.send(self.start)
+        data = self.compressor.chunk(body)
+        if not more_body:
+            data += self.compressor.finish()
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+    def _mark(self, headers: MutableHeaders) -> None:
+        headers["content-encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+
+
+class CompressedPayload:
+    """A rendered response body plus its precompressed variants (one per supported encoding)"""
+
+    __slots__ = ("body", "media_type", "variants")
+
+    def __init__(self, body: bytes, media_type: str = "application/json", minimum_size: Optional[int] = None):
+        self.body = body
+        self.media_type = media_type
+        self.variants: Dict[str, bytes] = {}
+        minimum_size = settings.COMPRESSION_MIN_BYTES if minimum_size is None else minimum_size
+        if settings.COMPRESSION_ENABLED and len(body) >= minimum_size and is_compressible(media_type):
+            for encoding in supported_encodings():
+                level = _PRECOMPRESS_BROTLI_QUALITY if encoding == ENCODING_BR else _PRECOMPRESS_GZIP_LEVEL
+                variant = compress(body, encoding, level)
+                if len(variant) < len(body):
+                    self.variants[encoding] = variant
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """(body, content encoding) for a request's Accept-Encoding"""
+        encoding = negotiate(accept_encoding, [e for e in supported_encodings() if e in self.variants])
+        if encoding is None:
+            return self.body, None
+        return self.variants[encoding], encoding
+
+    def response(self, accept_encoding: Optional[str], status_code: int = 200,
+                 headers: Optional[Dict[str, str]] = None) -> Response:
+        body, encoding = self.select(accept_encoding)
+        response = Response(content=body, status_code=status_code, headers=headers, media_type=self.media_type)
+        if self.variants:
+            response.headers["Vary"] = "Accept-Encoding"
+            if encoding is not None:
+                response.headers["Content-Encoding"] = encoding
+        return response
+
@@ -7,6 +7,7 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.exc import SQLAlchemyError, DatabaseError
 from pydantic import ValidationError
+from app.middleware.rate_limiting import RateLimitExceeded
 import logging
 
 logger = logging.getLogger(__name__)
@@ -43,6 +44,23 @@ def setup_error_handlers(app: FastAPI):
             }
         )
     
+    @app.exception_handler(RateLimitExceeded)
+    async def rate_limit_exception_handler(request: Request, exc: RateLimitExceeded):
+        """
+        Handle rate limit / lockout rejections
+        Returns 429 (or 423 for account lockout) with Retry-After
+        """
+        logger.warning(f"Rate limit exceeded on {request.url.path}")
+        
+        return JSONResponse(
+            status_code=exc.status_code,
+            content={
+                "status": "error",
+                "message": exc.message
+            },
+            headers={"Retry-After": str(exc.retry_after)}
+        )
+    
     @app.exception_handler(SQLAlchemyError)
     async def database_exception_handler(request: Request, exc: SQLAlchemyError):
         """
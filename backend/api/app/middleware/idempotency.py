@@ -0,0 +1,243 @@
+"""
+Idempotency keys for retried writes
+A POST/PUT/PATCH carrying `Idempotency-Key` runs once per key and caller (JWT user, else the
+anonymous session, else the client address). Its response (status below 500 other than 429,
+body of at most IDEMPOTENCY_MAX_BODY_BYTES) is kept for IDEMPOTENCY_TTL_SECONDS and replayed
+to retries with `Idempotent-Replayed: true`, before routing, so replays open no DB session
+and repeat no file writes, stock changes or broker publishes. Retries arriving while the first request
+is still running wait for it (up to IDEMPOTENCY_WAIT_SECONDS, then 409). Reusing a key for
+a different request (method, path, query or body; multipart bodies compare without their
+random boundary) is rejected with 422.
+Server errors and rate-limit rejections are not stored: the key is released and the next
+retry runs again.
+The store is per process: with several workers, retries reaching another worker are not
+deduplicated.
+"""
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import time
+
+from fastapi import HTTPException, status
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.middleware.auth_middleware import _user_id_from_header
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+REPLAYED_HEADER = "idempotent-replayed"
+IDEMPOTENT_METHODS = {"POST", "PUT", "PATCH"}
+MAX_KEY_LENGTH = 255
+
+
+class StoredResponse:
+    """A finished response: status, raw headers and body"""
+
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status = status_code
+        self.headers = headers
+        self.body = body
+
+    async def replay(self, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status,
+            "headers": self.headers + [(REPLAYED_HEADER.encode(), b"true")],
+        })
+        await send({"type": "http.response.body", "body": self.body})
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "expires_at", "done", "response")
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.done = asyncio.Event()
+        self.response: Optional[StoredResponse] = None  # None while in flight
+
+
+class IdempotencyStore:
+    """In-process TTL store of (caller, key) -> in-flight or finished request (one event loop)"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None):
+        self.ttl_seconds = settings.IDEMPOTENCY_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = max_entries or settings.IDEMPOTENCY_MAX_ENTRIES
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str], now: Optional[float] = None) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= (time.monotonic() if now is None else now):
+            del self._entries[key]
+            return None
+        return entry
+
+    def begin(self, key: Tuple[str, str], fingerprint: str) -> _Entry:
+        """Claim key for a request about to run"""
+        now = time.monotonic()
+        entry = self._entries[key] = _Entry(fingerprint, now + self.ttl_seconds)
+        # Same TTL for everyone: the oldest entries sit at the front
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or next(iter(self._entries.values())).expires_at <= now):
+            oldest_key, oldest = self._entries.popitem(last=False)
+            if oldest.response is None:  # still running: keep it claimed
+                self._entries[oldest_key] = oldest
+                break
+        return entry
+
+    def finish(self, key: Tuple[str, str], entry: _Entry, response: Optional[StoredResponse]) -> None:
+        """Store the response (None releases the key) and wake the waiting duplicates"""
+        if response is None:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+        else:
+            entry.response = response
+            entry.expires_at = time.monotonic() + self.ttl_seconds
+        entry.done.set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Global idempotency store instance
+idempotency_store = IdempotencyStore()
+
+
+def caller_of(conn: HTTPConnection) -> str:
+    """Who the key belongs to: JWT user, else anonymous session, else client address"""
+    authorization = conn.headers.get("authorization")
+    if authorization:
+        try:
+            usuario_id = _user_id_from_header(authorization)
+        except HTTPException:
+            usuario_id = None  # the route answers 401; keyed by the raw header meanwhile
+        if usuario_id is not None:
+            return f"u:{usuario_id}"
+        return "a:" + hashlib.blake2b(authorization.encode(), digest_size=16).hexdigest()
+    session_id = conn.headers.get("session-id") or conn.cookies.get("session_id")
+    if session_id:
+        return "s:" + hashlib.blake2b(session_id.encode(), digest_size=16).hexdigest()
+    return f"ip:{conn.client.host if conn.client else ''}"
+
+
+def _error(status_code: int, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content={"status": "error", "message": message}, headers=headers)
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware: run once per Idempotency-Key, replay the stored response to retries"""
+
+    def __init__(self, app: ASGIApp, store: Optional[IdempotencyStore] = None):
+        self.app = app
+        self.store = idempotency_store if store is None else store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in IDEMPOTENT_METHODS:
+            await self.app(scope, receive, send)
+            return
+        conn = HTTPConnection(scope)
+        idempotency_key = conn.headers.get(IDEMPOTENCY_HEADER)
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not idempotency_key.strip() or len(idempotency_key) > MAX_KEY_LENGTH:
+            await _error(status.HTTP_400_BAD_REQUEST,
+                         f"Idempotency-Key debe tener entre 1 y {MAX_KEY_LENGTH} caracteres.")(scope, receive, send)
+            return
+
+        body = await self._read_body(receive)
+        fingerprint = self._fingerprint(scope, conn, body)
+        key = (caller_of(conn), idempotency_key)
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            entry = self.store.get(key)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                await _error(status.HTTP_422_UNPROCESSABLE_ENTITY,
+                             "Idempotency-Key ya fue usada con otra solicitud.")(scope, receive, send)
+                return
+            if entry.response is not None:
+                logger.info(f"Idempotent replay of {scope['method']} {scope['path']}")
+                await entry.response.replay(send)
+                return
+            # A duplicate of a request still running: wait for its outcome
+            try:
+                await asyncio.wait_for(entry.done.wait(), timeout=max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                await _error(status.HTTP_409_CONFLICT,
+                             "Una solicitud con esta Idempotency-Key sigue en curso. Intenta más tarde.",
+                             headers={"Retry-After": "1"})(scope, receive, send)
+                return
+
+        entry = self.store.begin(key, fingerprint)
+        stored: Optional[StoredResponse] = None
+        try:
+            stored = await self._run(scope, body, receive, send)
+        finally:
+            self.store.finish(key, entry, stored)
+
+    @staticmethod
+    def _fingerprint(scope: Scope, conn: HTTPConnection, body: bytes) -> str:
+        content_type = conn.headers.get("content-type", "")
+        if content_type.startswith("multipart/"):
+            # Clients pick a new boundary per attempt; the same form must still match
+            boundary = content_type.partition("boundary=")[2].split(";", 1)[0].strip().strip('"')
+            if boundary:
+                body = body.replace(boundary.encode(), b"")
+        return hashlib.blake2b(
+            b"\x00".join([scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body]),
+            digest_size=16,
+        ).hexdigest()
+
+    @staticmethod
+    async def _read_body(receive: Receive) -> bytes:
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    async def _run(self, scope: Scope, body: bytes, receive: Receive, send: Send) -> Optional[StoredResponse]:
+        """Run the request on the buffered body; its response if it should be kept"""
+        sent_body = False
+
+        async def receive_buffered() -> Message:
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()  # only the disconnect is left
+
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        size = 0
+
+        async def send_captured(message: Message) -> None:
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and size <= settings.IDEMPOTENCY_MAX_BODY_BYTES:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                chunks.append(chunk)
+            await send(message)
+
+        await self.app(scope, receive_buffered, send_captured)
+        if (start is None or start["status"] >= 500 or start["status"] == status.HTTP_429_TOO_MANY_REQUESTS
+                or size > settings.IDEMPOTENCY_MAX_BODY_BYTES):
+            return None
+        return StoredResponse(start["status"], list(start.get("headers", [])), b"".join(chunks))
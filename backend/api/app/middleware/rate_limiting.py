@@ -0,0 +1,311 @@
+"""
+Rate limiting for FastAPI endpoints
+- MemoryRateLimitBackend: per-process sliding-window log (microsecond checks, no I/O)
+- SQLRateLimitBackend: sliding-window counter in RateLimitCounters, shared by every replica
+Exposed as a FastAPI dependency (RateLimit) and as `rate_limiter` for custom flows like login lockout.
+record(..., lock_after=N, lockout_seconds=S) turns the Nth recorded failure within the window
+into a fixed lockout: peek/attempt refuse the key until that failure + S, then it starts clean.
+"""
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, NamedTuple, Optional
+import logging
+import math
+import threading
+import time
+
+from fastapi import Request, status
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import database
+from app.config import settings
+from app.models import RateLimitCounter
+from app.utils.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: int  # seconds until the next attempt would be allowed (0 if allowed)
+
+
+class RateLimitExceeded(Exception):
+    """Raised by RateLimit dependencies; rendered by the error handler with Retry-After"""
+
+    def __init__(self, retry_after: int, message: str = "Demasiadas solicitudes. Intenta más tarde.",
+                 status_code: int = status.HTTP_429_TOO_MANY_REQUESTS):
+        self.retry_after = max(1, int(retry_after))
+        self.message = message
+        self.status_code = status_code
+        super().__init__(message)
+
+
+class MemoryRateLimitBackend:
+    """Sliding-window log kept in process memory"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._hits: Dict[str, Deque[float]] = {}
+        self._locked_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _window(self, key: str, window_seconds: float, now: float) -> Deque[float]:
+        hits = self._hits.get(key)
+        if hits is None:
+            if len(self._hits) >= self.max_keys:
+                self._prune(now)
+            hits = self._hits[key] = deque()
+        cutoff = now - window_seconds
+        while hits and hits[0] <= cutoff:
+            hits.popleft()
+        return hits
+
+    def _prune(self, now: float):
+        # Keys whose newest hit is older than the longest window we serve are dead
+        horizon = now - 86400
+        for key in [k for k, v in self._hits.items() if not v or v[-1] <= horizon]:
+            del self._hits[key]
+        for key in [k for k, until in self._locked_until.items() if until <= now]:
+            del self._locked_until[key]
+
+    def _lockout(self, key: str, now: float) -> Optional[RateLimitResult]:
+        until = self._locked_until.get(key)
+        if until is None:
+            return None
+        if until <= now:
+            del self._locked_until[key]
+            return None
+        return RateLimitResult(False, 0, math.ceil(until - now))
+
+    @staticmethod
+    def _result(hits: Deque[float], limit: int, window_seconds: float, now: float) -> RateLimitResult:
+        if len(hits) < limit:
+            return RateLimitResult(True, limit - len(hits), 0)
+        retry_after = math.ceil(hits[len(hits) - limit] + window_seconds - now)
+        return RateLimitResult(False, 0, retry_after)
+
+    def peek(self, key: str, limit: int, window_seconds: float, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        with self._lock:
+            locked = self._lockout(key, now)
+            if locked is not None:
+                return locked
+            return self._result(self._window(key, window_seconds, now), limit, window_seconds, now)
+
+    def attempt(self, key: str, limit: int, window_seconds: float, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        with self._lock:
+            locked = self._lockout(key, now)
+            if locked is not None:
+                return locked
+            hits = self._window(key, window_seconds, now)
+            result = self._result(hits, limit, window_seconds, now)
+            if result.allowed:
+                hits.append(now)
+                return RateLimitResult(True, result.remaining - 1, 0)
+            return result
+
+    def record(self, key: str, window_seconds: float, now: Optional[float] = None,
+               lock_after: Optional[int] = None, lockout_seconds: Optional[float] = None) -> bool:
+        """Count one hit; True when it is the lock_after-th in the window and locked the key"""
+        now = time.time() if now is None else now
+        with self._lock:
+            hits = self._window(key, window_seconds, now)
+            hits.append(now)
+            if lock_after is None or len(hits) < lock_after:
+                return False
+            self._locked_until[key] = now + lockout_seconds
+            del self._hits[key]
+            return True
+
+    def reset(self, key: str) -> None:
+        with self._lock:
+            self._hits.pop(key, None)
+            self._locked_until.pop(key, None)
+
+
+class SQLRateLimitBackend:
+    """
+    Sliding-window counter shared through the RateLimitCounters table.
+    Each call is a single-row upsert on the primary key (no COUNT over history);
+    the previous window is weighted by how much of it still overlaps the sliding window.
+    A lockout is the key's row at ventana LOCK_WINDOW, expiring (expira_en) when it ends.
+    """
+
+    LOCK_WINDOW = -1
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self._session_factory = session_factory
+
+    def _session(self):
+        return (self._session_factory or database.SessionLocal)()
+
+    @staticmethod
+    def _increment(db, key: str, ventana: int, amount: int, expira_en: datetime) -> int:
+        row = {"clave": key, "ventana": ventana, "contador": amount, "expira_en": expira_en}
+        return upsert(db, RateLimitCounter, ["clave", "ventana"], [row],
+                      increment=["contador"], returning=["contador"])[0].contador
+
+    @staticmethod
+    def _counts(db, key: str, ventana: int):
+        rows = db.execute(
+            select(RateLimitCounter.ventana, RateLimitCounter.contador)
+            .where(RateLimitCounter.clave == key, RateLimitCounter.ventana.in_([ventana - 1, ventana]))
+        ).all()
+        counts = {row.ventana: row.contador for row in rows}
+        return counts.get(ventana - 1, 0), counts.get(ventana, 0)
+
+    @staticmethod
+    def _estimate(previous: int, current: int, window_seconds: float, now: float) -> float:
+        elapsed = (now % window_seconds) / window_seconds
+        return previous * (1 - elapsed) + current
+
+    @staticmethod
+    def _retry_after(window_seconds: float, now: float) -> int:
+        return math.ceil(window_seconds - (now % window_seconds))
+
+    def _lockout(self, db, key: str, now: float) -> Optional[RateLimitResult]:
+        until = db.scalar(
+            select(RateLimitCounter.expira_en)
+            .where(RateLimitCounter.clave == key, RateLimitCounter.ventana == self.LOCK_WINDOW)
+        )
+        if until is None:
+            return None
+        remaining = (until - datetime.utcfromtimestamp(now)).total_seconds()
+        return RateLimitResult(False, 0, math.ceil(remaining)) if remaining > 0 else None
+
+    def peek(self, key: str, limit: int, window_seconds: float, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        ventana = int(now // window_seconds)
+        db = self._session()
+        try:
+            locked = self._lockout(db, key, now)
+            if locked is not None:
+                return locked
+            previous, current = self._counts(db, key, ventana)
+        finally:
+            db.close()
+        estimate = self._estimate(previous, current, window_seconds, now)
+        if estimate < limit:
+            return RateLimitResult(True, int(limit - estimate), 0)
+        return RateLimitResult(False, 0, self._retry_after(window_seconds, now))
+
+    def attempt(self, key: str, limit: int, window_seconds: float, now: Optional[float] = None) -> RateLimitResult:
+        now = time.time() if now is None else now
+        ventana = int(now // window_seconds)
+        expira_en = datetime.utcnow() + timedelta(seconds=2 * window_seconds)
+        db = self._session()
+        try:
+            locked = self._lockout(db, key, now)
+            if locked is not None:
+                return locked
+            current = self._increment(db, key, ventana, 1, expira_en)
+            previous, _ = self._counts(db, key, ventana)
+            estimate = self._estimate(previous, current, window_seconds, now)
+            if estimate > limit:
+                # Rejected attempts don't consume the budget
+                db.execute(
+                    update(RateLimitCounter)
+                    .where(RateLimitCounter.clave == key, RateLimitCounter.ventana == ventana)
+                    .values(contador=RateLimitCounter.contador - 1)
+                )
+                db.commit()
+                return RateLimitResult(False, 0, self._retry_after(window_seconds, now))
+            db.commit()
+            return RateLimitResult(True, int(limit - estimate), 0)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def record(self, key: str, window_seconds: float, now: Optional[float] = None,
+               lock_after: Optional[int] = None, lockout_seconds: Optional[float] = None) -> bool:
+        """Count one hit; True when it reaches lock_after in the window and locked the key"""
+        now = time.time() if now is None else now
+        ventana = int(now // window_seconds)
+        expira_en = datetime.utcnow() + timedelta(seconds=2 * window_seconds)
+        db = self._session()
+        try:
+            current = self._increment(db, key, ventana, 1, expira_en)
+            locking = False
+            if lock_after is not None:
+                previous, _ = self._counts(db, key, ventana)
+                locking = self._estimate(previous, current, window_seconds, now) >= lock_after
+            if locking:
+                # The lockout replaces the counters: once it ends the key starts clean
+                db.execute(delete(RateLimitCounter).where(RateLimitCounter.clave == key))
+                db.add(RateLimitCounter(clave=key, ventana=self.LOCK_WINDOW, contador=0,
+                                        expira_en=datetime.utcfromtimestamp(now + lockout_seconds)))
+            db.commit()
+            return locking
+        except IntegrityError:
+            # Another replica recorded the locking failure at the same moment
+            db.rollback()
+            return True
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def reset(self, key: str) -> None:
+        db = self._session()
+        try:
+            db.execute(delete(RateLimitCounter).where(RateLimitCounter.clave == key))
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_expired(self, db) -> int:
+        """Delete counters whose windows no longer matter (run periodically)"""
+        result = db.execute(delete(RateLimitCounter).where(RateLimitCounter.expira_en < datetime.utcnow()))
+        db.commit()
+        return result.rowcount
+
+
+def _create_backend():
+    if settings.RATE_LIMIT_BACKEND == "sql":
+        return SQLRateLimitBackend()
+    return MemoryRateLimitBackend()
+
+
+# Global rate limiter backend, selected by RATE_LIMIT_BACKEND ("memory" | "sql")
+rate_limiter = _create_backend()
+
+
+class RateLimit:
+    """
+    FastAPI dependency enforcing `limit` calls per `window_seconds` per key.
+
+    Usage:
+        @router.post("/{producto_id}/reabastecer",
+                     dependencies=[Depends(RateLimit("restock", 10, 3600, key_param="producto_id"))])
+    Without key_param the client IP is used.
+    """
+
+    def __init__(self, scope: str, limit: int, window_seconds: float, key_param: Optional[str] = None,
+                 message: str = "Demasiadas solicitudes. Intenta más tarde.", backend=None):
+        self.scope = scope
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.key_param = key_param
+        self.message = message
+        self.backend = backend
+
+    def _key(self, request: Request) -> str:
+        if self.key_param:
+            value = request.path_params.get(self.key_param) or request.query_params.get(self.key_param)
+        else:
+            value = request.client.host if request.client else "unknown"
+        return f"{self.scope}:{value}"
+
+    async def __call__(self, request: Request) -> RateLimitResult:
+        backend = self.backend or rate_limiter
+        result = backend.attempt(self._key(request), self.limit, self.window_seconds)
+        if not result.allowed:
+            raise RateLimitExceeded(result.retry_after, self.message)
+        return result
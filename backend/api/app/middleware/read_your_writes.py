@@ -0,0 +1,41 @@
+"""
+Read-your-writes for replica routing
+After a successful write request (POST/PUT/PATCH/DELETE answered below 400) the client is
+pinned to the primary for READ_YOUR_WRITES_SECONDS: a cookie carries the window end, and the
+client's session id / bearer token is remembered in-process for clients that drop cookies.
+get_read_db (app.database) honours both.
+"""
+import math
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app import database
+from app.config import settings
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware marking clients that just wrote"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_marked(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = database.read_your_writes.mark(HTTPConnection(scope))
+                MutableHeaders(scope=message).append(
+                    "set-cookie",
+                    f"{database.READ_YOUR_WRITES_COOKIE}={math.ceil(until)}; Max-Age={settings.READ_YOUR_WRITES_SECONDS}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_marked)
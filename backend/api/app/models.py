@@ -1,7 +1,9 @@
 """
 SQLAlchemy models for the application
 """
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Text, Boolean, Date, DateTime, Numeric, ForeignKey, UniqueConstraint, Index, desc
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -18,3 +20,318 @@ class CarruselImagen(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
     activo = Column(Boolean, nullable=False, default=True)
+
+
+class Usuario(Base):
+    __tablename__ = 'Usuarios'
+
+    id = Column(Integer, primary_key=True)
+    nombre_completo = Column(String(100), nullable=False, index=True)
+    email = Column(String(100), nullable=False, unique=True, index=True)
+    cedula = Column(String(20), nullable=False, unique=True, index=True)
+    password_hash = Column(String, nullable=False)
+    es_admin = Column(Boolean, default=False)
+    is_active = Column(Boolean, default=False)
+    fecha_registro = Column(DateTime, server_default=func.now())
+    ultimo_login = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+    # UTC, like UsuarioBusqueda.fecha_indexado: user_search_service.refresh compares the two
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=datetime.utcnow)
+
+
+class UsuarioBusqueda(Base):
+    """Accent-folded, lowercased copies of the searchable user fields"""
+    __tablename__ = 'UsuariosBusqueda'
+
+    usuario_id = Column(Integer, ForeignKey('Usuarios.id', ondelete='CASCADE'), primary_key=True, autoincrement=False)
+    nombre_normalizado = Column(String(100), nullable=False, index=True)
+    email_normalizado = Column(String(100), nullable=False, index=True)
+    fecha_indexado = Column(DateTime, nullable=False)
+
+
+class UsuarioTrigrama(Base):
+    """Trigram index over the normalized fields (campo 'n' = nombre, 'e' = email)"""
+    __tablename__ = 'UsuariosTrigramas'
+
+    campo = Column(String(1), primary_key=True)
+    trigrama = Column(String(3), primary_key=True)
+    usuario_id = Column(Integer, ForeignKey('Usuarios.id', ondelete='CASCADE'), primary_key=True,
+                        autoincrement=False, index=True)
+
+
+class Categoria(Base):
+    __tablename__ = 'Categorias'
+
+    id = Column(Integer, primary_key=True)
+    nombre = Column(String(100), nullable=False, unique=True)
+    descripcion = Column(String(500), nullable=True)
+    activo = Column(Boolean, default=True)
+    fecha_creacion = Column(DateTime, server_default=func.now())
+    fecha_actualizacion = Column(DateTime, server_default=func.now())
+
+
+class Subcategoria(Base):
+    __tablename__ = 'Subcategorias'
+
+    id = Column(Integer, primary_key=True)
+    categoria_id = Column(Integer, ForeignKey('Categorias.id', ondelete='CASCADE'), nullable=False, index=True)
+    nombre = Column(String(100), nullable=False)
+    descripcion = Column(String(500), nullable=True)
+    activo = Column(Boolean, default=True)
+    fecha_creacion = Column(DateTime, server_default=func.now())
+
+
+class Producto(Base):
+    __tablename__ = 'Productos'
+
+    id = Column(Integer, primary_key=True)
+    nombre = Column(String(100), nullable=False, index=True)
+    descripcion = Column(String(500), nullable=True)
+    precio = Column(Numeric(10, 2), nullable=False)
+    peso_gramos = Column(Integer, nullable=False)
+    cantidad_disponible = Column(Integer, nullable=False, default=0)
+    sku = Column(String(50), nullable=True, unique=True)
+    categoria_id = Column(Integer, ForeignKey('Categorias.id'), nullable=False, index=True)
+    subcategoria_id = Column(Integer, ForeignKey('Subcategorias.id'), nullable=False, index=True)
+    activo = Column(Boolean, default=True)
+    fecha_creacion = Column(DateTime, server_default=func.now())
+    fecha_actualizacion = Column(DateTime, server_default=func.now())
+
+
+class Pedido(Base):
+    __tablename__ = 'Pedidos'
+    __table_args__ = (
+        Index('idx_pedido_usuario_fecha', 'usuario_id', desc('fecha_creacion')),
+    )
+
+    id = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, ForeignKey('Usuarios.id'), nullable=False, index=True)
+    estado = Column(String(50), nullable=False, default='Pendiente', index=True)
+    total = Column(Numeric(10, 2), nullable=False, default=0)
+    direccion_entrega = Column(String(500), nullable=False)
+    telefono_contacto = Column(String(20), nullable=False)
+    nota_especial = Column(String(500), nullable=True)
+    fecha_creacion = Column(DateTime, server_default=func.now(), index=True)
+    fecha_actualizacion = Column(DateTime, server_default=func.now())
+
+
+class PedidoItem(Base):
+    __tablename__ = 'PedidoItems'
+    __table_args__ = (
+        Index('idx_pedidoitem_pedido_cubre', 'pedido_id',
+              mssql_include=['producto_id', 'cantidad', 'precio_unitario']),
+    )
+
+    id = Column(Integer, primary_key=True)
+    pedido_id = Column(Integer, ForeignKey('Pedidos.id', ondelete='CASCADE'), nullable=False, index=True)
+    producto_id = Column(Integer, ForeignKey('Productos.id'), nullable=False)
+    cantidad = Column(Integer, nullable=False)
+    precio_unitario = Column(Numeric(10, 2), nullable=False)
+
+
+class PedidoHistorialEstado(Base):
+    __tablename__ = 'PedidosHistorialEstado'
+
+    id = Column(Integer, primary_key=True)
+    pedido_id = Column(Integer, ForeignKey('Pedidos.id', ondelete='CASCADE'), nullable=False, index=True)
+    estado_anterior = Column(String(50), nullable=True)
+    estado_nuevo = Column(String(50), nullable=False)
+    usuario_id = Column(Integer, ForeignKey('Usuarios.id'), nullable=True)
+    nota = Column(String(300), nullable=True)
+    fecha = Column(DateTime, server_default=func.now(), index=True)
+
+
+class PedidoEstadistica(Base):
+    """Order counters per creation day and estado, maintained on every transition"""
+    __tablename__ = 'PedidosEstadisticas'
+
+    dia = Column(Date, primary_key=True)
+    estado = Column(String(50), primary_key=True)
+    cantidad = Column(Integer, nullable=False, default=0)
+    ingresos = Column(Numeric(14, 2), nullable=False, default=0)
+    fecha_actualizacion = Column(DateTime, server_default=func.now())
+
+
+class UsuarioEstadistica(Base):
+    """Per-customer order aggregates for the admin profile, maintained on order events"""
+    __tablename__ = 'UsuariosEstadisticas'
+
+    usuario_id = Column(Integer, ForeignKey('Usuarios.id'), primary_key=True, autoincrement=False)
+    total_pedidos = Column(Integer, nullable=False, default=0)
+    total_gastado = Column(Numeric(14, 2), nullable=False, default=0)
+    ultimo_pedido = Column(DateTime, nullable=True)
+    categoria_preferida_id = Column(Integer, ForeignKey('Categorias.id'), nullable=True)
+    fecha_actualizacion = Column(DateTime, server_default=func.now())
+
+
+class UsuarioCategoriaEstadistica(Base):
+    """Units bought per customer and category (source of the preferred category)"""
+    __tablename__ = 'UsuariosCategoriasEstadisticas'
+
+    usuario_id = Column(Integer, ForeignKey('Usuarios.id'), primary_key=True, autoincrement=False)
+    categoria_id = Column(Integer, ForeignKey('Categorias.id'), primary_key=True, autoincrement=False)
+    unidades = Column(Integer, nullable=False, default=0)
+
+
+class InventarioHistorial(Base):
+    __tablename__ = 'InventarioHistorial'
+
+    id = Column(Integer, primary_key=True)
+    producto_id = Column(Integer, ForeignKey('Productos.id'), nullable=False, index=True)
+    cantidad_anterior = Column(Integer, nullable=False)
+    cantidad_nueva = Column(Integer, nullable=False)
+    tipo_movimiento = Column(String(50), nullable=False)
+    referencia = Column(String(200), nullable=True)
+    usuario_id = Column(Integer, ForeignKey('Usuarios.id'), nullable=True)
+    fecha = Column(DateTime, server_default=func.now(), index=True)
+    journal_id = Column(String(32), nullable=True, unique=True)
+
+
+class InventarioResumen(Base):
+    """Per-product movement aggregates, maintained alongside InventarioHistorial"""
+    __tablename__ = 'InventarioResumen'
+
+    producto_id = Column(Integer, ForeignKey('Productos.id'), primary_key=True, autoincrement=False)
+    ultimo_reabastecimiento = Column(DateTime, nullable=True)
+    total_movimientos = Column(Integer, nullable=False, default=0)
+    unidades_entrada = Column(Integer, nullable=False, default=0)
+    unidades_salida = Column(Integer, nullable=False, default=0)
+    fecha_actualizacion = Column(DateTime, server_default=func.now())
+
+
+class InventarioReserva(Base):
+    """Stock held for a cart until it is released or expires"""
+    __tablename__ = 'InventarioReservas'
+    __table_args__ = (
+        UniqueConstraint('clave', 'producto_id', name='uq_reserva_clave_producto'),
+        Index('idx_reserva_estado_expira', 'estado', 'expira_en'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    clave = Column(String(100), nullable=False)
+    producto_id = Column(Integer, ForeignKey('Productos.id'), nullable=False)
+    cantidad = Column(Integer, nullable=False)
+    estado = Column(String(20), nullable=False, default='ACTIVA')
+    usuario_id = Column(Integer, ForeignKey('Usuarios.id'), nullable=True)
+    expira_en = Column(DateTime, nullable=False)
+    fecha_creacion = Column(DateTime, server_default=func.now())
+
+
+class RateLimitCounter(Base):
+    """Per-key, per-window hit counter shared by all API replicas"""
+    __tablename__ = 'RateLimitCounters'
+
+    clave = Column(String(200), primary_key=True)
+    ventana = Column(Integer, primary_key=True, autoincrement=False)
+    contador = Column(Integer, nullable=False, default=0)
+    expira_en = Column(DateTime, nullable=False, index=True)
+
+
+class VerificationCode(Base):
+    """Hashed 6-digit email verification code (the durable copy of the in-memory store)"""
+    __tablename__ = 'VerificationCodes'
+    __table_args__ = (
+        Index('idx_verif_usuario', 'usuario_id'),
+        Index('idx_verif_expira', 'expira_en'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, ForeignKey('Usuarios.id', ondelete='CASCADE'), nullable=False)
+    code_hash = Column(String, nullable=False)
+    expira_en = Column(DateTime, nullable=False)
+    intentos_fallidos = Column(Integer, default=0)
+    usado = Column(Boolean, default=False)
+    fecha_creacion = Column(DateTime, server_default=func.now())
+
+
+class Cart(Base):
+    __tablename__ = 'Carts'
+
+    id = Column(Integer, primary_key=True)
+    usuario_id = Column(Integer, ForeignKey('Usuarios.id'), nullable=True, index=True)
+    session_id = Column(String(100), nullable=True, index=True)
+    fecha_creacion = Column(DateTime, server_default=func.now())
+    fecha_actualizacion = Column(DateTime, server_default=func.now())
+
+
+class CartItem(Base):
+    __tablename__ = 'CartItems'
+    __table_args__ = (
+        UniqueConstraint('cart_id', 'producto_id', name='uq_cartitem_cart_producto'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    cart_id = Column(Integer, ForeignKey('Carts.id', ondelete='CASCADE'), nullable=False, index=True)
+    producto_id = Column(Integer, ForeignKey('Productos.id'), nullable=False, index=True)
+    cantidad = Column(Integer, nullable=False)
+    precio_unitario = Column(Numeric(10, 2), nullable=False)
+    fecha_agregado = Column(DateTime, server_default=func.now())
+
+
+class CartSnapshot(Base):
+    """Shared hot tier for carts (CART_BACKEND=sql): one serialized cart per owner"""
+    __tablename__ = 'CartSnapshots'
+
+    clave = Column(String(120), primary_key=True)
+    datos = Column(Text, nullable=False)
+    version = Column(Integer, nullable=False, default=1)
+    sucio_desde = Column(DateTime, nullable=True, index=True)
+    fecha_actualizacion = Column(DateTime, nullable=False)
+
+
+# Archive tables: same columns as their hot counterparts, rows moved there by the archival job
+class PedidoArchivo(Base):
+    """Delivered/cancelled orders older than the archive horizon"""
+    __tablename__ = 'PedidosArchivo'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    usuario_id = Column(Integer, nullable=False, index=True)
+    estado = Column(String(50), nullable=False)
+    total = Column(Numeric(10, 2), nullable=False, default=0)
+    direccion_entrega = Column(String(500), nullable=False)
+    telefono_contacto = Column(String(20), nullable=False)
+    nota_especial = Column(String(500), nullable=True)
+    fecha_creacion = Column(DateTime, index=True)
+    fecha_actualizacion = Column(DateTime)
+
+
+class PedidoItemArchivo(Base):
+    __tablename__ = 'PedidoItemsArchivo'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    pedido_id = Column(Integer, nullable=False, index=True)
+    producto_id = Column(Integer, nullable=False)
+    cantidad = Column(Integer, nullable=False)
+    precio_unitario = Column(Numeric(10, 2), nullable=False)
+
+
+class PedidoHistorialEstadoArchivo(Base):
+    __tablename__ = 'PedidosHistorialEstadoArchivo'
+    __table_args__ = (
+        Index('idx_historial_archivo_pedido_fecha', 'pedido_id', 'fecha'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    pedido_id = Column(Integer, nullable=False)
+    estado_anterior = Column(String(50), nullable=True)
+    estado_nuevo = Column(String(50), nullable=False)
+    usuario_id = Column(Integer, nullable=True)
+    nota = Column(String(300), nullable=True)
+    fecha = Column(DateTime)
+
+
+class InventarioHistorialArchivo(Base):
+    __tablename__ = 'InventarioHistorialArchivo'
+    __table_args__ = (
+        Index('idx_inventario_archivo_producto_fecha', 'producto_id', 'fecha'),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    producto_id = Column(Integer, nullable=False)
+    cantidad_anterior = Column(Integer, nullable=False)
+    cantidad_nueva = Column(Integer, nullable=False)
+    tipo_movimiento = Column(String(50), nullable=False)
+    referencia = Column(String(200), nullable=True)
+    usuario_id = Column(Integer, nullable=True)
+    fecha = Column(DateTime)
+    journal_id = Column(String(32), nullable=True)
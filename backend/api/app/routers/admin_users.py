@@ -3,10 +3,16 @@ Admin Users router: View customer profiles and order history
 Handles HU_MANAGE_USERS
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
-from app.schemas import UsuarioDetailResponse, PedidoResponse
-from app.database import get_db
+from typing import FrozenSet, List, Optional
+from app.schemas import UsuarioDetailResponse, PedidoResponse, UsuarioStatsBatchRequest, UsuarioStatsResponse
+from app.database import get_db, get_read_db
+from app import models
+from app.services.order_service import order_service
+from app.services.user_stats_service import user_stats_service
+from app.services.user_search_service import user_search_service, CursorInvalidoError
+from app.utils.serialization import ORJSONResponse, SparseFields, serializer_for
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,35 +25,55 @@ router = APIRouter(
 
 @router.get("", response_model=List[UsuarioDetailResponse])
 async def list_users(
-    nombre: str = Query(None),
-    email: str = Query(None),
-    cedula: str = Query(None),
-    skip: int = Query(0, ge=0),
+    q: str = Query(None, max_length=100),
+    nombre: str = Query(None, max_length=100),
+    email: str = Query(None, max_length=100),
+    cedula: str = Query(None, max_length=20),
+    cursor: str = Query(None),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    fields: Optional[FrozenSet[str]] = Depends(SparseFields(UsuarioDetailResponse)),
+    db: Session = Depends(get_read_db)
 ):
     """
     List all customers with optional search
     
     Requirements (HU_MANAGE_USERS):
-    - Search by nombre, email, or cedula (case-insensitive)
-    - Sort by fecha_registro DESC (newest first)
+    - Search by nombre or email (case- and accent-insensitive, prefix or substring), cedula exact,
+      or `q` across the three; results ranked by match quality
+    - Without search terms: sort by fecha_registro DESC (newest first)
     - Return user details but NO password
-    - Pagination support
-    - Database indexes on email, cedula, nombre for performance
+    - Keyset pagination: pass the X-Next-Cursor header of a page as `cursor` to get the next one
+    - Served from the UsuariosBusqueda/UsuariosTrigramas index, never a scan of Usuarios
+    - fields=id,nombre_completo,email returns (and loads) only those columns
     """
-    # TODO: Implement list users logic
-    # 1. Query Usuarios table
-    # 2. Apply search filters (nombre LIKE, email LIKE, cedula exact)
-    # 3. Sort by fecha_registro DESC
-    # 4. Apply pagination
-    # 5. Do NOT include password_hash
-    # 6. Return users
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    try:
+        usuarios, siguiente = user_search_service.search(
+            db, q=q, nombre=nombre, email=email, cedula=cedula, cursor=cursor, limit=limit, fields=fields
+        )
+    except CursorInvalidoError:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"status": "error", "message": "Cursor inválido."})
+    headers = {"X-Next-Cursor": siguiente} if siguiente else None
+    return ORJSONResponse(content=serializer_for(UsuarioDetailResponse).project(fields).to_list(usuarios),
+                          headers=headers)
+
+
+@router.post("/stats/batch")
+async def get_users_stats_batch(request: UsuarioStatsBatchRequest, db: Session = Depends(get_db)):
+    """
+    Customer statistics for a whole listing page in one round trip
+    Unknown ids are listed in `faltantes` instead of failing the whole request
+    """
+    usuario_ids = list(dict.fromkeys(request.usuario_ids))
+    stats = user_stats_service.stats_for(db, usuario_ids)
+    return JSONResponse(status_code=status.HTTP_200_OK, content={
+        "status": "success",
+        "data": [UsuarioStatsResponse(**stats[uid]).model_dump(mode="json") for uid in usuario_ids if uid in stats],
+        "faltantes": [uid for uid in usuario_ids if uid not in stats],
+    })
 
 
 @router.get("/{usuario_id}", response_model=UsuarioDetailResponse)
-async def get_user(usuario_id: int, db: Session = Depends(get_db)):
+async def get_user(usuario_id: int, db: Session = Depends(get_read_db)):
     """
     Get customer profile details
     
@@ -69,7 +95,8 @@ async def get_user_orders(
     usuario_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    fields: Optional[FrozenSet[str]] = Depends(SparseFields(PedidoResponse)),
+    db: Session = Depends(get_read_db)
 ):
     """
     Get order history for customer
@@ -80,18 +107,15 @@ async def get_user_orders(
     - Include all pedido items
     - Pagination support
     """
-    # TODO: Implement get user orders logic
-    # 1. Validate usuario exists
-    # 2. Query Pedidos for usuario_id
-    # 3. Include PedidoItems
-    # 4. Sort by fecha_creacion DESC
-    # 5. Apply pagination
-    # 6. Return orders
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    pedidos = order_service.list_orders(db, usuario_id=usuario_id, skip=skip, limit=limit, fields=fields)
+    # Only an empty page needs the extra lookup to tell "no orders" from "no user"
+    if not pedidos and db.query(models.Usuario.id).filter(models.Usuario.id == usuario_id).first() is None:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"status": "error", "message": "Usuario no encontrado."})
+    return ORJSONResponse(content=pedidos)
 
 
 @router.get("/{usuario_id}/stats")
-async def get_user_stats(usuario_id: int, db: Session = Depends(get_db)):
+async def get_user_stats(usuario_id: int, db: Session = Depends(get_read_db)):
     """
     Get customer statistics
     
@@ -100,6 +124,13 @@ async def get_user_stats(usuario_id: int, db: Session = Depends(get_db)):
     - Total spent (sum of pedido totals)
     - Last order date
     - Preferred category (most purchased)
+
+    Read from the UsuariosEstadisticas projection (one row), not aggregated per request.
     """
-    # TODO: Implement user stats logic
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    stats = user_stats_service.stats_for(db, [usuario_id]).get(usuario_id)
+    if stats is None:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"status": "error", "message": "Usuario no encontrado."})
+    return JSONResponse(status_code=status.HTTP_200_OK, content={
+        "status": "success",
+        "data": UsuarioStatsResponse(**stats).model_dump(mode="json"),
+    })
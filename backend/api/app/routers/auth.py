@@ -2,15 +2,31 @@
 Authentication router: Register, Login, Logout, Token refresh
 Handles HU_REGISTER_USER and HU_LOGIN_USER
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request, Header, Cookie
+from fastapi.responses import JSONResponse
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from typing import Optional
 from app.schemas import RegisterRequest, LoginRequest, TokenResponse, VerificationCodeRequest
 from app.database import get_db
+from app.config import settings
+from app.events import EMAIL_VERIFICATION_QUEUE, AuthLoginEvent, EmailVerificationEvent
+from app import models
+from app.middleware.rate_limiting import rate_limiter, RateLimitExceeded
+from app.services.cart_merge_service import cart_merge_service
+from app.services.cart_service import to_response, valid_session_id
+from app.services.user_search_service import user_search_service
+from app.services.verification_service import verification_service, VerificationError, DemasiadosIntentosError
 from app.utils import security_utils
+from app.utils.rabbitmq import rabbitmq_producer
 import logging
+from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+LOGIN_LOCKOUT_MESSAGE = "Cuenta bloqueada temporalmente por múltiples intentos fallidos. Intenta más tarde."
+
 router = APIRouter(
     prefix="/api/auth",
     tags=["auth"]
@@ -28,15 +44,50 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
     - Sends verification email with 6-digit code (10 min expiry)
     - Publishes to email.verification queue
     """
-    # TODO: Implement registration logic
-    # 1. Validate password strength
-    # 2. Check email uniqueness
-    # 3. Hash password using bcrypt
-    # 4. Create usuario entry (is_active=False)
-    # 5. Generate and store verification code
-    # 6. Publish email.verification queue message
-    # 7. Return temporary token or pending status
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    duplicado = db.execute(
+        select(models.Usuario.email, models.Usuario.cedula)
+        .where(or_(models.Usuario.email == request.email, models.Usuario.cedula == request.cedula))
+        .limit(1)
+    ).first()
+    if duplicado is not None:
+        message = "El correo ya está registrado." if duplicado.email == request.email else "La cédula ya está registrada."
+        return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"status": "error", "message": message})
+
+    usuario = models.Usuario(
+        nombre_completo=request.nombre_completo,
+        email=request.email,
+        cedula=request.cedula,
+        password_hash=security_utils.hash_password(request.password),
+        is_active=False,
+    )
+    try:
+        db.add(usuario)
+        db.flush()
+        user_search_service.index_users(db, [usuario])
+        code, expira_en = verification_service.issue(db, usuario.id, usuario.email)
+        db.commit()
+    except IntegrityError:
+        # Lost a race against a concurrent registration with the same email/cedula
+        db.rollback()
+        verification_service.forget(request.email)
+        return JSONResponse(status_code=status.HTTP_409_CONFLICT,
+                            content={"status": "error", "message": "El correo o la cédula ya están registrados."})
+    except Exception as e:
+        db.rollback()
+        verification_service.forget(request.email)
+        logger.error(f"Error registering {request.email}: {str(e)}")
+        return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            content={"status": "error", "message": "Error al registrar el usuario."})
+
+    rabbitmq_producer.publish_event(EMAIL_VERIFICATION_QUEUE, EmailVerificationEvent(
+        usuarioId=usuario.id, email=usuario.email, nombre=usuario.nombre_completo, codigo=code, expiraEn=expira_en
+    ))
+
+    return JSONResponse(status_code=status.HTTP_201_CREATED, content={
+        "status": "success",
+        "message": "Registro exitoso. Revisa tu correo para verificar tu cuenta.",
+        "data": {"id": usuario.id, "email": usuario.email}
+    })
 
 
 @router.post("/verify-email")
@@ -49,12 +100,38 @@ async def verify_email(request: VerificationCodeRequest, db: Session = Depends(g
     - Code expires after 10 minutes
     - Mark usuario as is_active=True after verification
     """
-    # TODO: Implement email verification logic
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    try:
+        usuario_id = verification_service.verify(db, request.email, request.code)
+    except DemasiadosIntentosError as e:
+        raise RateLimitExceeded(e.retry_after, e.message)
+    except VerificationError as e:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"status": "error", "message": e.message})
+
+    try:
+        db.execute(update(models.Usuario).where(models.Usuario.id == usuario_id).values(is_active=True))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error activating user {usuario_id}: {str(e)}")
+        return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            content={"status": "error", "message": "Error al verificar el correo."})
+
+    return JSONResponse(status_code=status.HTTP_200_OK,
+                        content={"status": "success", "message": "Correo verificado. Ya puedes iniciar sesión."})
+
+
+def _publish_auth_event(action: str, usuario_id: Optional[int]):
+    """Publish auth.login audit event (non-blocking best-effort)"""
+    rabbitmq_producer.publish_event("auth.login", AuthLoginEvent(usuarioId=usuario_id), action=action)
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(request: LoginRequest, response: Response, db: Session = Depends(get_db)):
+async def login(
+    request: LoginRequest,
+    session_id: Optional[str] = Header(None),
+    session_cookie: Optional[str] = Cookie(None, alias="session_id"),
+    db: Session = Depends(get_db)
+):
     """
     User login with credentials
     
@@ -65,17 +142,69 @@ async def login(request: LoginRequest, response: Response, db: Session = Depends
     - Rate limiting: 5 failed attempts = 15 min lockout
     - Publishes to auth.login queue
     """
-    # TODO: Implement login logic
-    # 1. Find usuario by email
-    # 2. Verify password
-    # 3. Check login attempts (lockout after 5 failures)
-    # 4. Reset failed attempts counter
-    # 5. Generate JWT tokens
-    # 6. Set refresh token in HttpOnly cookie
-    # 7. Merge anonymous cart to user cart
-    # 8. Publish auth.login queue message
-    # 9. Return access token
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    # Lockout check is served by the rate limiter (no COUNT over an attempts table)
+    attempts_key = f"login:{request.email.lower()}"
+    lockout_seconds = settings.LOGIN_LOCKOUT_DURATION_MINUTES * 60
+    lockout = rate_limiter.peek(attempts_key, settings.MAX_LOGIN_ATTEMPTS, lockout_seconds)
+    if not lockout.allowed:
+        raise RateLimitExceeded(lockout.retry_after, LOGIN_LOCKOUT_MESSAGE, status.HTTP_423_LOCKED)
+
+    usuario = db.query(models.Usuario).filter(models.Usuario.email == request.email).first()
+    if usuario is None or not security_utils.verify_password(request.password, usuario.password_hash):
+        # The MAX_LOGIN_ATTEMPTS-th failure locks the account for the full lockout from now
+        rate_limiter.record(attempts_key, lockout_seconds, lock_after=settings.MAX_LOGIN_ATTEMPTS,
+                            lockout_seconds=lockout_seconds)
+        _publish_auth_event("login_failed", None)
+        return JSONResponse(status_code=status.HTTP_401_UNAUTHORIZED, content={"status": "error", "message": "Correo o contraseña incorrectos"})
+
+    if not usuario.is_active:
+        return JSONResponse(status_code=status.HTTP_403_FORBIDDEN, content={"status": "error", "message": "Cuenta no verificada. Revisa tu correo."})
+
+    rate_limiter.reset(attempts_key)
+
+    try:
+        usuario.ultimo_login = datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        logger.warning(f"Could not update ultimo_login for user {usuario.id}: {str(e)}")
+        db.rollback()
+
+    claims = {"sub": str(usuario.id), "email": usuario.email}
+    access_token = security_utils.create_access_token(claims)
+    refresh_token = security_utils.create_refresh_token(claims)
+
+    # Merge the anonymous cart in one set-based statement; a failure must not block the login
+    cart = None
+    session_id = valid_session_id(session_id or session_cookie)
+    if session_id:
+        try:
+            cart = cart_merge_service.merge(db, session_id, usuario.id)
+        except Exception as e:
+            logger.warning(f"Could not merge cart of session {session_id} into user {usuario.id}: {str(e)}")
+
+    _publish_auth_event("login_success", usuario.id)
+
+    content = {
+        "status": "success",
+        "message": "Inicio de sesión exitoso",
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+    if cart is not None:
+        content["cart"] = to_response(cart)
+    response = JSONResponse(status_code=status.HTTP_200_OK, content=content)
+    if session_cookie:
+        response.delete_cookie("session_id")
+    response.set_cookie(
+        "refresh_token",
+        refresh_token,
+        max_age=settings.REFRESH_TOKEN_EXPIRE_DAYS * 86400,
+        httponly=True,
+        secure=not settings.DEBUG,
+        samesite="strict"
+    )
+    return response
 
 
 @router.post("/refresh")
@@ -2,7 +2,7 @@
 Carousel router: Manage homepage carousel images
 Handles HU_MANAGE_CAROUSEL
 """
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Body
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Body, Request
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
@@ -10,11 +10,18 @@ from app.schemas import CarruselImagenCreate, CarruselImagenResponse, CarruselIm
 from app.database import get_db
 from app import models
 from app.config import settings
+from app.events import (
+    CarruselImagenCreadaEvent,
+    CarruselImagenActualizadaEvent,
+    CarruselImagenEliminadaEvent,
+    CarruselReordenadoEvent,
+)
+from app.services.catalog_service import catalog_service
 from app.utils.rabbitmq import rabbitmq_producer
+from app.utils.serialization import serializer_for
 import logging
 import os
 import uuid
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
@@ -23,9 +30,12 @@ router = APIRouter(
     tags=["carousel"]
 )
 
+# Precomputed: carousel rows are rendered straight to JSON, without the response_model round-trip
+imagen_serializer = serializer_for(CarruselImagenResponse)
+
 
 @router.get("", response_model=List[CarruselImagenResponse])
-async def list_carousel_images(db: Session = Depends(get_db)):
+async def list_carousel_images(request: Request):
     """
     List all carousel images ordered by position
     
@@ -35,8 +45,9 @@ async def list_carousel_images(db: Session = Depends(get_db)):
     - Include ruta_imagen and link_url
     - Only active images
     """
-    images = db.query(models.CarruselImagen).filter(models.CarruselImagen.activo == True).order_by(models.CarruselImagen.orden.asc()).limit(5).all()
-    return images
+    # Rendered once per change (shared with /api/home/bundle); 304 when the client's ETag is current.
+    # Concurrent misses share one load
+    return (await catalog_service.carousel()).response(request)
 
 
 @router.post("", response_model=CarruselImagenResponse)
@@ -114,28 +125,12 @@ async def add_carousel_image(
         db.rollback()
         return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"status": "error", "message": "Formato o tamaño de imagen no válido."})
 
+    catalog_service.invalidate_carousel()
+
     # Publish message to RabbitMQ (non-blocking best-effort)
-    try:
-        rabbitmq_producer.connect()
-        request_id = uuid.uuid4().hex
-        message = {
-            "requestId": request_id,
-            "action": "crear_imagen",
-            "payload": {
-                "imagenPath": saved_path,
-                "linkUrl": link_url,
-                "created_by": created_by
-            },
-            "meta": {"timestamp": datetime.utcnow().isoformat()}
-        }
-        rabbitmq_producer.publish("carrusel.imagen.crear", message)
-    except Exception as e:
-        logger.warning(f"Could not publish RabbitMQ message: {str(e)}")
-    finally:
-        try:
-            rabbitmq_producer.close()
-        except Exception:
-            pass
+    rabbitmq_producer.publish_event("carrusel.imagen.crear", CarruselImagenCreadaEvent(
+        imagenPath=saved_path, linkUrl=link_url, created_by=created_by
+    ))
 
     return JSONResponse(status_code=status.HTTP_201_CREATED, content={"status": "success", "message": "Imagen agregada al carrusel"})
 
@@ -185,25 +180,14 @@ async def update_carousel_image(
         db.rollback()
         return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"status": "error", "message": "Formato o tamaño de imagen no válido."})
 
+    catalog_service.invalidate_carousel()
+
     # Publish update message
-    try:
-        rabbitmq_producer.connect()
-        message = {
-            "requestId": uuid.uuid4().hex,
-            "action": "actualizar_imagen",
-            "payload": {"id": imagen_id, "orden": img.orden, "linkUrl": img.link_url},
-            "meta": {"timestamp": datetime.utcnow().isoformat()}
-        }
-        rabbitmq_producer.publish("carrusel.imagen.actualizar", message)
-    except Exception as e:
-        logger.warning(f"Could not publish RabbitMQ update message: {str(e)}")
-    finally:
-        try:
-            rabbitmq_producer.close()
-        except Exception:
-            pass
+    rabbitmq_producer.publish_event("carrusel.imagen.actualizar", CarruselImagenActualizadaEvent(
+        id=imagen_id, orden=img.orden, linkUrl=img.link_url
+    ))
 
-    return img
+    return imagen_serializer.response(img)
 
 
 @router.delete("/{imagen_id}")
@@ -241,24 +225,10 @@ async def delete_carousel_image(imagen_id: int, db: Session = Depends(get_db)):
     except Exception as e:
         logger.warning(f"Failed to reindex after delete: {str(e)}")
         db.rollback()
+    catalog_service.invalidate_carousel()
 
     # Publish delete message
-    try:
-        rabbitmq_producer.connect()
-        message = {
-            "requestId": uuid.uuid4().hex,
-            "action": "eliminar_imagen",
-            "payload": {"id": imagen_id},
-            "meta": {"timestamp": datetime.utcnow().isoformat()}
-        }
-        rabbitmq_producer.publish("carrusel.imagen.eliminar", message)
-    except Exception as e:
-        logger.warning(f"Could not publish RabbitMQ delete message: {str(e)}")
-    finally:
-        try:
-            rabbitmq_producer.close()
-        except Exception:
-            pass
+    rabbitmq_producer.publish_event("carrusel.imagen.eliminar", CarruselImagenEliminadaEvent(id=imagen_id))
 
     return JSONResponse(status_code=status.HTTP_200_OK, content={"status": "success", "message": "Imagen eliminada exitosamente"})
 
@@ -299,25 +269,13 @@ async def reorder_carousel(
         db.rollback()
         return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"status": "error", "message": "El orden debe ser un número entero positivo y único."})
 
+    catalog_service.invalidate_carousel()
+
     # Publish reorder message with current ordering snapshot
-    try:
-        rabbitmq_producer.connect()
-        active_images = db.query(models.CarruselImagen).filter(models.CarruselImagen.activo == True).order_by(models.CarruselImagen.orden.asc()).all()
-        ordenes = [{"id": item.id, "orden": item.orden} for item in active_images]
-        message = {
-            "requestId": uuid.uuid4().hex,
-            "action": "reordenar",
-            "payload": {"ordenes": ordenes},
-            "meta": {"timestamp": datetime.utcnow().isoformat()}
-        }
-        rabbitmq_producer.publish("carrusel.imagen.reordenar", message)
-    except Exception as e:
-        logger.warning(f"Could not publish RabbitMQ reorder message: {str(e)}")
-    finally:
-        try:
-            rabbitmq_producer.close()
-        except Exception:
-            pass
+    active_images = db.query(models.CarruselImagen).filter(models.CarruselImagen.activo == True).order_by(models.CarruselImagen.orden.asc()).all()
+    rabbitmq_producer.publish_event("carrusel.imagen.reordenar", CarruselReordenadoEvent(
+        ordenes=[{"id": item.id, "orden": item.orden} for item in active_images]
+    ))
 
     return JSONResponse(status_code=status.HTTP_200_OK, content={"status": "success", "message": "Orden actualizado exitosamente"})
 
@@ -361,22 +319,11 @@ async def bulk_reorder(payload: dict = Body(...), db: Session = Depends(get_db))
         db.rollback()
         return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"status": "error", "message": "El orden debe ser un número entero positivo y único."})
 
+    catalog_service.invalidate_carousel()
+
     # Publish message
-    try:
-        rabbitmq_producer.connect()
-        message = {
-            "requestId": uuid.uuid4().hex,
-            "action": "reordenar",
-            "payload": {"ordenes": ordenes},
-            "meta": {"timestamp": datetime.utcnow().isoformat()}
-        }
-        rabbitmq_producer.publish("carrusel.imagen.reordenar", message)
-    except Exception as e:
-        logger.warning(f"Could not publish RabbitMQ bulk reorder message: {str(e)}")
-    finally:
-        try:
-            rabbitmq_producer.close()
-        except Exception:
-            pass
+    rabbitmq_producer.publish_event("carrusel.imagen.reordenar", CarruselReordenadoEvent(
+        ordenes=[{"id": o["id"], "orden": int(o["orden"])} for o in ordenes]
+    ))
 
     return JSONResponse(status_code=status.HTTP_200_OK, content={"status": "success", "message": "Orden actualizado exitosamente"})
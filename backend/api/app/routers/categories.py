@@ -2,11 +2,12 @@
 Categories router: Create, Read, Update categories and subcategories
 Handles HU_MANAGE_CATEGORIES
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
 from typing import List
 from app.schemas import CategoriaCreate, CategoriaResponse, CategoriaUpdate
 from app.database import get_db
+from app.services.catalog_service import catalog_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,9 +20,9 @@ router = APIRouter(
 
 @router.get("", response_model=List[CategoriaResponse])
 async def list_categories(
+    request: Request,
     skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100),
-    db: Session = Depends(get_db)
+    limit: int = Query(10, ge=1, le=100)
 ):
     """
     List all categories with subcategories
@@ -30,8 +31,7 @@ async def list_categories(
     - Returns hierarchical structure: Categorias -> Subcategorias
     - Supports pagination (skip, limit)
     """
-    # TODO: Implement list categories logic
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    return (await catalog_service.categories(skip, limit)).response(request)
 
 
 @router.post("", response_model=CategoriaResponse)
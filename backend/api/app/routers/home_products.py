@@ -2,12 +2,30 @@
 Home/Products router: Public product browsing and cart management
 Handles HU_HOME_PRODUCTS
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Cookie, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import FrozenSet, List, Optional
 from app.schemas import ProductoResponse, CartResponse, CartItemCreate, CartItemResponse
 from app.database import get_db
+from app.middleware.auth_middleware import get_optional_user_id
+from app.services.catalog_service import catalog_service
+from app.utils.background import with_session
+from app.utils.serialization import SparseFields
+from app.utils.response_cache import CachedResponse, etag_for, not_modified, not_modified_response
+from app.services.cart_service import (
+    cart_engine,
+    new_cart,
+    to_response,
+    valid_session_id,
+    CantidadNoDisponibleError,
+    ItemNoEncontradoError,
+    ProductoNoDisponibleError,
+)
+import asyncio
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -16,14 +34,64 @@ router = APIRouter(
     tags=["home-products"]
 )
 
+SESSION_COOKIE = "session_id"
+
+
+class CartOwner:
+    """Who the cart belongs to: the JWT user, else the anonymous session (header or cookie)"""
+
+    def __init__(
+        self,
+        usuario_id: Optional[int] = Depends(get_optional_user_id),
+        session_id: Optional[str] = Header(None),
+        session_cookie: Optional[str] = Cookie(None, alias=SESSION_COOKIE),
+    ):
+        self.usuario_id = usuario_id
+        # Malformed or oversized ids are ignored: mutations issue a fresh session instead
+        self.session_id = valid_session_id(session_id or session_cookie)
+        self.new_session = False
+
+    def ensure(self) -> "CartOwner":
+        """Anonymous clients without a session get one (returned as a cookie)"""
+        if self.usuario_id is None and not self.session_id:
+            self.session_id = uuid.uuid4().hex
+            self.new_session = True
+        return self
+
+    @property
+    def anonymous_without_session(self) -> bool:
+        return self.usuario_id is None and not self.session_id
+
+
+def _cart_response(owner: CartOwner, state, message: Optional[str] = None) -> JSONResponse:
+    content = {"status": "success", "data": CartResponse(**to_response(state)).model_dump()}
+    if message:
+        content["message"] = message
+    response = JSONResponse(status_code=status.HTTP_200_OK, content=content)
+    if owner.new_session:
+        response.set_cookie(SESSION_COOKIE, owner.session_id, max_age=30 * 86400, httponly=True, samesite="lax")
+    return response
+
+
+def _cart_error(e: Exception) -> JSONResponse:
+    if isinstance(e, ProductoNoDisponibleError):
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"status": "error", "message": "Producto no encontrado."})
+    if isinstance(e, CantidadNoDisponibleError):
+        return JSONResponse(status_code=status.HTTP_409_CONFLICT, content={"status": "error", "message": "Sin existencias"})
+    if isinstance(e, ItemNoEncontradoError):
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"status": "error", "message": "El producto no está en el carrito."})
+    logger.error(f"Cart operation failed: {str(e)}")
+    return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"status": "error", "message": "No se pudo actualizar el carrito."})
+
 
 @router.get("/home/productos", response_model=List[ProductoResponse])
 async def browse_products(
+    request: Request,
     categoria_id: int = Query(None),
     subcategoria_id: int = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(12, ge=1, le=100),
-    db: Session = Depends(get_db)
+    fields: Optional[FrozenSet[str]] = Depends(SparseFields(ProductoResponse))
 ):
     """
     Browse products by category/subcategory
@@ -34,22 +102,55 @@ async def browse_products(
     - Only return active products with stock > 0
     - Pagination support
     - Default limit 12 (typical grid layout)
+    - fields=id,nombre,precio returns (and selects) only those columns
     """
-    # TODO: Implement browse products logic
-    # 1. Query active Productos
-    # 2. Apply category/subcategory filters
-    # 3. Filter by cantidad_disponible > 0
-    # 4. Sort by fecha_creacion DESC
-    # 5. Apply pagination
-    # 6. Return products
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    return (await catalog_service.products(categoria_id, subcategoria_id, skip, limit, fields)).response(request)
 
 
-@router.get("/cart")
-async def get_cart(
-    session_id: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+# Keys of the bundle's parts, in the order they are written
+BUNDLE_PARTS = ("carrusel", "categorias", "productos", "carrito")
+
+
+def _bundle_cart(owner: CartOwner, db: Session) -> CachedResponse:
+    if owner.anonymous_without_session:
+        return CachedResponse(None)
+    state = cart_engine.get(db, owner.usuario_id, owner.session_id)
+    return CachedResponse(CartResponse(**to_response(state)).model_dump(mode="json"))
+
+
+@router.get("/home/bundle")
+async def home_bundle(
+    request: Request,
+    limit: int = Query(12, ge=1, le=100),
+    owner: CartOwner = Depends(),
 ):
+    """
+    Everything the storefront needs on load, in one response:
+    carousel, category tree, first page of products and (with a user or session) the cart
+
+    - Parts are gathered concurrently, each from its cache; only misses touch the DB,
+      on their own short-lived session, and each miss is shared with concurrent requests
+    - The cached parts are spliced in already rendered (no re-encoding)
+    - ETag combines the parts' ETags: If-None-Match -> 304
+    """
+    partes = await asyncio.gather(
+        catalog_service.carousel(),
+        catalog_service.categories(),
+        catalog_service.products(limit=limit),
+        run_in_threadpool(with_session(lambda db: _bundle_cart(owner, db))),
+    )
+    etag = etag_for(*(parte.etag.encode() for parte in partes))
+    # The cart makes the bundle per-client: browsers may keep it, but must revalidate
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if not_modified(request, etag):
+        return not_modified_response(etag, headers)
+    data = b",".join(b'"%s":%s' % (nombre.encode(), parte.body) for nombre, parte in zip(BUNDLE_PARTS, partes))
+    return Response(content=b'{"status":"success","data":{' + data + b"}}", media_type="application/json",
+                    headers=headers)
+
+
+@router.get("/cart")
+async def get_cart(owner: CartOwner = Depends(), db: Session = Depends(get_db)):
     """
     Get current cart (anonymous or authenticated)
     
@@ -58,19 +159,16 @@ async def get_cart(
     - For authenticated users: use user_id from JWT
     - Return cart with items and total
     """
-    # TODO: Implement get cart logic
-    # 1. Get user_id from JWT if authenticated, else session_id
-    # 2. Query Cart from DB
-    # 3. Include CartItems with product info
-    # 4. Calculate total (sum of item * quantity)
-    # 5. Return cart or empty if not found
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    if owner.anonymous_without_session:
+        return _cart_response(owner, new_cart(None, None))
+    # Served from the cart engine's hot tier; SQL is only read on the first access
+    return _cart_response(owner, cart_engine.get(db, owner.usuario_id, owner.session_id))
 
 
 @router.post("/cart/add", response_model=CartResponse)
 async def add_to_cart(
     request: CartItemCreate,
-    session_id: Optional[str] = Header(None),
+    owner: CartOwner = Depends(),
     db: Session = Depends(get_db)
 ):
     """
@@ -81,66 +179,74 @@ async def add_to_cart(
     - For authenticated: use user cart
     - Validate product exists and stock available
     - If product already in cart: add to quantity (check stock limit)
-    - Publishes cart.item.agregar queue message
+    - Publishes cart.item.agregar queue message (batched with the cart's next flush)
     """
-    # TODO: Implement add to cart logic
-    # 1. Get or create cart (anonymous with session_id or authenticated)
-    # 2. Validate producto exists
-    # 3. Validate stock >= cantidad
-    # 4. Check if product already in cart
-    # 5. If exists: update quantity (validate new total <= stock)
-    # 6. If not exists: create CartItem
-    # 7. Publish cart.item.agregar queue message
-    # 8. Return updated cart
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    owner.ensure()
+    try:
+        state = cart_engine.add_item(db, owner.usuario_id, owner.session_id, request.producto_id, request.cantidad)
+    except Exception as e:
+        return _cart_error(e)
+    return _cart_response(owner, state, "Producto agregado al carrito")
 
 
 @router.put("/cart/items/{item_id}")
 async def update_cart_item(
     item_id: int,
     cantidad: int = Query(..., gt=0),
-    session_id: Optional[str] = Header(None),
+    owner: CartOwner = Depends(),
     db: Session = Depends(get_db)
 ):
     """
-    Update quantity of cart item
+    Update quantity of cart item (item_id is the producto_id of the line)
     
     Requirements (HU_HOME_PRODUCTS):
     - Validate new cantidad doesn't exceed stock
-    - Publishes cart.item.actualizar queue message
+    - Publishes cart.item.actualizar queue message (batched with the cart's next flush)
     """
-    # TODO: Implement update cart item logic
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    if owner.anonymous_without_session:
+        return _cart_error(ItemNoEncontradoError(item_id))
+    try:
+        state = cart_engine.set_quantity(db, owner.usuario_id, owner.session_id, item_id, cantidad)
+    except Exception as e:
+        return _cart_error(e)
+    return _cart_response(owner, state, "Cantidad actualizada")
 
 
 @router.delete("/cart/items/{item_id}")
 async def remove_from_cart(
     item_id: int,
-    session_id: Optional[str] = Header(None),
+    owner: CartOwner = Depends(),
     db: Session = Depends(get_db)
 ):
     """
-    Remove item from cart
+    Remove item from cart (item_id is the producto_id of the line)
     
     Requirements (HU_HOME_PRODUCTS):
-    - Delete CartItem record
-    - Publishes cart.item.eliminar queue message
+    - Delete CartItem record (on the cart's next flush)
+    - Publishes cart.item.eliminar queue message (batched with the cart's next flush)
     """
-    # TODO: Implement remove from cart logic
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    if owner.anonymous_without_session:
+        return _cart_error(ItemNoEncontradoError(item_id))
+    try:
+        state = cart_engine.remove_item(db, owner.usuario_id, owner.session_id, item_id)
+    except Exception as e:
+        return _cart_error(e)
+    return _cart_response(owner, state, "Producto eliminado del carrito")
 
 
 @router.delete("/cart")
-async def clear_cart(
-    session_id: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
-):
+async def clear_cart(owner: CartOwner = Depends(), db: Session = Depends(get_db)):
     """
     Clear entire cart
     
     Requirements:
-    - Delete all CartItems for cart
-    - Publishes cart.vaciar queue message
+    - Delete all CartItems for cart (on the cart's next flush)
+    - Publishes cart.vaciar queue message (batched with the cart's next flush)
     """
-    # TODO: Implement clear cart logic
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    if owner.anonymous_without_session:
+        return _cart_response(owner, new_cart(None, None), "Carrito vaciado")
+    try:
+        state = cart_engine.clear(db, owner.usuario_id, owner.session_id)
+    except Exception as e:
+        return _cart_error(e)
+    return _cart_response(owner, state, "Carrito vaciado")
@@ -2,11 +2,22 @@
 Inventory router: Manage product stock and restocking
 Handles HU_MANAGE_INVENTORY
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, status, Query
+from fastapi.responses import JSONResponse
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from typing import List
-from app.schemas import ReabastecimientoRequest, InventarioHistorialResponse
-from app.database import get_db
+from typing import List, Optional
+from app.schemas import ReabastecimientoRequest, InventarioHistorialResponse, StockBatchRequest, StockSnapshotResponse
+from app.database import get_db, get_read_db
+from app.config import settings
+from app.events import InventarioActualizadoEvent
+from app import models
+from app.middleware.auth_middleware import get_optional_user_id
+from app.middleware.rate_limiting import RateLimit
+from app.services.catalog_service import catalog_service
+from app.services.inventory_journal_service import inventory_journal
+from app.services.inventory_stats_service import inventory_stats_service
+from app.utils.rabbitmq import rabbitmq_producer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,10 +28,20 @@ router = APIRouter(
 )
 
 
-@router.post("/{producto_id}/reabastecer")
+restock_rate_limit = RateLimit(
+    "restock",
+    settings.RESTOCK_RATE_LIMIT,
+    settings.RESTOCK_RATE_WINDOW_SECONDS,
+    key_param="producto_id",
+    message="Se alcanzó el máximo de reabastecimientos por hora para este producto.",
+)
+
+
+@router.post("/{producto_id}/reabastecer", dependencies=[Depends(restock_rate_limit)])
 async def restock_product(
     producto_id: int,
     request: ReabastecimientoRequest,
+    usuario_id: Optional[int] = Depends(get_optional_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -34,16 +55,54 @@ async def restock_product(
     - Publishes inventario.actualizar queue message
     - Rate limiting: max 10 restock operations per product per hour
     """
-    # TODO: Implement restock logic
-    # 1. Validate producto exists
-    # 2. Validate cantidad > 0
-    # 3. Get current amount
-    # 4. Update Producto.cantidad_disponible
-    # 5. Create InventarioHistorial entry
-    # 6. Check rate limiting
-    # 7. Publish inventario.actualizar queue message
-    # 8. Return updated inventory
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    # Atomic increment: no read-modify-write window between concurrent restocks
+    try:
+        row = db.execute(
+            update(models.Producto)
+            .where(models.Producto.id == producto_id)
+            .values(cantidad_disponible=models.Producto.cantidad_disponible + request.cantidad)
+            .returning(models.Producto.cantidad_disponible),
+            execution_options={"synchronize_session": False},
+        ).first()
+        if row is None:
+            db.rollback()
+            return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"status": "error", "message": "Producto no encontrado."})
+        cantidad_nueva = row[0]
+        cantidad_anterior = cantidad_nueva - request.cantidad
+        # History row is written behind (batched) by the inventory journal; it is on disk
+        # before the commit, so a committed restock never loses its movement
+        movimiento = inventory_journal.append(
+            producto_id=producto_id,
+            cantidad_anterior=cantidad_anterior,
+            cantidad_nueva=cantidad_nueva,
+            tipo_movimiento="REABASTECIMIENTO",
+            referencia=request.referencia,
+            usuario_id=usuario_id,
+        )
+        try:
+            db.commit()
+        except Exception:
+            inventory_journal.discard(movimiento)
+            raise
+    except Exception as e:
+        logger.error(f"DB error restocking product {producto_id}: {str(e)}")
+        db.rollback()
+        return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"status": "error", "message": "No se pudo actualizar el inventario."})
+
+    # Committed: nothing below may fail the request (a retry would restock twice).
+    # Stock is part of the cached product listings
+    catalog_service.invalidate_products()
+
+    # Publish message to RabbitMQ (non-blocking best-effort)
+    rabbitmq_producer.publish_event("inventario.actualizar", InventarioActualizadoEvent(
+        productoId=producto_id, cantidad=request.cantidad, cantidadNueva=cantidad_nueva
+    ))
+
+    return JSONResponse(status_code=status.HTTP_200_OK, content={
+        "status": "success",
+        "message": "Existencias actualizadas exitosamente",
+        "data": {"producto_id": producto_id, "cantidad_anterior": cantidad_anterior, "cantidad_nueva": cantidad_nueva}
+    })
 
 
 @router.get("/{producto_id}/historial", response_model=List[InventarioHistorialResponse])
@@ -51,7 +110,7 @@ async def get_inventory_history(
     producto_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=500),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get inventory history for product
@@ -62,17 +121,38 @@ async def get_inventory_history(
     - Includes usuario_id, tipo_movimiento, cantidad changes
     - Pagination support
     """
-    # TODO: Implement inventory history logic
-    # 1. Validate producto exists
-    # 2. Query InventarioHistorial for producto_id
-    # 3. Sort by fecha DESC
-    # 4. Apply pagination
-    # 5. Return history
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    exists = db.query(models.Producto.id).filter(models.Producto.id == producto_id).first()
+    if not exists:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"status": "error", "message": "Producto no encontrado."})
+
+    # Merges movements still buffered in the write-behind journal
+    return inventory_journal.history(db, producto_id, skip=skip, limit=limit)
+
+
+def _stock_snapshots(db: Session, producto_ids: List[int]):
+    """Snapshots from the aggregates table plus movements still in the journal"""
+    pending = inventory_journal.unflushed(db, producto_ids)
+    snapshots = inventory_stats_service.snapshots(db, producto_ids, pending=pending)
+    return {pid: StockSnapshotResponse(**snap).model_dump(mode="json") for pid, snap in snapshots.items()}
+
+
+@router.post("/stock/batch")
+async def get_stock_batch(request: StockBatchRequest, db: Session = Depends(get_db)):
+    """
+    Get current stock for many products in one round trip
+    Unknown ids are listed in `faltantes` instead of failing the whole request
+    """
+    producto_ids = list(dict.fromkeys(request.producto_ids))
+    snapshots = _stock_snapshots(db, producto_ids)
+    return JSONResponse(status_code=status.HTTP_200_OK, content={
+        "status": "success",
+        "data": [snapshots[pid] for pid in producto_ids if pid in snapshots],
+        "faltantes": [pid for pid in producto_ids if pid not in snapshots],
+    })
 
 
 @router.get("/{producto_id}/stock")
-async def get_stock(producto_id: int, db: Session = Depends(get_db)):
+async def get_stock(producto_id: int, db: Session = Depends(get_read_db)):
     """
     Get current stock for product
     
@@ -81,5 +161,8 @@ async def get_stock(producto_id: int, db: Session = Depends(get_db)):
     - Return last restock date/time
     - Return total movements count
     """
-    # TODO: Implement get stock logic
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    # Served from InventarioResumen: no MAX/COUNT over InventarioHistorial
+    snapshot = _stock_snapshots(db, [producto_id]).get(producto_id)
+    if snapshot is None:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"status": "error", "message": "Producto no encontrado."})
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"status": "success", "data": snapshot})
@@ -3,10 +3,25 @@ Orders router: View and manage orders for admin
 Handles HU_MANAGE_ORDERS
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from app.schemas import PedidoResponse, PedidoEstadoUpdate
-from app.database import get_db
+from typing import FrozenSet, List, Optional
+from datetime import date, datetime, timedelta
+from app.schemas import PedidoResponse, PedidoEstadoUpdate, PedidoEstadoBulkUpdate, PedidoHistorialResponse
+from app.database import get_db, get_read_db
+from app.events import envelope
+from app.middleware.auth_middleware import get_optional_user_id
+from app.services.order_service import (
+    order_service,
+    PedidoNoEncontradoError,
+    TransicionNoPermitidaError,
+    ERROR_NO_ENCONTRADO,
+    ERROR_TRANSICION,
+)
+from app.services.order_stats_service import order_stats_service
+from app.services.order_export_service import order_export_service, FORMATO_CSV
+from app.utils.rabbitmq import rabbitmq_producer
+from app.utils.serialization import ORJSONResponse, SparseFields
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,7 +38,8 @@ async def list_orders(
     usuario_id: int = Query(None),
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    fields: Optional[FrozenSet[str]] = Depends(SparseFields(PedidoResponse)),
+    db: Session = Depends(get_read_db)
 ):
     """
     List all orders with optional filtering
@@ -34,36 +50,127 @@ async def list_orders(
     - Sort by fecha_creacion DESC (newest first)
     - Return order with items and total
     - Pagination support
+    - fields=id,estado,total returns (and selects) only those columns
+    """
+    # Two queries for the whole page: orders (total summed in SQL) + their items
+    return ORJSONResponse(content=order_service.list_orders(
+        db, estado=estado, usuario_id=usuario_id, skip=skip, limit=limit, fields=fields
+    ))
+
+
+@router.get("/estadisticas")
+async def get_order_stats(
+    desde: Optional[date] = Query(None),
+    hasta: Optional[date] = Query(None),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Order dashboard: counts per estado and revenue per day (default: last 30 days)
+
+    Served from the PedidosEstadisticas counters, never from a GROUP BY over Pedidos.
     """
-    # TODO: Implement list orders logic
-    # 1. Query Pedidos table
-    # 2. Apply filters (estado, usuario_id)
-    # 3. Include PedidoItems
-    # 4. Calculate total
-    # 5. Sort by fecha_creacion DESC
-    # 6. Apply pagination
-    # 7. Return orders
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    hasta = hasta or datetime.utcnow().date()
+    desde = desde or hasta - timedelta(days=30)
+    if desde > hasta:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"status": "error", "message": "Rango de fechas inválido."})
+    data = order_stats_service.dashboard(db, desde, hasta)
+    return JSONResponse(content={"status": "success", "data": dict(data, desde=desde.isoformat(), hasta=hasta.isoformat())})
+
+
+@router.get("/exportar")
+async def export_orders(
+    desde: date = Query(...),
+    hasta: date = Query(...),
+    formato: str = Query(FORMATO_CSV, pattern="^(csv|jsonl)$"),
+    estado: str = Query(None, pattern="^(Pendiente|Enviado|Entregado|Cancelado)$"),
+):
+    """
+    Export orders with their items for accounting (CSV or JSON Lines)
+
+    - Orders created between desde and hasta (inclusive), oldest first
+    - Streamed from a chunked cursor: memory use doesn't grow with the range
+    """
+    if desde > hasta:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"status": "error", "message": "Rango de fechas inválido."})
+    media_type = "text/csv; charset=utf-8" if formato == FORMATO_CSV else "application/x-ndjson"
+    filename = f"pedidos_{desde.isoformat()}_{hasta.isoformat()}.{formato}"
+    return StreamingResponse(
+        order_export_service.stream(formato, desde, hasta, estado),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+_BULK_ERROR_MESSAGES = {
+    ERROR_NO_ENCONTRADO: "Pedido no encontrado.",
+    ERROR_TRANSICION: "Transición de estado no permitida.",
+}
+
+
+@router.post("/estado/lote")
+async def update_orders_status_bulk(
+    request: PedidoEstadoBulkUpdate,
+    usuario_id: Optional[int] = Depends(get_optional_user_id),
+    db: Session = Depends(get_db)
+):
+    """
+    Update the status of many orders at once (e.g. a day's shipments to Enviado)
+
+    - Same transition rules and audit rows as PUT /{pedido_id}/estado, written set-based
+      in one transaction
+    - One pedido.estado.cambiar message per changed order, all over a single channel
+    - Per-order results: invalid or concurrently changed orders don't fail the batch
+    """
+    eventos, resultados = order_service.update_status_bulk(db, request.pedido_ids, request.estado, usuario_id, request.nota)
+
+    if eventos:
+        timestamp = datetime.utcnow().isoformat()
+        try:
+            rabbitmq_producer.connect()
+            rabbitmq_producer.publish_batch("pedido.estado.cambiar", [
+                envelope("pedido.estado.cambiar", evento, timestamp=timestamp) for evento in eventos
+            ], block=False)
+        except Exception as e:
+            logger.error(f"Failed to publish pedido.estado.cambiar for {len(eventos)} orders: {str(e)}")
+        finally:
+            rabbitmq_producer.close()
+
+    for resultado in resultados:
+        error = resultado.pop("error", None)
+        if error:
+            resultado["message"] = _BULK_ERROR_MESSAGES.get(error, "El pedido cambió de estado durante la operación.")
+    return JSONResponse(content={
+        "status": "success",
+        "message": f"{len(eventos)} de {len(resultados)} pedidos actualizados",
+        "data": {
+            "actualizados": len(eventos),
+            "fallidos": len(resultados) - len(eventos),
+            "resultados": resultados,
+        },
+    })
 
 
 @router.get("/{pedido_id}", response_model=PedidoResponse)
-async def get_order(pedido_id: int, db: Session = Depends(get_db)):
+async def get_order(pedido_id: int, db: Session = Depends(get_read_db)):
     """
     Get order details with items
     
     Requirements:
     - Return full order information
     - Include all PedidoItems with product info
-    - Include estado history
+    - Include estado history (served by /{pedido_id}/historial)
     """
-    # TODO: Implement get order logic
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    pedido = order_service.get_order(db, pedido_id)
+    if pedido is None:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"status": "error", "message": "Pedido no encontrado."})
+    return pedido
 
 
 @router.put("/{pedido_id}/estado")
 async def update_order_status(
     pedido_id: int,
     request: PedidoEstadoUpdate,
+    usuario_id: Optional[int] = Depends(get_optional_user_id),
     db: Session = Depends(get_db)
 ):
     """
@@ -76,18 +183,31 @@ async def update_order_status(
     - Publishes pedido.estado.cambiar queue message
     - Include optional nota with change reason
     """
-    # TODO: Implement update order status logic
-    # 1. Validate pedido exists
-    # 2. Validate new estado
-    # 3. Update Pedido.estado
-    # 4. Create PedidosHistorialEstado entry
-    # 5. Publish pedido.estado.cambiar queue message
-    # 6. Return updated order
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    try:
+        # Estado, audit row and dashboard counters change in one transaction
+        evento = order_service.update_status(db, pedido_id, request.estado, usuario_id, request.nota)
+    except PedidoNoEncontradoError:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"status": "error", "message": "Pedido no encontrado."})
+    except TransicionNoPermitidaError:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"status": "error", "message": "Transición de estado no permitida."})
+
+    rabbitmq_producer.publish_event("pedido.estado.cambiar", evento)
 
+    pedido = order_service.get_order(db, pedido_id)
+    return JSONResponse(content={
+        "status": "success",
+        "message": "Estado actualizado exitosamente",
+        "data": pedido.model_dump(mode="json"),
+    })
 
-@router.get("/{pedido_id}/historial")
-async def get_order_history(pedido_id: int, db: Session = Depends(get_db)):
+
+@router.get("/{pedido_id}/historial", response_model=List[PedidoHistorialResponse])
+async def get_order_history(
+    pedido_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_read_db)
+):
     """
     Get order status change history
     
@@ -96,17 +216,22 @@ async def get_order_history(pedido_id: int, db: Session = Depends(get_db)):
     - Sorted by fecha DESC (newest first)
     - Include usuario_id who made change
     - Include change notes
+    - Pages continue into the archive once past the hot rows
     """
-    # TODO: Implement order history logic
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    historial = order_service.history(db, pedido_id, skip=skip, limit=limit)
+    # Only an empty page needs the extra lookup to tell "no history" from "no order"
+    if not historial and not order_service.order_exists(db, pedido_id):
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"status": "error", "message": "Pedido no encontrado."})
+    return historial
 
 
-@router.get("/usuario/{usuario_id}")
+@router.get("/usuario/{usuario_id}", response_model=List[PedidoResponse])
 async def get_user_orders(
     usuario_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    fields: Optional[FrozenSet[str]] = Depends(SparseFields(PedidoResponse)),
+    db: Session = Depends(get_read_db)
 ):
     """
     Get all orders for a specific user
@@ -116,5 +241,6 @@ async def get_user_orders(
     - Pagination support
     - Return orders with items
     """
-    # TODO: Implement get user orders logic
-    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Not implemented")
+    return ORJSONResponse(content=order_service.list_orders(
+        db, usuario_id=usuario_id, skip=skip, limit=limit, fields=fields
+    ))
@@ -117,8 +117,22 @@ class ReabastecimientoRequest(BaseModel):
     referencia: Optional[str] = Field(None, max_length=200)
 
 
+class StockBatchRequest(BaseModel):
+    producto_ids: List[int] = Field(..., min_length=1, max_length=500)
+
+
+class StockSnapshotResponse(BaseModel):
+    producto_id: int
+    nombre: str
+    cantidad_disponible: int
+    ultimo_reabastecimiento: Optional[datetime]
+    total_movimientos: int
+    unidades_entrada: int
+    unidades_salida: int
+
+
 class InventarioHistorialResponse(BaseModel):
-    id: int
+    id: Optional[int] = None  # None while the movement is still in the write-behind journal
     producto_id: int
     cantidad_anterior: int
     cantidad_nueva: int
@@ -131,6 +145,19 @@ class InventarioHistorialResponse(BaseModel):
         from_attributes = True
 
 
+class PedidoHistorialResponse(BaseModel):
+    id: int
+    pedido_id: int
+    estado_anterior: Optional[str]
+    estado_nuevo: str
+    usuario_id: Optional[int]
+    nota: Optional[str]
+    fecha: datetime
+
+    class Config:
+        from_attributes = True
+
+
 # Cart Schemas
 class CartItemCreate(BaseModel):
     producto_id: int
@@ -148,11 +175,12 @@ class CartItemResponse(BaseModel):
 
 
 class CartResponse(BaseModel):
-    id: int
+    id: Optional[int] = None  # None until the cart is first persisted
     usuario_id: Optional[int]
     session_id: Optional[str]
     items: List[CartItemResponse] = []
     total: float
+    cantidad_total: int = 0
     
     class Config:
         from_attributes = True
@@ -170,6 +198,12 @@ class PedidoEstadoUpdate(BaseModel):
     nota: Optional[str] = Field(None, max_length=300)
 
 
+class PedidoEstadoBulkUpdate(BaseModel):
+    pedido_ids: List[int] = Field(..., min_length=1, max_length=500)
+    estado: str = Field(..., pattern="^(Pendiente|Enviado|Entregado|Cancelado)$")
+    nota: Optional[str] = Field(None, max_length=300)
+
+
 class PedidoItemResponse(BaseModel):
     id: int
     producto_id: int
@@ -239,6 +273,19 @@ class UsuarioDetailResponse(BaseModel):
         from_attributes = True
 
 
+class UsuarioStatsBatchRequest(BaseModel):
+    usuario_ids: List[int] = Field(..., min_length=1, max_length=500)
+
+
+class UsuarioStatsResponse(BaseModel):
+    usuario_id: int
+    total_pedidos: int
+    total_gastado: float
+    ultimo_pedido: Optional[datetime]
+    categoria_preferida_id: Optional[int]
+    categoria_preferida: Optional[str]
+
+
 # Error Response
 class ErrorResponse(BaseModel):
     error: str
@@ -0,0 +1,61 @@
+"""
+__init__.py for services package
+Business logic shared by routers and background jobs
+"""
+from app.services.reservation_service import (
+    reservation_service,
+    ReservationService,
+    ReservationError,
+    StockInsuficienteError,
+)
+from app.services.inventory_journal_service import inventory_journal, InventoryJournal
+from app.services.inventory_stats_service import inventory_stats_service, InventoryStatsService
+from app.services.cart_service import cart_engine, CartEngine, CartError
+from app.services.cart_merge_service import cart_merge_service, CartMergeService
+from app.services.order_stats_service import order_stats_service, OrderStatsService
+from app.services.user_stats_service import user_stats_service, UserStatsService
+from app.services.order_service import order_service, OrderService
+from app.services.user_search_service import user_search_service, UserSearchService
+from app.services.order_export_service import order_export_service, OrderExportService
+from app.services.archive_service import archive_service, ArchiveService
+from app.services.verification_service import (
+    verification_service,
+    VerificationService,
+    VerificationError,
+    MemoryVerificationStore,
+)
+from app.services.catalog_service import catalog_service, CatalogService
+
+__all__ = [
+    'reservation_service',
+    'ReservationService',
+    'ReservationError',
+    'StockInsuficienteError',
+    'inventory_journal',
+    'InventoryJournal',
+    'inventory_stats_service',
+    'InventoryStatsService',
+    'cart_engine',
+    'CartEngine',
+    'CartError',
+    'cart_merge_service',
+    'CartMergeService',
+    'order_stats_service',
+    'OrderStatsService',
+    'user_stats_service',
+    'UserStatsService',
+    'order_service',
+    'OrderService',
+    'user_search_service',
+    'UserSearchService',
+    'order_export_service',
+    'OrderExportService',
+    'archive_service',
+    'ArchiveService',
+    'verification_service',
+    'VerificationService',
+    'VerificationError',
+    'MemoryVerificationStore',
+    'catalog_service',
+    'CatalogService',
+]
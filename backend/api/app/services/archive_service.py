@@ -0,0 +1,146 @@
+"""
+Archival of cold order and inventory history
+Rows older than ARCHIVE_HORIZON_DAYS move, in batches, from the hot tables into their
+*Archivo copies: Entregado/Cancelado Pedidos (with their items and whole estado history) by
+last update, then PedidosHistorialEstado and InventarioHistorial by age. Each batch is an
+INSERT ... SELECT plus DELETE of the same rows in one transaction, so the hot tables (and
+their indexes) stay bounded. Readers page past the hot rows into the archive with
+page_across() and aggregate over both with union_with_archive() and
+inventory_history_with_archive().
+"""
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+import logging
+
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import (
+    InventarioHistorial,
+    InventarioHistorialArchivo,
+    Pedido,
+    PedidoArchivo,
+    PedidoHistorialEstado,
+    PedidoHistorialEstadoArchivo,
+    PedidoItem,
+    PedidoItemArchivo,
+)
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_FINALES = ("Entregado", "Cancelado")
+
+# (Pedido model, PedidoItem model) pairs, hot first
+ORDER_TABLES = ((Pedido, PedidoItem), (PedidoArchivo, PedidoItemArchivo))
+# InventarioHistorial model and its archive copy, hot first
+INVENTORY_HISTORY_TABLES = (InventarioHistorial, InventarioHistorialArchivo)
+
+
+def page_across(db: Session, statements: List[Any], skip: int, limit: int, scalars: bool = True) -> List[Any]:
+    """
+    One page over several ordered selects read as a single list (hot table, then archive).
+    A source is only counted when the page starts past its end. With scalars=False the
+    rows are returned whole instead of their first column.
+    """
+    page: List[Any] = []
+    for i, stmt in enumerate(statements):
+        remaining = limit - len(page)
+        if remaining <= 0:
+            break
+        result = db.execute(stmt.offset(skip).limit(remaining))
+        rows = result.scalars().all() if scalars else result.all()
+        page.extend(rows)
+        if rows:
+            skip = 0
+        elif skip and i < len(statements) - 1:
+            total = db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery()))
+            skip = max(0, skip - total)
+    return page
+
+
+def union_with_archive(build: Callable[[Any, Any], Any]):
+    """UNION ALL of build(Pedido, PedidoItem) and build(PedidoArchivo, PedidoItemArchivo), as a subquery"""
+    return union_all(*(build(pedido, item) for pedido, item in ORDER_TABLES)).subquery()
+
+
+def inventory_history_with_archive():
+    """UNION ALL of InventarioHistorial and InventarioHistorialArchivo, as a subquery"""
+    return union_all(*(
+        select(t.producto_id, t.cantidad_anterior, t.cantidad_nueva, t.tipo_movimiento, t.fecha)
+        for t in INVENTORY_HISTORY_TABLES
+    )).subquery()
+
+
+def _move(db: Session, hot, archive, *criteria) -> int:
+    """Copy the matching rows into the archive table and delete them from the hot one"""
+    columns = [c.name for c in archive.__table__.columns]
+    db.execute(insert(archive).from_select(
+        columns, select(*(hot.__table__.c[c] for c in columns)).where(*criteria)
+    ))
+    return db.execute(delete(hot).where(*criteria), execution_options={"synchronize_session": False}).rowcount
+
+
+class ArchiveService:
+    """Moves cold rows out of the hot history tables"""
+
+    def __init__(self, horizon_days: Optional[int] = None, batch_size: Optional[int] = None):
+        self.horizon_days = horizon_days or settings.ARCHIVE_HORIZON_DAYS
+        self.batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+
+    def _batches(self, db: Session, next_ids: Callable[[], List[int]], move: Callable[[List[int]], int]) -> int:
+        total = 0
+        while True:
+            ids = next_ids()
+            if not ids:
+                return total
+            try:
+                total += move(ids)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            if len(ids) < self.batch_size:
+                return total
+
+    def archive_orders(self, db: Session, cutoff: datetime) -> int:
+        """Finished orders last updated before cutoff, with their items and history"""
+        def next_ids():
+            return db.scalars(
+                select(Pedido.id)
+                .where(Pedido.estado.in_(ESTADOS_FINALES), Pedido.fecha_actualizacion < cutoff)
+                .order_by(Pedido.id)
+                .limit(self.batch_size)
+            ).all()
+
+        def move(ids):
+            _move(db, PedidoHistorialEstado, PedidoHistorialEstadoArchivo, PedidoHistorialEstado.pedido_id.in_(ids))
+            _move(db, PedidoItem, PedidoItemArchivo, PedidoItem.pedido_id.in_(ids))
+            return _move(db, Pedido, PedidoArchivo, Pedido.id.in_(ids))
+
+        return self._batches(db, next_ids, move)
+
+    def archive_by_age(self, db: Session, hot, archive, cutoff: datetime) -> int:
+        """History rows (any table with id and fecha) older than cutoff"""
+        def next_ids():
+            return db.scalars(
+                select(hot.id).where(hot.fecha < cutoff).order_by(hot.id).limit(self.batch_size)
+            ).all()
+
+        return self._batches(db, next_ids, lambda ids: _move(db, hot, archive, hot.id.in_(ids)))
+
+    def run(self, db: Session, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Periodic job: archive everything past the horizon. Returns rows moved per table."""
+        cutoff = (now or datetime.utcnow()) - timedelta(days=self.horizon_days)
+        moved = {
+            "pedidos": self.archive_orders(db, cutoff),
+            "historial_pedidos": self.archive_by_age(db, PedidoHistorialEstado, PedidoHistorialEstadoArchivo, cutoff),
+            "historial_inventario": self.archive_by_age(db, InventarioHistorial, InventarioHistorialArchivo, cutoff),
+        }
+        if any(moved.values()):
+            logger.info(f"Archived rows older than {cutoff.isoformat()}: {moved}")
+        return moved
+
+
+# Global archive service instance
+archive_service = ArchiveService()
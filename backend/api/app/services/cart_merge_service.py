@@ -0,0 +1,128 @@
+"""
+Anonymous-to-user cart merge on login
+The whole merge is one set-based statement (MERGE on SQL Server, INSERT ... ON CONFLICT
+elsewhere): quantities are summed, clamped to stock, and the anonymous cart is deleted in
+the same transaction. The rows the statement outputs are folded into the user's cart, so no
+extra read is needed to return it.
+Both carts' stock reservations are released first (the clamp then sees the units they held)
+and the merged cart holds its lines again afterwards.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+import copy
+import logging
+
+from sqlalchemy import case, delete, literal, select, text, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, aliased
+
+from app.models import Cart, CartItem, Producto
+from app.services.cart_service import CantidadNoDisponibleError, cart_engine, set_line
+
+logger = logging.getLogger(__name__)
+
+_MSSQL_MERGE = text(
+    "MERGE CartItems WITH (HOLDLOCK) AS t "
+    "USING ("
+    "    SELECT a.producto_id,"
+    "           CASE WHEN a.cantidad > p.cantidad_disponible THEN p.cantidad_disponible ELSE a.cantidad END AS cantidad,"
+    "           p.precio AS precio_unitario, p.cantidad_disponible"
+    "    FROM CartItems a JOIN Productos p ON p.id = a.producto_id"
+    "    WHERE a.cart_id = :origen AND p.activo = 1 AND p.cantidad_disponible > 0"
+    ") AS s "
+    "ON t.cart_id = :destino AND t.producto_id = s.producto_id "
+    "WHEN MATCHED THEN UPDATE SET "
+    "    t.cantidad = CASE WHEN t.cantidad + s.cantidad > s.cantidad_disponible"
+    "                      THEN s.cantidad_disponible ELSE t.cantidad + s.cantidad END,"
+    "    t.precio_unitario = s.precio_unitario "
+    "WHEN NOT MATCHED THEN INSERT (cart_id, producto_id, cantidad, precio_unitario) "
+    "    VALUES (:destino, s.producto_id, s.cantidad, s.precio_unitario) "
+    "OUTPUT inserted.producto_id, inserted.cantidad, inserted.precio_unitario;"
+)
+
+
+class CartMergeService:
+    """Merges the anonymous session cart into the user's cart"""
+
+    @staticmethod
+    def _merge_lines(db: Session, origen: int, destino: int):
+        """Upsert every line of `origen` into `destino`; returns the rows written"""
+        dialect = db.bind.dialect.name
+        if dialect == "mssql":
+            return db.execute(_MSSQL_MERGE, {"origen": origen, "destino": destino}).all()
+
+        anonimo = aliased(CartItem)
+        clamped = case(
+            (anonimo.cantidad > Producto.cantidad_disponible, Producto.cantidad_disponible),
+            else_=anonimo.cantidad,
+        )
+        insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        stmt = insert(CartItem).from_select(
+            ["cart_id", "producto_id", "cantidad", "precio_unitario"],
+            select(literal(destino), anonimo.producto_id, clamped, Producto.precio)
+            .join(Producto, Producto.id == anonimo.producto_id)
+            .where(anonimo.cart_id == origen, Producto.activo == True, Producto.cantidad_disponible > 0),  # noqa: E712
+        )
+        disponible = (
+            select(Producto.cantidad_disponible)
+            .where(Producto.id == stmt.excluded.producto_id)
+            .scalar_subquery()
+        )
+        suma = CartItem.cantidad + stmt.excluded.cantidad
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["cart_id", "producto_id"],
+            set_={
+                "cantidad": case((suma > disponible, disponible), else_=suma),
+                "precio_unitario": stmt.excluded.precio_unitario,
+            },
+        ).returning(CartItem.producto_id, CartItem.cantidad, CartItem.precio_unitario)
+        return db.execute(stmt).all()
+
+    def merge(self, db: Session, session_id: str, usuario_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Move the session's cart into the user's cart.
+        Returns the merged cart state, or None when the session had no cart.
+        """
+        # Both carts must be in SQL before the set-based merge (flushes pending hot-tier edits)
+        origen = cart_engine.persist_cart(db, None, session_id)
+        if origen is None:
+            cart_engine.forget(None, session_id)
+            return None
+        cart_engine.persist_cart(db, usuario_id, None)
+        usuario = copy.deepcopy(cart_engine.get(db, usuario_id, None))
+        cart_engine.release_stock(db, None, session_id)
+        cart_engine.release_stock(db, usuario_id, None)
+
+        try:
+            destino = usuario["cart_id"]
+            if destino is None:
+                cart = Cart(usuario_id=usuario_id)
+                db.add(cart)
+                db.flush()
+                destino = cart.id
+            merged = self._merge_lines(db, origen, destino)
+            db.execute(delete(CartItem).where(CartItem.cart_id == origen))
+            db.execute(delete(Cart).where(Cart.id == origen))
+            db.execute(update(Cart).where(Cart.id == destino).values(fecha_actualizacion=datetime.utcnow()))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        usuario["cart_id"] = destino
+        for row in merged:
+            set_line(usuario, row.producto_id, row.cantidad, row.precio_unitario)
+        cart_engine.forget(None, session_id)
+        logger.info(f"Merged anonymous cart {origen} into cart {destino} ({len(merged)} lines)")
+        installed = cart_engine.install(usuario_id, None, usuario)
+        try:
+            cart_engine.hold_stock(db, usuario_id, None)
+        except CantidadNoDisponibleError as e:
+            # Sold between the release and the merge: the user's next cart change holds again
+            logger.warning(f"Merged cart {destino} could not hold product {e.producto_id}: {str(e)}")
+        return installed
+
+
+# Global cart merge service instance
+cart_merge_service = CartMergeService()
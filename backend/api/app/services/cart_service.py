@@ -0,0 +1,640 @@
+"""
+Cart engine
+Carts are read and mutated in a hot tier (process memory, or the shared CartSnapshots table)
+and persisted to Carts/CartItems on a debounce, at checkout and on login merge.
+Totals are maintained incrementally on every mutation; cart.* events are buffered with the
+cart and published in one connection per flush.
+With CART_RESERVE_STOCK every mutation that changes the lines also moves the cart's stock
+reservation (reservation_service.hold, keyed per cart): only the differences touch
+Productos, with the conditional UPDATE, and the reservation's TTL restarts.
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Set
+import copy
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import database
+from app.config import settings
+from app.events import envelope
+from app.models import Cart, CartItem, CartSnapshot, Producto
+from app.services.reservation_service import StockInsuficienteError, reservation_service
+from app.utils.rabbitmq import RabbitMQProducer
+from app.utils.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+# Events kept per cart between flushes; older ones are dropped
+MAX_PENDING_EVENTS = 100
+# Client session ids accepted as cart owners: they are stored in Carts.session_id (NVARCHAR(100))
+# and CartSnapshots.clave (NVARCHAR(120)); anything else gets a new session
+_SESSION_ID = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+_CENTS = Decimal("0.01")
+
+
+class CartError(Exception):
+    """Base error for cart operations"""
+
+
+class ProductoNoDisponibleError(CartError):
+    def __init__(self, producto_id: int):
+        self.producto_id = producto_id
+        super().__init__(f"Product {producto_id} does not exist or is inactive")
+
+
+class CantidadNoDisponibleError(CartError):
+    def __init__(self, producto_id: int, disponible: int):
+        self.producto_id = producto_id
+        self.disponible = disponible
+        super().__init__(f"Only {disponible} units of product {producto_id} are available")
+
+
+class ItemNoEncontradoError(CartError):
+    def __init__(self, producto_id: int):
+        self.producto_id = producto_id
+        super().__init__(f"Product {producto_id} is not in the cart")
+
+
+class CartConflictError(CartError):
+    """The cart changed between our read and write; the operation is retried"""
+
+
+def valid_session_id(session_id: Optional[str]) -> Optional[str]:
+    """The client's session id, or None when it could not be stored as a cart owner"""
+    if session_id and _SESSION_ID.fullmatch(session_id):
+        return session_id
+    return None
+
+
+def cart_key(usuario_id: Optional[int], session_id: Optional[str]) -> str:
+    """Authenticated carts are keyed by user, anonymous ones by session"""
+    if usuario_id is not None:
+        return f"u:{usuario_id}"
+    if session_id:
+        return f"s:{session_id}"
+    raise ValueError("A cart needs a usuario_id or a session_id")
+
+
+def reservation_key(usuario_id: Optional[int], session_id: Optional[str]) -> str:
+    """Stock reservation key of a cart (session ids are client-supplied: hashed to a fixed size)"""
+    if usuario_id is not None:
+        return f"carrito:u:{usuario_id}"
+    return "carrito:s:" + hashlib.blake2b(cart_key(None, session_id).encode(), digest_size=16).hexdigest()
+
+
+def lines_of(state: Dict[str, Any]) -> Dict[int, int]:
+    return {int(pid): line["cantidad"] for pid, line in state["items"].items()}
+
+
+def new_cart(usuario_id: Optional[int], session_id: Optional[str], cart_id: Optional[int] = None) -> Dict[str, Any]:
+    return {
+        "cart_id": cart_id,
+        "usuario_id": usuario_id,
+        "session_id": None if usuario_id is not None else session_id,
+        "items": {},  # str(producto_id) -> {"cantidad", "precio_unitario"}
+        "total": "0.00",
+        "cantidad_total": 0,
+        "version": 0,
+        "sucio_desde": None,
+        "actualizado": time.time(),
+        "eventos": [],
+    }
+
+
+def set_line(state: Dict[str, Any], producto_id: int, cantidad: int, precio_unitario: Decimal) -> None:
+    """Set a line's quantity (0 removes it) and adjust the totals by the difference"""
+    key = str(producto_id)
+    line = state["items"].get(key)
+    total = Decimal(state["total"])
+    if line:
+        total -= Decimal(line["precio_unitario"]) * line["cantidad"]
+        state["cantidad_total"] -= line["cantidad"]
+    if cantidad > 0:
+        precio = Decimal(precio_unitario).quantize(_CENTS)
+        state["items"][key] = {"cantidad": cantidad, "precio_unitario": str(precio)}
+        total += precio * cantidad
+        state["cantidad_total"] += cantidad
+    else:
+        state["items"].pop(key, None)
+    state["total"] = str(total.quantize(_CENTS))
+
+
+def to_response(state: Dict[str, Any]) -> Dict[str, Any]:
+    """CartResponse-shaped dict; item ids are product ids (lines are unique per product)"""
+    return {
+        "id": state["cart_id"],
+        "usuario_id": state["usuario_id"],
+        "session_id": state["session_id"],
+        "items": [
+            {
+                "id": int(pid),
+                "producto_id": int(pid),
+                "cantidad": line["cantidad"],
+                "precio_unitario": float(line["precio_unitario"]),
+            }
+            for pid, line in state["items"].items()
+        ],
+        "total": float(state["total"]),
+        "cantidad_total": state["cantidad_total"],
+    }
+
+
+class MemoryCartStore:
+    """
+    Carts held in this process (use sticky sessions when running several replicas).
+    Writes are compare-and-set on `version`, like SQLCartStore.
+    """
+
+    def __init__(self):
+        self._carts: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._carts.get(key)
+
+    def save(self, key: str, state: Dict[str, Any], expected_version: int) -> None:
+        with self._lock:
+            current = self._carts.get(key)
+            if (current["version"] if current else 0) != expected_version:
+                raise CartConflictError(key)
+            self._carts[key] = state
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._carts.pop(key, None)
+
+    def due(self, now: float, quiet: float, max_delay: float) -> List[str]:
+        with self._lock:
+            return [
+                key for key, state in self._carts.items()
+                if state["sucio_desde"] is not None
+                and (now - state["actualizado"] >= quiet or now - state["sucio_desde"] >= max_delay)
+            ]
+
+    def evict_idle(self, now: float, ttl: float) -> int:
+        with self._lock:
+            idle = [
+                key for key, state in self._carts.items()
+                if state["sucio_desde"] is None and now - state["actualizado"] >= ttl
+            ]
+            for key in idle:
+                del self._carts[key]
+        return len(idle)
+
+
+class SQLCartStore:
+    """
+    Carts serialized in CartSnapshots, shared by every API replica.
+    One primary-key read/write per operation; writes are compare-and-set on `version`.
+    """
+
+    def __init__(self, session_factory: Optional[Callable] = None):
+        self._session_factory = session_factory
+
+    def _session(self):
+        return (self._session_factory or database.SessionLocal)()
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        db = self._session()
+        try:
+            row = db.execute(
+                select(CartSnapshot.datos, CartSnapshot.version).where(CartSnapshot.clave == key)
+            ).first()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        state = json.loads(row.datos)
+        state["version"] = row.version
+        return state
+
+    def save(self, key: str, state: Dict[str, Any], expected_version: int) -> None:
+        values = {
+            "datos": json.dumps(state),
+            "version": state["version"],
+            "sucio_desde": datetime.utcfromtimestamp(state["sucio_desde"]) if state["sucio_desde"] else None,
+            "fecha_actualizacion": datetime.utcfromtimestamp(state["actualizado"]),
+        }
+        db = self._session()
+        try:
+            if expected_version == 0:
+                db.execute(insert(CartSnapshot).values(clave=key, **values))
+            else:
+                result = db.execute(
+                    update(CartSnapshot)
+                    .where(CartSnapshot.clave == key, CartSnapshot.version == expected_version)
+                    .values(**values)
+                )
+                if result.rowcount != 1:
+                    raise CartConflictError(key)
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise CartConflictError(key)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def delete(self, key: str) -> None:
+        db = self._session()
+        try:
+            db.execute(delete(CartSnapshot).where(CartSnapshot.clave == key))
+            db.commit()
+        finally:
+            db.close()
+
+    def due(self, now: float, quiet: float, max_delay: float) -> List[str]:
+        db = self._session()
+        try:
+            return list(db.scalars(
+                select(CartSnapshot.clave).where(
+                    CartSnapshot.sucio_desde.is_not(None),
+                    (CartSnapshot.fecha_actualizacion <= datetime.utcfromtimestamp(now - quiet))
+                    | (CartSnapshot.sucio_desde <= datetime.utcfromtimestamp(now - max_delay)),
+                )
+            ).all())
+        finally:
+            db.close()
+
+    def evict_idle(self, now: float, ttl: float) -> int:
+        db = self._session()
+        try:
+            result = db.execute(
+                delete(CartSnapshot).where(
+                    CartSnapshot.sucio_desde.is_(None),
+                    CartSnapshot.fecha_actualizacion < datetime.utcfromtimestamp(now - ttl),
+                )
+            )
+            db.commit()
+            return result.rowcount
+        finally:
+            db.close()
+
+
+class CartEngine:
+    """Cart reads/mutations against the hot tier, with debounced persistence to SQL"""
+
+    def __init__(self, store=None, debounce: Optional[float] = None, max_delay: Optional[float] = None,
+                 idle_ttl: Optional[float] = None, reserve_stock: Optional[bool] = None):
+        self.store = store or MemoryCartStore()
+        self.reserve_stock = settings.CART_RESERVE_STOCK if reserve_stock is None else reserve_stock
+        self.debounce = debounce if debounce is not None else settings.CART_FLUSH_DEBOUNCE_SECONDS
+        self.max_delay = max_delay if max_delay is not None else settings.CART_FLUSH_MAX_DELAY_SECONDS
+        self.idle_ttl = idle_ttl if idle_ttl is not None else settings.CART_IDLE_TTL_SECONDS
+        self._flush_lock = threading.Lock()
+
+    # ---- loading ------------------------------------------------------------
+
+    @staticmethod
+    def _owner_filter(usuario_id: Optional[int], session_id: Optional[str]):
+        if usuario_id is not None:
+            return Cart.usuario_id == usuario_id
+        return (Cart.session_id == session_id) & Cart.usuario_id.is_(None)
+
+    def _load_from_db(self, db: Session, usuario_id: Optional[int], session_id: Optional[str]) -> Dict[str, Any]:
+        """Latest persisted cart of the owner, items included, in one query"""
+        latest = select(func.max(Cart.id)).where(self._owner_filter(usuario_id, session_id)).scalar_subquery()
+        rows = db.execute(
+            select(Cart.id, CartItem.producto_id, CartItem.cantidad, CartItem.precio_unitario)
+            .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+            .where(Cart.id == latest)
+        ).all()
+        state = new_cart(usuario_id, session_id, rows[0].id if rows else None)
+        for row in rows:
+            if row.producto_id is not None:
+                set_line(state, row.producto_id, row.cantidad, row.precio_unitario)
+        return state
+
+    def get(self, db: Session, usuario_id: Optional[int], session_id: Optional[str]) -> Dict[str, Any]:
+        """Current cart; loaded from SQL once and then served from the hot tier"""
+        key = cart_key(usuario_id, session_id)
+        state = self.store.load(key)
+        if state is not None:
+            return state
+        state = self._load_from_db(db, usuario_id, session_id)
+        state["version"] = 1
+        try:
+            self.store.save(key, state, 0)
+        except CartConflictError:
+            return self.store.load(key) or state
+        return state
+
+    # ---- mutations ----------------------------------------------------------
+
+    def _mutate(self, db: Session, usuario_id: Optional[int], session_id: Optional[str],
+                apply: Callable[[Dict[str, Any]], None], evento: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        key = cart_key(usuario_id, session_id)
+        for _ in range(5):
+            # Copy-on-write: the stored state is never mutated in place
+            current = self.get(db, usuario_id, session_id)
+            state = copy.deepcopy(current)
+            apply(state)
+            if self.reserve_stock and lines_of(state) != lines_of(current):
+                self._hold(db, usuario_id, session_id, state)
+            now = time.time()
+            state["version"] = current["version"] + 1
+            state["actualizado"] = now
+            if state["sucio_desde"] is None:
+                state["sucio_desde"] = now
+            if evento:
+                pendiente = dict(evento, id=uuid.uuid4().hex, timestamp=datetime.utcnow().isoformat())
+                state["eventos"] = (state["eventos"] + [pendiente])[-MAX_PENDING_EVENTS:]
+            try:
+                self.store.save(key, state, current["version"])
+                return state
+            except CartConflictError:
+                continue
+        raise CartError(f"Cart {key} is being modified concurrently")
+
+    @staticmethod
+    def _hold(db: Session, usuario_id: Optional[int], session_id: Optional[str], state: Dict[str, Any]) -> None:
+        """Move the cart's reservation to its new lines (a conflicting retry holds again)"""
+        try:
+            reservation_service.hold(db, reservation_key(usuario_id, session_id), lines_of(state).items(), usuario_id)
+        except StockInsuficienteError as e:
+            producto_id = e.producto_ids[0]
+            disponible = db.scalar(select(Producto.cantidad_disponible).where(Producto.id == producto_id)) or 0
+            raise CantidadNoDisponibleError(producto_id, disponible)
+
+    def hold_stock(self, db: Session, usuario_id: Optional[int], session_id: Optional[str]) -> None:
+        """Reserve the current cart's lines (after a merge installed them)"""
+        if self.reserve_stock:
+            self._hold(db, usuario_id, session_id, self.get(db, usuario_id, session_id))
+
+    def release_stock(self, db: Session, usuario_id: Optional[int], session_id: Optional[str]) -> None:
+        if self.reserve_stock:
+            reservation_service.release(db, reservation_key(usuario_id, session_id))
+
+    @staticmethod
+    def _producto(db: Session, producto_id: int):
+        producto = db.execute(
+            select(Producto.id, Producto.precio, Producto.cantidad_disponible)
+            .where(Producto.id == producto_id, Producto.activo == True)  # noqa: E712
+        ).first()
+        if producto is None:
+            raise ProductoNoDisponibleError(producto_id)
+        return producto
+
+    def add_item(self, db: Session, usuario_id: Optional[int], session_id: Optional[str],
+                 producto_id: int, cantidad: int) -> Dict[str, Any]:
+        """Add units of a product (summed with the existing line, capped by stock)"""
+        producto = self._producto(db, producto_id)
+
+        def apply(state):
+            line = state["items"].get(str(producto_id))
+            nueva = (line["cantidad"] if line else 0) + cantidad
+            # With reservations the conditional UPDATE in hold() is the stock check
+            if not self.reserve_stock and nueva > producto.cantidad_disponible:
+                raise CantidadNoDisponibleError(producto_id, producto.cantidad_disponible)
+            set_line(state, producto_id, nueva, producto.precio)
+
+        evento = {"queue": "cart.item.agregar", "action": "agregar",
+                  "payload": {"productoId": producto_id, "cantidad": cantidad}}
+        return self._mutate(db, usuario_id, session_id, apply, evento)
+
+    def set_quantity(self, db: Session, usuario_id: Optional[int], session_id: Optional[str],
+                     producto_id: int, cantidad: int) -> Dict[str, Any]:
+        """Replace a line's quantity"""
+        producto = self._producto(db, producto_id)
+
+        def apply(state):
+            if str(producto_id) not in state["items"]:
+                raise ItemNoEncontradoError(producto_id)
+            if not self.reserve_stock and cantidad > producto.cantidad_disponible:
+                raise CantidadNoDisponibleError(producto_id, producto.cantidad_disponible)
+            set_line(state, producto_id, cantidad, producto.precio)
+
+        evento = {"queue": "cart.item.actualizar", "action": "actualizar",
+                  "payload": {"productoId": producto_id, "cantidad": cantidad}}
+        return self._mutate(db, usuario_id, session_id, apply, evento)
+
+    def remove_item(self, db: Session, usuario_id: Optional[int], session_id: Optional[str],
+                    producto_id: int) -> Dict[str, Any]:
+        def apply(state):
+            if str(producto_id) not in state["items"]:
+                raise ItemNoEncontradoError(producto_id)
+            set_line(state, producto_id, 0, Decimal(0))
+
+        evento = {"queue": "cart.item.eliminar", "action": "eliminar", "payload": {"productoId": producto_id}}
+        return self._mutate(db, usuario_id, session_id, apply, evento)
+
+    def clear(self, db: Session, usuario_id: Optional[int], session_id: Optional[str]) -> Dict[str, Any]:
+        def apply(state):
+            state["items"] = {}
+            state["total"] = "0.00"
+            state["cantidad_total"] = 0
+
+        return self._mutate(db, usuario_id, session_id, apply, {"queue": "cart.vaciar", "action": "vaciar", "payload": {}})
+
+    def install(self, usuario_id: Optional[int], session_id: Optional[str], state: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace the hot-tier cart with a state that is already persisted (e.g. a login merge)"""
+        key = cart_key(usuario_id, session_id)
+        for _ in range(5):
+            current = self.store.load(key)
+            expected = current["version"] if current else 0
+            installed = copy.deepcopy(state)
+            installed.update(version=expected + 1, sucio_desde=None, actualizado=time.time(), eventos=[])
+            try:
+                self.store.save(key, installed, expected)
+                return installed
+            except CartConflictError:
+                continue
+        raise CartError(f"Cart {key} is being modified concurrently")
+
+    def forget(self, usuario_id: Optional[int], session_id: Optional[str]) -> None:
+        """Drop a cart from the hot tier (its SQL rows are untouched)"""
+        self.store.delete(cart_key(usuario_id, session_id))
+
+    # ---- persistence --------------------------------------------------------
+
+    def _resolve_cart_ids(self, db: Session, states: List[Dict[str, Any]]) -> None:
+        """Fill cart_id for carts never persisted: reuse the owner's row or create one"""
+        missing = [s for s in states if s["cart_id"] is None and s["items"]]
+        if not missing:
+            return
+        usuarios = [s["usuario_id"] for s in missing if s["usuario_id"] is not None]
+        sesiones = [s["session_id"] for s in missing if s["usuario_id"] is None]
+        existing: Dict[Any, int] = {}
+        if usuarios:
+            for row in db.execute(
+                select(Cart.usuario_id, func.max(Cart.id).label("id"))
+                .where(Cart.usuario_id.in_(usuarios)).group_by(Cart.usuario_id)
+            ):
+                existing[("u", row.usuario_id)] = row.id
+        if sesiones:
+            for row in db.execute(
+                select(Cart.session_id, func.max(Cart.id).label("id"))
+                .where(Cart.session_id.in_(sesiones), Cart.usuario_id.is_(None)).group_by(Cart.session_id)
+            ):
+                existing[("s", row.session_id)] = row.id
+
+        created = []
+        for state in missing:
+            owner = ("u", state["usuario_id"]) if state["usuario_id"] is not None else ("s", state["session_id"])
+            if owner in existing:
+                state["cart_id"] = existing[owner]
+            else:
+                cart = Cart(usuario_id=state["usuario_id"], session_id=state["session_id"])
+                db.add(cart)
+                created.append((state, cart))
+        if created:
+            db.flush()
+            for state, cart in created:
+                state["cart_id"] = cart.id
+
+    def _write(self, db: Session, states: List[Dict[str, Any]]) -> None:
+        """Persist carts set-based: one delete per cart for dropped lines, one upsert for the rest"""
+        self._resolve_cart_ids(db, states)
+        persisted = [s for s in states if s["cart_id"] is not None]
+        if not persisted:
+            return
+        rows = []
+        for state in persisted:
+            producto_ids = [int(pid) for pid in state["items"]]
+            stmt = delete(CartItem).where(CartItem.cart_id == state["cart_id"])
+            if producto_ids:
+                stmt = stmt.where(CartItem.producto_id.not_in(producto_ids))
+            db.execute(stmt)
+            rows.extend(
+                {
+                    "cart_id": state["cart_id"],
+                    "producto_id": int(pid),
+                    "cantidad": line["cantidad"],
+                    "precio_unitario": Decimal(line["precio_unitario"]),
+                }
+                for pid, line in state["items"].items()
+            )
+        upsert(db, CartItem, ["cart_id", "producto_id"], rows, assign=["cantidad", "precio_unitario"])
+        db.execute(
+            update(Cart)
+            .where(Cart.id.in_([s["cart_id"] for s in persisted]))
+            .values(fecha_actualizacion=datetime.utcnow())
+        )
+
+    def _mark_clean(self, key: str, flushed: Dict[str, Any], published: Set[str]) -> None:
+        """
+        Drop the published events and clear the dirty flag, unless the cart changed while we
+        were writing it or some events are still unpublished (they go out on the next flush)
+        """
+        for _ in range(5):
+            current = self.store.load(key)
+            if current is None:
+                return
+            state = copy.deepcopy(current)
+            state["cart_id"] = state["cart_id"] or flushed["cart_id"]
+            state["eventos"] = [e for e in state["eventos"] if e["id"] not in published]
+            if current["version"] == flushed["version"] and not state["eventos"]:
+                state["sucio_desde"] = None
+            state["version"] = current["version"] + 1
+            try:
+                self.store.save(key, state, current["version"])
+                return
+            except CartConflictError:
+                continue
+
+    @staticmethod
+    def _publish(states: List[Dict[str, Any]]) -> Set[str]:
+        """
+        Publish the buffered cart.* events of flushed carts over a connection of this flush
+        (pika connections are not shared across threads). Returns the ids that went out.
+        """
+        eventos = [(s, e) for s in states for e in s["eventos"]]
+        published = set()
+        if not eventos:
+            return published
+        producer = RabbitMQProducer()
+        try:
+            producer.connect()
+            for state, evento in eventos:
+                payload = dict(evento["payload"], cartId=state["cart_id"],
+                               usuarioId=state["usuario_id"], sessionId=state["session_id"])
+                producer.publish(evento["queue"], envelope(
+                    evento["queue"], payload, action=evento["action"],
+                    request_id=evento["id"], timestamp=evento["timestamp"],
+                ))
+                published.add(evento["id"])
+        except Exception as e:
+            logger.warning(f"Could not publish RabbitMQ cart messages, "
+                           f"{len(eventos) - len(published)} kept for the next flush: {str(e)}")
+        finally:
+            try:
+                producer.close()
+            except Exception:
+                pass
+        return published
+
+    def persist(self, db: Session, keys: List[str]) -> Dict[str, Optional[int]]:
+        """Write the given carts to Carts/CartItems now. Returns cart_id per key."""
+        with self._flush_lock:
+            states = {}
+            for key in keys:
+                state = self.store.load(key)
+                if state is not None:
+                    states[key] = copy.deepcopy(state)
+            dirty = [s for s in states.values() if s["sucio_desde"] is not None]
+            if dirty:
+                try:
+                    self._write(db, dirty)
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    raise
+                published = self._publish(dirty)
+                for key, state in states.items():
+                    if state["sucio_desde"] is not None:
+                        self._mark_clean(key, state, published)
+            return {key: state["cart_id"] for key, state in states.items()}
+
+    def persist_cart(self, db: Session, usuario_id: Optional[int], session_id: Optional[str]) -> Optional[int]:
+        """Persist one cart immediately (checkout, login merge). Returns its cart_id."""
+        key = cart_key(usuario_id, session_id)
+        if self.store.load(key) is None:
+            return self._load_from_db(db, usuario_id, session_id)["cart_id"]
+        return self.persist(db, [key])[key]
+
+    def flush_due(self, db: Session, now: Optional[float] = None, force: bool = False) -> int:
+        """Persist carts that have been quiet for `debounce` (or dirty for `max_delay`)"""
+        now = time.time() if now is None else now
+        keys = self.store.due(now, 0 if force else self.debounce, 0 if force else self.max_delay)
+        failed = 0
+        for start in range(0, len(keys), 200):
+            chunk = keys[start:start + 200]
+            try:
+                self.persist(db, chunk)
+            except Exception as e:
+                # One bad cart must not hold back the rest: retry the chunk cart by cart
+                logger.warning(f"Cart flush of {len(chunk)} carts failed, retrying one by one: {str(e)}")
+                for key in chunk:
+                    try:
+                        self.persist(db, [key])
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"Could not persist cart {key}: {str(e)}")
+        evicted = self.store.evict_idle(now, self.idle_ttl)
+        if keys or evicted:
+            logger.info(f"Cart flush: persisted {len(keys) - failed} carts ({failed} failed), "
+                        f"evicted {evicted} idle carts")
+        return len(keys) - failed
+
+
+def _create_store():
+    if settings.CART_BACKEND == "sql":
+        return SQLCartStore()
+    return MemoryCartStore()
+
+
+# Global cart engine instance, hot tier selected by CART_BACKEND ("memory" | "sql")
+cart_engine = CartEngine(_create_store())
@@ -0,0 +1,122 @@
+"""
+Public catalog reads: carousel, category tree and product browsing
+Each read is rendered once into a ResponseCache (CATALOG_CACHE_TTL_SECONDS) shared by the
+individual endpoints and by /api/home/bundle. Carousel writes invalidate the carousel;
+restocks and checkouts invalidate the product pages.
+Misses are single-flight: however many requests arrive while a page is missing, one query
+runs on its own session. Expired pages keep being served for CATALOG_CACHE_STALE_SECONDS
+while one refresh runs, and a failed load is re-raised for CATALOG_CACHE_NEGATIVE_TTL_SECONDS
+instead of being retried by every request.
+"""
+from typing import Any, Dict, FrozenSet, List, Optional
+import logging
+
+from sqlalchemy.orm import Session, load_only
+
+from app.config import settings
+from app.models import CarruselImagen, Categoria, Producto, Subcategoria
+from app.schemas import CarruselImagenResponse, CategoriaResponse, ProductoResponse
+from app.utils.background import with_session
+from app.utils.response_cache import CachedResponse, ResponseCache
+from app.utils.serialization import serializer_for
+
+logger = logging.getLogger(__name__)
+
+MAX_CAROUSEL_IMAGES = 5
+
+
+class CatalogService:
+    """Cached catalog queries"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None,
+                 stale_seconds: Optional[float] = None, negative_ttl_seconds: Optional[float] = None):
+        ttl_seconds = settings.CATALOG_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        max_entries = max_entries or settings.CATALOG_CACHE_MAX_ENTRIES
+        timing = {
+            "stale_seconds": settings.CATALOG_CACHE_STALE_SECONDS if stale_seconds is None else stale_seconds,
+            "negative_ttl_seconds": (settings.CATALOG_CACHE_NEGATIVE_TTL_SECONDS
+                                     if negative_ttl_seconds is None else negative_ttl_seconds),
+        }
+        self.carousel_cache = ResponseCache("carousel", ttl_seconds, 1, **timing)
+        self.categories_cache = ResponseCache("categories", ttl_seconds, max_entries, **timing)
+        self.products_cache = ResponseCache("products", ttl_seconds, max_entries, **timing)
+
+    # -- queries --
+
+    @staticmethod
+    def load_carousel(db: Session) -> List[Dict[str, Any]]:
+        images = (
+            db.query(CarruselImagen)
+            .filter(CarruselImagen.activo == True)
+            .order_by(CarruselImagen.orden.asc())
+            .limit(MAX_CAROUSEL_IMAGES)
+            .all()
+        )
+        return serializer_for(CarruselImagenResponse).to_list(images)
+
+    @staticmethod
+    def load_categories(db: Session, skip: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+        """Active categories with their active subcategories (two queries, no N+1)"""
+        categorias = (
+            db.query(Categoria)
+            .filter(Categoria.activo == True)
+            .order_by(Categoria.nombre.asc())
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
+        if not categorias:
+            return []
+        subcategorias: Dict[int, List[Subcategoria]] = {c.id: [] for c in categorias}
+        for sub in (
+            db.query(Subcategoria)
+            .filter(Subcategoria.categoria_id.in_(list(subcategorias)), Subcategoria.activo == True)
+            .order_by(Subcategoria.nombre.asc())
+        ):
+            subcategorias[sub.categoria_id].append(sub)
+        serializer = serializer_for(CategoriaResponse)
+        return [
+            serializer.to_dict({"id": c.id, "nombre": c.nombre, "subcategorias": subcategorias[c.id]})
+            for c in categorias
+        ]
+
+    @staticmethod
+    def load_products(db: Session, categoria_id: Optional[int] = None, subcategoria_id: Optional[int] = None,
+                      skip: int = 0, limit: int = 12, fields: Optional[FrozenSet[str]] = None) -> List[Dict[str, Any]]:
+        """Active, in-stock products, newest first (only the `fields` columns when given)"""
+        query = db.query(Producto).filter(Producto.activo == True, Producto.cantidad_disponible > 0)
+        if fields is not None:
+            query = query.options(load_only(*(getattr(Producto, name) for name in sorted(fields))))
+        if categoria_id is not None:
+            query = query.filter(Producto.categoria_id == categoria_id)
+        if subcategoria_id is not None:
+            query = query.filter(Producto.subcategoria_id == subcategoria_id)
+        productos = query.order_by(Producto.fecha_creacion.desc(), Producto.id.desc()).offset(skip).limit(limit).all()
+        return serializer_for(ProductoResponse).project(fields).to_list(productos)
+
+    # -- cached (loads run in the threadpool on their own session) --
+
+    async def carousel(self) -> CachedResponse:
+        return await self.carousel_cache.get_or_load("active", with_session(self.load_carousel))
+
+    async def categories(self, skip: int = 0, limit: int = 10) -> CachedResponse:
+        return await self.categories_cache.get_or_load(
+            (skip, limit), with_session(lambda db: self.load_categories(db, skip, limit))
+        )
+
+    async def products(self, categoria_id: Optional[int] = None, subcategoria_id: Optional[int] = None,
+                       skip: int = 0, limit: int = 12, fields: Optional[FrozenSet[str]] = None) -> CachedResponse:
+        key = (categoria_id, subcategoria_id, skip, limit, fields)
+        return await self.products_cache.get_or_load(
+            key, with_session(lambda db: self.load_products(db, categoria_id, subcategoria_id, skip, limit, fields))
+        )
+
+    def invalidate_carousel(self) -> None:
+        self.carousel_cache.invalidate()
+
+    def invalidate_products(self) -> None:
+        self.products_cache.invalidate()
+
+
+# Global catalog service instance
+catalog_service = CatalogService()
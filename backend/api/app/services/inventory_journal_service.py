@@ -0,0 +1,328 @@
+"""
+Write-behind journal for InventarioHistorial
+Movements are appended to a local write-ahead file (fsync'd, so they survive a crash),
+buffered in memory and inserted in batches when the buffer reaches a size threshold
+or the flush interval elapses. Reads merge the still-unflushed entries.
+Writers append before committing their stock change and discard() the entry when that
+commit fails; the discard is written to the WAL too, so a replay skips the entry.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from app import database
+from app.config import settings
+from app.models import InventarioHistorial, InventarioHistorialArchivo
+from app.services.archive_service import page_across
+from app.services.inventory_stats_service import inventory_stats_service
+
+logger = logging.getLogger(__name__)
+
+_FIELDS = ("producto_id", "cantidad_anterior", "cantidad_nueva", "tipo_movimiento", "referencia", "usuario_id")
+
+
+def _encode(entry: Dict[str, Any]) -> str:
+    data = dict(entry)
+    data["fecha"] = entry["fecha"].isoformat()
+    return json.dumps(data)
+
+
+def _tombstone(entry: Dict[str, Any]) -> str:
+    return json.dumps({"discard": entry["journal_id"]})
+
+
+def _decode(line: str) -> Dict[str, Any]:
+    data = json.loads(line)
+    data["fecha"] = datetime.fromisoformat(data["fecha"])
+    return data
+
+
+class InventoryJournal:
+    """Buffered, crash-safe InventarioHistorial writer"""
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        stale_after: Optional[float] = None,
+    ):
+        self.directory = directory or settings.INVENTORY_JOURNAL_DIR
+        self.batch_size = batch_size or settings.INVENTORY_JOURNAL_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.INVENTORY_JOURNAL_FLUSH_SECONDS
+        self.stale_after = stale_after or settings.INVENTORY_JOURNAL_STALE_SECONDS
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Active segment: WAL file receiving appends + its entries
+        self._segment_path: Optional[str] = None
+        self._segment_file = None
+        self._buffer: List[Dict[str, Any]] = []
+        # Sealed segments waiting for (or retrying) their flush
+        self._sealed: List[Tuple[str, List[Dict[str, Any]]]] = []
+
+    # ---- write path -------------------------------------------------------
+
+    def _open_segment(self):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex}.wal"
+        self._segment_path = os.path.join(self.directory, name)
+        self._segment_file = open(self._segment_path, "a", encoding="utf-8")
+
+    def append(self, **movimiento) -> Dict[str, Any]:
+        """
+        Record a movement. Returns the pending entry (id is None until flushed).
+        Accepts the InventarioHistorial columns as keyword arguments.
+        """
+        entry = {field: movimiento.get(field) for field in _FIELDS}
+        entry["fecha"] = movimiento.get("fecha") or datetime.utcnow()
+        entry["journal_id"] = uuid.uuid4().hex
+        with self._lock:
+            if self._segment_file is None:
+                self._open_segment()
+            self._segment_file.write(_encode(entry) + "\n")
+            self._segment_file.flush()
+            os.fsync(self._segment_file.fileno())
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return entry
+
+    def discard(self, entry: Dict[str, Any]) -> bool:
+        """Withdraw an appended movement whose stock change was rolled back"""
+        with self._lock:
+            if any(e is entry for e in self._buffer):
+                self._buffer = [e for e in self._buffer if e is not entry]
+                path, target = self._segment_path, self._segment_file
+            else:
+                path, target = next(((p, None) for p, seg in self._sealed if any(e is entry for e in seg)), (None, None))
+                if path is None:
+                    logger.error(f"Inventory movement {entry['journal_id']} was already flushed; not discarded")
+                    return False
+                self._sealed = [(p, [e for e in seg if e is not entry] if p == path else seg) for p, seg in self._sealed]
+            if target is not None:
+                target.write(_tombstone(entry) + "\n")
+                target.flush()
+                os.fsync(target.fileno())
+            else:
+                with open(path, "a", encoding="utf-8") as sealed_file:
+                    sealed_file.write(_tombstone(entry) + "\n")
+                    sealed_file.flush()
+                    os.fsync(sealed_file.fileno())
+        return True
+
+    def _seal(self):
+        """Close the active segment so new appends go to a fresh file"""
+        with self._lock:
+            if self._segment_file is None:
+                return
+            self._segment_file.close()
+            self._sealed.append((self._segment_path, self._buffer))
+            self._segment_file = None
+            self._segment_path = None
+            self._buffer = []
+
+    # ---- flush path -------------------------------------------------------
+
+    @staticmethod
+    def _insert(db: Session, entries: List[Dict[str, Any]]) -> int:
+        """Insert entries not already in the table (replays after a crash are no-ops)"""
+        if not entries:
+            return 0
+        ids = [e["journal_id"] for e in entries]
+        existing = set()
+        for start in range(0, len(ids), 1000):
+            existing.update(db.scalars(
+                select(InventarioHistorial.journal_id)
+                .where(InventarioHistorial.journal_id.in_(ids[start:start + 1000]))
+            ).all())
+        rows = [e for e in entries if e["journal_id"] not in existing]
+        if rows:
+            db.execute(insert(InventarioHistorial), rows)
+            # Aggregates move in the same transaction, so replays never double count
+            inventory_stats_service.apply_movements(db, rows)
+        db.commit()
+        return len(rows)
+
+    def flush(self, db: Session) -> int:
+        """Insert every buffered movement in one batch per sealed segment"""
+        with self._flush_lock:
+            self._seal()
+            with self._lock:
+                sealed = list(self._sealed)
+            written = 0
+            for path, entries in sealed:
+                try:
+                    written += self._insert(db, entries)
+                except Exception:
+                    db.rollback()
+                    raise
+                with self._lock:
+                    self._sealed.remove((path, entries))
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            return written
+
+    def _heartbeat(self):
+        """Touch our WAL files so other processes don't treat them as orphans"""
+        with self._lock:
+            paths = [p for p, _ in self._sealed]
+            if self._segment_path:
+                paths.append(self._segment_path)
+        for path in paths:
+            try:
+                os.utime(path, None)
+            except FileNotFoundError:
+                pass
+
+    def recover(self, db: Session) -> int:
+        """Replay WAL files left behind by crashed processes"""
+        if not os.path.isdir(self.directory):
+            return 0
+        with self._lock:
+            own = {p for p, _ in self._sealed}
+            if self._segment_path:
+                own.add(self._segment_path)
+        cutoff = time.time() - self.stale_after
+        replayed = 0
+        for name in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".wal") or path in own:
+                continue
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    # A torn last line means the append never returned; skip it
+                    entries, discarded = [], set()
+                    for line in f:
+                        try:
+                            data = json.loads(line)
+                            if "discard" in data:
+                                discarded.add(data["discard"])
+                            else:
+                                entries.append(_decode(line))
+                        except ValueError:
+                            continue
+                replayed += self._insert(db, [e for e in entries if e["journal_id"] not in discarded])
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Could not replay inventory journal {name}: {str(e)}")
+        if replayed:
+            logger.info(f"Replayed {replayed} inventory movements from orphaned journals")
+        return replayed
+
+    # ---- read path --------------------------------------------------------
+
+    def pending_for(self, producto_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Unflushed movements grouped by product, newest first"""
+        wanted = set(producto_ids)
+        with self._lock:
+            entries = [e for _, seg in self._sealed for e in seg] + list(self._buffer)
+        result: Dict[int, List[Dict[str, Any]]] = {}
+        for e in entries:
+            if e["producto_id"] in wanted:
+                result.setdefault(e["producto_id"], []).append(dict(e, id=None))
+        for items in result.values():
+            items.sort(key=lambda e: e["fecha"], reverse=True)
+        return result
+
+    def pending(self, producto_id: int) -> List[Dict[str, Any]]:
+        """Unflushed movements for a product, newest first"""
+        return self.pending_for([producto_id]).get(producto_id, [])
+
+    def unflushed(self, db: Session, producto_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """pending_for() minus entries a concurrent flush already committed"""
+        pending = self.pending_for(producto_ids)
+        ids = [e["journal_id"] for items in pending.values() for e in items]
+        if not ids:
+            return pending
+        flushed = set()
+        for start in range(0, len(ids), 1000):
+            flushed.update(db.scalars(
+                select(InventarioHistorial.journal_id)
+                .where(InventarioHistorial.journal_id.in_(ids[start:start + 1000]))
+            ).all())
+        return {
+            pid: [e for e in items if e["journal_id"] not in flushed]
+            for pid, items in pending.items()
+        }
+
+    def history(self, db: Session, producto_id: int, skip: int = 0, limit: int = 50) -> List[Any]:
+        """Page of InventarioHistorial (newest first) including unflushed movements"""
+        # Entries flushed between our snapshot and this query are already in the table
+        pending = self.unflushed(db, [producto_id]).get(producto_id, [])
+
+        page: List[Any] = pending[skip:skip + limit]
+        remaining = limit - len(page)
+        if remaining > 0:
+            # Hot table first, then the archive once paging goes past it
+            page.extend(page_across(db, [
+                select(tabla)
+                .where(tabla.producto_id == producto_id)
+                .order_by(tabla.fecha.desc(), tabla.id.desc())
+                for tabla in (InventarioHistorial, InventarioHistorialArchivo)
+            ], max(0, skip - len(pending)), remaining))
+        return page
+
+    # ---- lifecycle --------------------------------------------------------
+
+    def _run(self):
+        last_recover = 0.0
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            db = database.SessionLocal()
+            try:
+                self._heartbeat()
+                self.flush(db)
+                if time.monotonic() - last_recover >= self.stale_after:
+                    last_recover = time.monotonic()
+                    self.recover(db)
+            except Exception as e:
+                logger.warning(f"Inventory journal flush failed: {str(e)}")
+            finally:
+                db.close()
+
+    def start(self):
+        """Start the flusher thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="inventory-journal", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flusher thread and flush what is left"""
+        if self._thread is not None:
+            self._stopping.set()
+            self._wakeup.set()
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+        db = database.SessionLocal()
+        try:
+            self.flush(db)
+        except Exception as e:
+            logger.error(f"Final inventory journal flush failed, WAL kept for replay: {str(e)}")
+        finally:
+            db.close()
+
+
+# Global inventory journal instance
+inventory_journal = InventoryJournal()
@@ -0,0 +1,151 @@
+"""
+Per-product inventory aggregates (InventarioResumen)
+Updated incrementally, in the same transaction, whenever InventarioHistorial rows are written,
+so stock snapshots never scan the history with MAX/COUNT.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+import logging
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models import InventarioResumen, Producto
+from app.services.archive_service import inventory_history_with_archive
+from app.utils.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+MOVIMIENTO_REABASTECIMIENTO = "REABASTECIMIENTO"
+# Stock held and given back by reservation_service: cart churn, not stock movements
+MOVIMIENTOS_RESERVA = ("RESERVA", "LIBERACION")
+
+
+def _empty(producto_id: int) -> Dict[str, Any]:
+    return {
+        "producto_id": producto_id,
+        "ultimo_reabastecimiento": None,
+        "total_movimientos": 0,
+        "unidades_entrada": 0,
+        "unidades_salida": 0,
+    }
+
+
+def summarize(movimientos: Iterable[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Fold movements into per-product deltas (reservation holds and releases are left out)"""
+    resumen: Dict[int, Dict[str, Any]] = {}
+    for m in movimientos:
+        if m["tipo_movimiento"] in MOVIMIENTOS_RESERVA:
+            continue
+        fila = resumen.setdefault(m["producto_id"], _empty(m["producto_id"]))
+        cambio = m["cantidad_nueva"] - m["cantidad_anterior"]
+        fila["total_movimientos"] += 1
+        if cambio > 0:
+            fila["unidades_entrada"] += cambio
+        else:
+            fila["unidades_salida"] -= cambio
+        if m["tipo_movimiento"] == MOVIMIENTO_REABASTECIMIENTO:
+            fecha = m.get("fecha") or datetime.utcnow()
+            if fila["ultimo_reabastecimiento"] is None or fecha > fila["ultimo_reabastecimiento"]:
+                fila["ultimo_reabastecimiento"] = fecha
+    return resumen
+
+
+class InventoryStatsService:
+    """Maintains and serves InventarioResumen"""
+
+    @staticmethod
+    def apply_movements(db: Session, movimientos: List[Dict[str, Any]]) -> None:
+        """Fold movements into the aggregates with one set-based upsert (caller commits)"""
+        resumen = summarize(movimientos)
+        if not resumen:
+            return
+        ahora = datetime.utcnow()
+        rows = [dict(fila, fecha_actualizacion=ahora) for _, fila in sorted(resumen.items())]
+        upsert(
+            db, InventarioResumen, ["producto_id"], rows,
+            increment=["total_movimientos", "unidades_entrada", "unidades_salida"],
+            greatest=["ultimo_reabastecimiento"],
+            assign=["fecha_actualizacion"],
+        )
+
+    @staticmethod
+    def snapshots(db: Session, producto_ids: List[int], pending: Dict[int, List[Dict[str, Any]]] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        Stock snapshot per product in one query: cantidad_disponible plus aggregates.
+        `pending` holds journal movements not yet flushed, folded in so counts stay exact.
+        Products that don't exist are absent from the result.
+        """
+        rows = db.execute(
+            select(
+                Producto.id,
+                Producto.nombre,
+                Producto.cantidad_disponible,
+                InventarioResumen.ultimo_reabastecimiento,
+                InventarioResumen.total_movimientos,
+                InventarioResumen.unidades_entrada,
+                InventarioResumen.unidades_salida,
+            )
+            .outerjoin(InventarioResumen, InventarioResumen.producto_id == Producto.id)
+            .where(Producto.id.in_(producto_ids))
+        ).all()
+
+        result = {}
+        for row in rows:
+            snapshot = {
+                "producto_id": row.id,
+                "nombre": row.nombre,
+                "cantidad_disponible": row.cantidad_disponible,
+                "ultimo_reabastecimiento": row.ultimo_reabastecimiento,
+                "total_movimientos": row.total_movimientos or 0,
+                "unidades_entrada": row.unidades_entrada or 0,
+                "unidades_salida": row.unidades_salida or 0,
+            }
+            extra = summarize((pending or {}).get(row.id, [])).get(row.id)
+            if extra:
+                for key in ("total_movimientos", "unidades_entrada", "unidades_salida"):
+                    snapshot[key] += extra[key]
+                ultimo = extra["ultimo_reabastecimiento"]
+                if ultimo and (snapshot["ultimo_reabastecimiento"] is None or ultimo > snapshot["ultimo_reabastecimiento"]):
+                    snapshot["ultimo_reabastecimiento"] = ultimo
+            result[row.id] = snapshot
+        return result
+
+    @staticmethod
+    def rebuild(db: Session) -> int:
+        """Recompute every aggregate from InventarioHistorial and its archive (backfill / repair)"""
+        historial = inventory_history_with_archive()
+        cambio = historial.c.cantidad_nueva - historial.c.cantidad_anterior
+        agregados = (
+            select(
+                historial.c.producto_id,
+                func.max(case(
+                    (historial.c.tipo_movimiento == MOVIMIENTO_REABASTECIMIENTO, historial.c.fecha),
+                )),
+                func.count(),
+                func.coalesce(func.sum(case((cambio > 0, cambio), else_=0)), 0),
+                func.coalesce(func.sum(case((cambio < 0, -cambio), else_=0)), 0),
+                func.max(historial.c.fecha),
+            )
+            .where(historial.c.tipo_movimiento.not_in(MOVIMIENTOS_RESERVA))
+            .group_by(historial.c.producto_id)
+        )
+        try:
+            db.execute(delete(InventarioResumen))
+            result = db.execute(
+                insert(InventarioResumen).from_select(
+                    ["producto_id", "ultimo_reabastecimiento", "total_movimientos",
+                     "unidades_entrada", "unidades_salida", "fecha_actualizacion"],
+                    agregados,
+                )
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        logger.info(f"Rebuilt inventory aggregates for {result.rowcount} products")
+        return result.rowcount
+
+
+# Global inventory stats service instance
+inventory_stats_service = InventoryStatsService()
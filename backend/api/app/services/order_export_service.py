@@ -0,0 +1,141 @@
+"""
+Order export for accounting
+Orders and their items in a date range are read through one ordered query iterated with
+yield_per (a server-side cursor where the driver supports it) and encoded as CSV or JSON
+Lines chunk by chunk, so memory stays flat however large the range is.
+"""
+from datetime import date, datetime, time, timedelta
+from itertools import groupby
+from typing import Any, Iterator, List, Optional, Tuple
+import csv
+import io
+import json
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import database
+from app.config import settings
+from app.models import Producto
+from app.services.archive_service import union_with_archive
+
+logger = logging.getLogger(__name__)
+
+FORMATO_CSV = "csv"
+FORMATO_JSONL = "jsonl"
+
+CSV_COLUMNS = [
+    "pedido_id", "fecha_creacion", "usuario_id", "estado", "total_pedido",
+    "producto_id", "producto", "cantidad", "precio_unitario", "subtotal",
+]
+
+# Bytes buffered before a chunk is handed to the response
+_FLUSH_BYTES = 64 * 1024
+
+
+def date_bounds(desde: date, hasta: date) -> Tuple[datetime, datetime]:
+    """
+    Half-open [desde 00:00, hasta+1 00:00) range on the raw column, so the filter is a
+    plain range seek on idx_pedido_fecha (no CAST/function on fecha_creacion)
+    """
+    return datetime.combine(desde, time.min), datetime.combine(hasta + timedelta(days=1), time.min)
+
+
+class OrderExportService:
+    """Streams orders with items as CSV or JSON Lines"""
+
+    def __init__(self, chunk_size: Optional[int] = None):
+        self.chunk_size = chunk_size or settings.ORDER_EXPORT_CHUNK_SIZE
+
+    def iter_orders(self, db: Session, desde: date, hasta: date,
+                    estado: Optional[str] = None) -> Iterator[Tuple[Any, List[Any]]]:
+        """(order row, item rows) in fecha_creacion order, fetched chunk_size rows at a time"""
+        inicio, fin = date_bounds(desde, hasta)
+
+        def pedidos(pedido, item):
+            stmt = (
+                select(pedido.id, pedido.usuario_id, pedido.estado, pedido.total, pedido.fecha_creacion,
+                       item.id.label("item_id"), item.producto_id, Producto.nombre.label("producto"),
+                       item.cantidad, item.precio_unitario)
+                .outerjoin(item, item.pedido_id == pedido.id)
+                .outerjoin(Producto, Producto.id == item.producto_id)
+                .where(pedido.fecha_creacion >= inicio, pedido.fecha_creacion < fin)
+            )
+            return stmt.where(pedido.estado == estado) if estado else stmt
+
+        # Archived orders are part of the books too; each branch is a range seek on its own index
+        fuente = union_with_archive(pedidos)
+        stmt = (
+            select(fuente)
+            .order_by(fuente.c.fecha_creacion, fuente.c.id, fuente.c.item_id)
+            .execution_options(yield_per=self.chunk_size)
+        )
+        # Rows of one order are adjacent thanks to the ORDER BY
+        for _, rows in groupby(db.execute(stmt), key=lambda row: row.id):
+            rows = list(rows)
+            yield rows[0], [row for row in rows if row.producto_id is not None]
+
+    def iter_csv(self, db: Session, desde: date, hasta: date, estado: Optional[str] = None) -> Iterator[bytes]:
+        """One CSV line per item (orders without items get one line with empty item columns)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        for pedido, items in self.iter_orders(db, desde, hasta, estado):
+            cabecera = [pedido.id, pedido.fecha_creacion.isoformat(), pedido.usuario_id, pedido.estado, pedido.total]
+            if not items:
+                writer.writerow(cabecera + [""] * 5)
+            for item in items:
+                writer.writerow(cabecera + [item.producto_id, item.producto, item.cantidad,
+                                            item.precio_unitario, item.cantidad * item.precio_unitario])
+            if buffer.tell() >= _FLUSH_BYTES:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode("utf-8")
+
+    def iter_jsonl(self, db: Session, desde: date, hasta: date, estado: Optional[str] = None) -> Iterator[bytes]:
+        """One JSON object per order with its items (amounts as strings to keep decimals exact)"""
+        partes: List[str] = []
+        tamano = 0
+        for pedido, items in self.iter_orders(db, desde, hasta, estado):
+            linea = json.dumps({
+                "id": pedido.id,
+                "usuario_id": pedido.usuario_id,
+                "estado": pedido.estado,
+                "fecha_creacion": pedido.fecha_creacion.isoformat(),
+                "total": str(pedido.total),
+                "items": [
+                    {"producto_id": item.producto_id, "producto": item.producto, "cantidad": item.cantidad,
+                     "precio_unitario": str(item.precio_unitario)}
+                    for item in items
+                ],
+            }, ensure_ascii=False) + "\n"
+            partes.append(linea)
+            tamano += len(linea)
+            if tamano >= _FLUSH_BYTES:
+                yield "".join(partes).encode("utf-8")
+                partes, tamano = [], 0
+        if partes:
+            yield "".join(partes).encode("utf-8")
+
+    def stream(self, formato: str, desde: date, hasta: date, estado: Optional[str] = None) -> Iterator[bytes]:
+        """
+        Export generator for StreamingResponse. It opens its own session: the response body
+        is produced after the request's dependencies have been torn down. Exports read
+        from a replica when one is configured.
+        """
+        db = database.read_session_factory()()
+        try:
+            encoder = self.iter_csv if formato == FORMATO_CSV else self.iter_jsonl
+            yield from encoder(db, desde, hasta, estado)
+        except Exception as e:
+            logger.error(f"Order export {desde}..{hasta} failed: {str(e)}")
+            raise
+        finally:
+            db.close()
+
+
+# Global order export service instance
+order_export_service = OrderExportService()
@@ -0,0 +1,267 @@
+"""
+Order service
+Order pages are read in two queries regardless of page size: one for the orders (with the
+total aggregated by the database) and one for all of their items. With a sparse fieldset
+only the requested columns are selected, and neither the total nor the items are read
+unless asked for. Pages that run past the hot orders continue into the archive.
+Estado transitions emit pedido.* events that also feed the dashboard counters and the
+customer statistics in the same transaction.
+"""
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+import logging
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Pedido, PedidoHistorialEstado, PedidoHistorialEstadoArchivo, PedidoItem
+from app.schemas import PedidoResponse
+from app.services.archive_service import ORDER_TABLES, page_across
+from app.services.order_stats_service import order_stats_service
+from app.services.user_stats_service import user_stats_service
+from app.utils.serialization import serializer_for
+
+logger = logging.getLogger(__name__)
+
+ESTADO_PENDIENTE = "Pendiente"
+ESTADO_ENVIADO = "Enviado"
+ESTADO_ENTREGADO = "Entregado"
+ESTADO_CANCELADO = "Cancelado"
+
+# Allowed estado transitions (HU_MANAGE_ORDERS)
+ALLOWED_TRANSITIONS = {
+    ESTADO_PENDIENTE: {ESTADO_ENVIADO, ESTADO_CANCELADO},
+    ESTADO_ENVIADO: {ESTADO_ENTREGADO, ESTADO_CANCELADO},
+    ESTADO_ENTREGADO: set(),
+    ESTADO_CANCELADO: set(),
+}
+
+
+# Per-order failure codes of bulk transitions
+ERROR_NO_ENCONTRADO = "no_encontrado"
+ERROR_TRANSICION = "transicion_no_permitida"
+ERROR_CONFLICTO = "conflicto"
+
+
+class OrderError(Exception):
+    """Base error for order operations"""
+
+
+class PedidoNoEncontradoError(OrderError):
+    def __init__(self, pedido_id: int):
+        self.pedido_id = pedido_id
+        super().__init__(f"Order {pedido_id} not found")
+
+
+class TransicionNoPermitidaError(OrderError):
+    def __init__(self, pedido_id: int, estado_actual: str, estado_nuevo: str):
+        self.pedido_id = pedido_id
+        self.estado_actual = estado_actual
+        self.estado_nuevo = estado_nuevo
+        super().__init__(f"Order {pedido_id} cannot go from {estado_actual} to {estado_nuevo}")
+
+
+def estado_event(pedido_id: int, estado_anterior: Optional[str], estado_nuevo: str, total, fecha_pedido: datetime,
+                 usuario_id: Optional[int] = None, nota: Optional[str] = None) -> Dict[str, Any]:
+    """Payload of pedido.crear / pedido.estado.cambiar messages (also the stats input)"""
+    return {
+        "pedidoId": pedido_id,
+        "estadoAnterior": estado_anterior,
+        "estadoNuevo": estado_nuevo,
+        "total": str(total),
+        "fechaPedido": fecha_pedido.isoformat(),
+        "usuarioId": usuario_id,
+        "nota": nota,
+    }
+
+
+def _total_expr(pedido=Pedido, item=PedidoItem):
+    """Order total summed from its items by the database (falls back to the stored total)"""
+    items_total = (
+        select(func.sum(item.cantidad * item.precio_unitario))
+        .where(item.pedido_id == pedido.id)
+        .correlate(pedido)
+        .scalar_subquery()
+    )
+    return func.coalesce(items_total, pedido.total).label("total")
+
+
+class OrderService:
+    """Order reads and writes shared by the admin routers"""
+
+    @staticmethod
+    def _orders_stmt(*criteria, tables=ORDER_TABLES[0], fields: Optional[FrozenSet[str]] = None):
+        """Orders of one table pair, newest first"""
+        pedido, item = tables
+        columns = [pedido.id] + [
+            column for column in (pedido.usuario_id, pedido.estado, pedido.fecha_creacion)
+            if fields is None or column.key in fields
+        ]
+        if fields is None or "total" in fields:
+            columns.append(_total_expr(pedido, item))
+        return select(*columns).where(*criteria).order_by(pedido.fecha_creacion.desc(), pedido.id.desc())
+
+    def _orders(self, db: Session, *criteria, tables=ORDER_TABLES[0]) -> List[Dict[str, Any]]:
+        return [dict(row._mapping, items=[]) for row in db.execute(self._orders_stmt(*criteria, tables=tables))]
+
+    @staticmethod
+    def _attach_items(db: Session, pedidos: List[Dict[str, Any]], item=PedidoItem) -> None:
+        """Load the items of every order in one IN query"""
+        if not pedidos:
+            return
+        by_id = {p["id"]: p for p in pedidos}
+        rows = db.execute(
+            select(item.id, item.pedido_id, item.producto_id, item.cantidad, item.precio_unitario)
+            .where(item.pedido_id.in_(list(by_id)))
+            .order_by(item.pedido_id, item.id)
+        )
+        for row in rows:
+            by_id[row.pedido_id]["items"].append(dict(row._mapping))
+
+    def list_orders(self, db: Session, estado: Optional[str] = None, usuario_id: Optional[int] = None,
+                    skip: int = 0, limit: int = 20,
+                    fields: Optional[FrozenSet[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Page of orders, newest first, with items and totals, rendered as PedidoResponse (or its
+        `fields`). Archived orders follow the hot ones, as in history().
+        """
+        statements = []
+        for pedido, item in ORDER_TABLES:
+            criteria = []
+            if estado:
+                criteria.append(pedido.estado == estado)
+            if usuario_id is not None:
+                criteria.append(pedido.usuario_id == usuario_id)
+            statements.append(self._orders_stmt(*criteria, tables=(pedido, item), fields=fields))
+        pedidos = [dict(row._mapping, items=[]) for row in page_across(db, statements, skip, limit, scalars=False)]
+        if fields is None or "items" in fields:
+            self._attach_items(db, pedidos)
+            # Orders left without items are archived (or empty): one more IN query on the archive
+            self._attach_items(db, [p for p in pedidos if not p["items"]], ORDER_TABLES[1][1])
+        return serializer_for(PedidoResponse).project(fields).to_list(pedidos)
+
+    def get_order(self, db: Session, pedido_id: int) -> Optional[PedidoResponse]:
+        """One order, looked up in the archive when it is no longer hot"""
+        for pedido, item in ORDER_TABLES:
+            pedidos = self._orders(db, pedido.id == pedido_id, tables=(pedido, item))
+            if pedidos:
+                self._attach_items(db, pedidos, item)
+                return PedidoResponse.model_validate(pedidos[0])
+        return None
+
+    def order_exists(self, db: Session, pedido_id: int) -> bool:
+        return any(
+            db.scalar(select(pedido.id).where(pedido.id == pedido_id)) is not None
+            for pedido, _ in ORDER_TABLES
+        )
+
+    def history(self, db: Session, pedido_id: int, skip: int = 0, limit: int = 50) -> List[Any]:
+        """Estado changes of an order, newest first, continuing into the archive"""
+        return page_across(db, [
+            select(tabla)
+            .where(tabla.pedido_id == pedido_id)
+            .order_by(tabla.fecha.desc(), tabla.id.desc())
+            for tabla in (PedidoHistorialEstado, PedidoHistorialEstadoArchivo)
+        ], skip, limit)
+
+    def update_status(self, db: Session, pedido_id: int, estado: str, usuario_id: Optional[int] = None,
+                      nota: Optional[str] = None) -> Dict[str, Any]:
+        """Apply one estado transition with its audit row. Returns the pedido.estado.cambiar event."""
+        actual = db.execute(
+            select(Pedido.estado, Pedido.total, Pedido.fecha_creacion).where(Pedido.id == pedido_id)
+        ).first()
+        if actual is None:
+            raise PedidoNoEncontradoError(pedido_id)
+        if estado not in ALLOWED_TRANSITIONS.get(actual.estado, set()):
+            raise TransicionNoPermitidaError(pedido_id, actual.estado, estado)
+
+        ahora = datetime.utcnow()
+        try:
+            # Conditional on the estado we validated: a concurrent transition makes this a no-op
+            result = db.execute(
+                update(Pedido)
+                .where(Pedido.id == pedido_id, Pedido.estado == actual.estado)
+                .values(estado=estado, fecha_actualizacion=ahora),
+                execution_options={"synchronize_session": False},
+            )
+            if result.rowcount != 1:
+                db.rollback()
+                raise TransicionNoPermitidaError(pedido_id, actual.estado, estado)
+            db.execute(insert(PedidoHistorialEstado).values(
+                pedido_id=pedido_id, estado_anterior=actual.estado, estado_nuevo=estado,
+                usuario_id=usuario_id, nota=nota, fecha=ahora,
+            ))
+            evento = estado_event(pedido_id, actual.estado, estado, actual.total, actual.fecha_creacion, usuario_id, nota)
+            order_stats_service.apply_events(db, [evento])
+            user_stats_service.apply_events(db, [evento])
+            db.commit()
+        except TransicionNoPermitidaError:
+            raise
+        except Exception:
+            db.rollback()
+            raise
+        return evento
+
+    def update_status_bulk(self, db: Session, pedido_ids: List[int], estado: str, usuario_id: Optional[int] = None,
+                           nota: Optional[str] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Move many orders to `estado` in one transaction: one read, one conditional UPDATE per
+        previous estado and one multi-row history insert. Orders that fail validation (or were
+        changed concurrently) are reported, not raised. Returns (events, per-order results).
+        """
+        ids = list(dict.fromkeys(pedido_ids))
+        actuales = {
+            row.id: row for row in db.execute(
+                select(Pedido.id, Pedido.estado, Pedido.total, Pedido.fecha_creacion).where(Pedido.id.in_(ids))
+            )
+        }
+        resultados: Dict[int, Dict[str, Any]] = {}
+        grupos: Dict[str, List[int]] = {}
+        for pid in ids:
+            actual = actuales.get(pid)
+            if actual is None:
+                resultados[pid] = {"pedido_id": pid, "exito": False, "error": ERROR_NO_ENCONTRADO}
+            elif estado not in ALLOWED_TRANSITIONS.get(actual.estado, set()):
+                resultados[pid] = {"pedido_id": pid, "exito": False, "error": ERROR_TRANSICION,
+                                   "estado_anterior": actual.estado}
+            else:
+                grupos.setdefault(actual.estado, []).append(pid)
+
+        eventos: List[Dict[str, Any]] = []
+        if grupos:
+            ahora = datetime.utcnow()
+            try:
+                historial = []
+                for anterior, grupo in grupos.items():
+                    # Orders moved concurrently no longer match: only the returned ids changed
+                    aplicados = set(db.execute(
+                        update(Pedido)
+                        .where(Pedido.id.in_(grupo), Pedido.estado == anterior)
+                        .values(estado=estado, fecha_actualizacion=ahora)
+                        .returning(Pedido.id),
+                        execution_options={"synchronize_session": False},
+                    ).scalars())
+                    for pid in grupo:
+                        if pid not in aplicados:
+                            resultados[pid] = {"pedido_id": pid, "exito": False, "error": ERROR_CONFLICTO,
+                                               "estado_anterior": anterior}
+                            continue
+                        actual = actuales[pid]
+                        historial.append({"pedido_id": pid, "estado_anterior": anterior, "estado_nuevo": estado,
+                                          "usuario_id": usuario_id, "nota": nota, "fecha": ahora})
+                        eventos.append(estado_event(pid, anterior, estado, actual.total, actual.fecha_creacion,
+                                                    usuario_id, nota))
+                        resultados[pid] = {"pedido_id": pid, "exito": True, "estado_anterior": anterior}
+                if historial:
+                    db.execute(insert(PedidoHistorialEstado), historial)
+                    order_stats_service.apply_events(db, eventos)
+                    user_stats_service.apply_events(db, eventos)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+        return eventos, [resultados[pid] for pid in ids]
+
+
+# Global order service instance
+order_service = OrderService()
@@ -0,0 +1,138 @@
+"""
+Order dashboard counters (PedidosEstadisticas)
+One row per (creation day, estado) with the number of orders and their revenue. Rows are
+adjusted from the same pedido.* events the API publishes, inside the transaction that
+produced them; a periodic reconciliation recomputes recent days from Pedidos (and its archive).
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy import Date, cast, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import PedidoEstadistica
+from app.services.archive_service import union_with_archive
+from app.utils.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+ESTADO_CANCELADO = "Cancelado"
+
+
+def _as_date(value) -> date:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.date() if isinstance(value, datetime) else value
+
+
+def fold_events(eventos: Iterable[Dict[str, Any]]) -> Dict[Tuple[date, str], Dict[str, Any]]:
+    """
+    Turn order events into counter deltas per (dia, estado).
+    Each event has pedidoId, estadoAnterior (None on creation), estadoNuevo, total, fechaPedido.
+    """
+    deltas: Dict[Tuple[date, str], Dict[str, Any]] = {}
+
+    def bump(dia: date, estado: str, cantidad: int, ingresos: Decimal):
+        fila = deltas.setdefault((dia, estado), {"dia": dia, "estado": estado, "cantidad": 0, "ingresos": Decimal(0)})
+        fila["cantidad"] += cantidad
+        fila["ingresos"] += ingresos
+
+    for evento in eventos:
+        dia = _as_date(evento["fechaPedido"])
+        total = Decimal(str(evento["total"]))
+        if evento.get("estadoAnterior"):
+            bump(dia, evento["estadoAnterior"], -1, -total)
+        bump(dia, evento["estadoNuevo"], 1, total)
+    return {k: v for k, v in deltas.items() if v["cantidad"] or v["ingresos"]}
+
+
+class OrderStatsService:
+    """Maintains and serves the order dashboard counters"""
+
+    @staticmethod
+    def apply_events(db: Session, eventos: List[Dict[str, Any]]) -> None:
+        """Adjust the counters for these events (caller commits, in the same transaction)"""
+        deltas = fold_events(eventos)
+        if not deltas:
+            return
+        ahora = datetime.utcnow()
+        rows = [dict(fila, fecha_actualizacion=ahora) for _, fila in sorted(deltas.items())]
+        upsert(db, PedidoEstadistica, ["dia", "estado"], rows,
+               increment=["cantidad", "ingresos"], assign=["fecha_actualizacion"])
+
+    @staticmethod
+    def dashboard(db: Session, desde: date, hasta: date) -> Dict[str, Any]:
+        """Counts per estado (all time) and non-cancelled revenue per day in [desde, hasta]"""
+        por_estado = db.execute(
+            select(PedidoEstadistica.estado,
+                   func.sum(PedidoEstadistica.cantidad).label("cantidad"),
+                   func.sum(PedidoEstadistica.ingresos).label("ingresos"))
+            .group_by(PedidoEstadistica.estado)
+        ).all()
+        por_dia = db.execute(
+            select(PedidoEstadistica.dia,
+                   func.sum(PedidoEstadistica.cantidad).label("cantidad"),
+                   func.sum(PedidoEstadistica.ingresos).label("ingresos"))
+            .where(PedidoEstadistica.dia >= desde, PedidoEstadistica.dia <= hasta,
+                   PedidoEstadistica.estado != ESTADO_CANCELADO)
+            .group_by(PedidoEstadistica.dia)
+            .order_by(PedidoEstadistica.dia)
+        ).all()
+        return {
+            "por_estado": {
+                row.estado: {"cantidad": int(row.cantidad), "ingresos": float(row.ingresos)}
+                for row in por_estado if row.cantidad
+            },
+            "ingresos_por_dia": [
+                {"dia": row.dia.isoformat() if hasattr(row.dia, "isoformat") else str(row.dia),
+                 "pedidos": int(row.cantidad), "ingresos": float(row.ingresos)}
+                for row in por_dia
+            ],
+        }
+
+    @staticmethod
+    def reconcile(db: Session, desde: Optional[date] = None) -> int:
+        """Recompute the counters of days >= desde (all days when None) from Pedidos and its archive"""
+        def pedidos(pedido, _item):
+            stmt = select(pedido.fecha_creacion, pedido.estado, pedido.total)
+            if desde is not None:
+                stmt = stmt.where(pedido.fecha_creacion >= datetime.combine(desde, datetime.min.time()))
+            return stmt
+
+        fuente = union_with_archive(pedidos)
+        if db.bind.dialect.name == "sqlite":
+            dia = func.date(fuente.c.fecha_creacion)
+        else:
+            dia = cast(fuente.c.fecha_creacion, Date)
+        agregados = (
+            select(dia, fuente.c.estado, func.count(), func.coalesce(func.sum(fuente.c.total), 0),
+                   func.current_timestamp())
+            .group_by(dia, fuente.c.estado)
+        )
+        borrar = delete(PedidoEstadistica)
+        if desde is not None:
+            borrar = borrar.where(PedidoEstadistica.dia >= desde)
+        try:
+            db.execute(borrar)
+            result = db.execute(
+                insert(PedidoEstadistica).from_select(
+                    ["dia", "estado", "cantidad", "ingresos", "fecha_actualizacion"], agregados
+                )
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return result.rowcount
+
+    def reconcile_recent(self, db: Session) -> int:
+        """Periodic job: recompute the last ORDER_STATS_RECONCILE_DAYS days"""
+        desde = datetime.utcnow().date() - timedelta(days=settings.ORDER_STATS_RECONCILE_DAYS)
+        return self.reconcile(db, desde)
+
+
+# Global order stats service instance
+order_stats_service = OrderStatsService()
@@ -0,0 +1,280 @@
+"""
+Inventory reservation engine
+Holds stock for carts with one conditional UPDATE per batch:
+
+    UPDATE Productos SET cantidad_disponible = cantidad_disponible - CASE id WHEN ... END
+    WHERE id IN (...) AND cantidad_disponible >= CASE id WHEN ... END
+
+so concurrent buyers can never oversell and no lock is held between a read and a write.
+Reservations are keyed per cart (`clave`) and released when their TTL expires. Carts hold
+their lines through hold(): each cart mutation moves only the differences and restarts the TTL.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models import InventarioHistorial, InventarioReserva, Producto
+from app.services.inventory_stats_service import inventory_stats_service
+
+logger = logging.getLogger(__name__)
+
+ESTADO_ACTIVA = "ACTIVA"
+ESTADO_LIBERADA = "LIBERADA"
+
+MOVIMIENTO_RESERVA = "RESERVA"
+MOVIMIENTO_LIBERACION = "LIBERACION"
+
+# SQL Server rejects statements with more than 2100 parameters. The reserving UPDATE binds
+# 5 per product (id and delta in the SET CASE and again in the WHERE CASE, plus the IN list).
+SQL_SERVER_MAX_PARAMS = 2100
+PARAMS_PER_PRODUCT = 5
+MAX_BATCH_SIZE = (SQL_SERVER_MAX_PARAMS - 100) // PARAMS_PER_PRODUCT
+
+
+class ReservationError(Exception):
+    """Base error for reservation operations"""
+
+
+class StockInsuficienteError(ReservationError):
+    """One or more products lack stock (or are inactive/missing)"""
+
+    def __init__(self, producto_ids: Iterable[int]):
+        self.producto_ids = sorted(producto_ids)
+        super().__init__("Sin existencias")
+
+
+def _chunks(items: List, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _aggregate(items: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """Sum quantities per producto_id so each product appears once per UPDATE"""
+    cantidades: Dict[int, int] = {}
+    for producto_id, cantidad in items:
+        if cantidad <= 0:
+            raise ValueError("La cantidad debe ser un número entero positivo.")
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+    return cantidades
+
+
+class ReservationService:
+    """Batched stock reservations held by carts"""
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = min(batch_size or settings.INVENTORY_RESERVATION_BATCH_SIZE, MAX_BATCH_SIZE)
+
+    @staticmethod
+    def _delta_statement(cantidades: Dict[int, int], reserve: bool):
+        """UPDATE ... RETURNING that applies per-product stock deltas (see the module docstring)"""
+        delta = case(cantidades, value=Producto.id)
+        stmt = update(Producto).where(Producto.id.in_(list(cantidades)))
+        if reserve:
+            stmt = stmt.where(
+                Producto.activo == True,
+                Producto.cantidad_disponible >= delta,
+            ).values(cantidad_disponible=Producto.cantidad_disponible - delta)
+        else:
+            stmt = stmt.values(cantidad_disponible=Producto.cantidad_disponible + delta)
+        return stmt.returning(Producto.id, Producto.cantidad_disponible)
+
+    @classmethod
+    def _apply_delta(cls, db: Session, cantidades: Dict[int, int], reserve: bool) -> Dict[int, int]:
+        """
+        Apply per-product stock deltas in a single UPDATE.
+        When reserving, rows without enough stock are simply not updated.
+        Returns {producto_id: cantidad_disponible after the update} for updated rows.
+        """
+        rows = db.execute(
+            cls._delta_statement(cantidades, reserve),
+            execution_options={"synchronize_session": False},
+        ).all()
+        return {row[0]: row[1] for row in rows}
+
+    def hold(
+        self,
+        db: Session,
+        clave: str,
+        items: Iterable[Tuple[int, int]],
+        usuario_id: Optional[int] = None,
+        ttl_seconds: Optional[int] = None,
+    ) -> Dict[int, int]:
+        """
+        Make `clave` hold exactly `items` (a cart's lines), in one transaction.
+
+        Only the differences with what is held move stock: increases are reserved with the
+        conditional UPDATE (all-or-nothing, StockInsuficienteError), decreases are given
+        back. Lines released by the TTL are reserved again and the TTL restarts; empty
+        `items` releases everything. Returns {producto_id: cantidad reservada}.
+        """
+        cantidades = _aggregate(items)
+        ttl = ttl_seconds or settings.INVENTORY_RESERVATION_TTL_SECONDS
+        expira_en = datetime.utcnow() + timedelta(seconds=ttl)
+        referencia = f"reserva:{clave}"
+
+        try:
+            # Restarting the TTL first keeps the expiry sweep off the rows counted as held
+            held = {
+                row.producto_id: row.cantidad
+                for row in db.execute(
+                    update(InventarioReserva)
+                    .where(InventarioReserva.clave == clave, InventarioReserva.estado == ESTADO_ACTIVA)
+                    .values(expira_en=expira_en)
+                    .returning(InventarioReserva.producto_id, InventarioReserva.cantidad),
+                    execution_options={"synchronize_session": False},
+                ).all()
+            }
+            aumentos = {pid: c - held.get(pid, 0) for pid, c in cantidades.items() if c > held.get(pid, 0)}
+            reducciones = {pid: h - cantidades.get(pid, 0) for pid, h in held.items() if h > cantidades.get(pid, 0)}
+            if not aumentos and not reducciones:
+                db.commit()
+                return cantidades
+
+            movimientos = []
+            for batch in _chunks(sorted(aumentos.items()), self.batch_size):
+                lote = dict(batch)
+                nuevos = self._apply_delta(db, lote, reserve=True)
+                faltantes = set(lote) - set(nuevos)
+                if faltantes:
+                    raise StockInsuficienteError(faltantes)
+                movimientos.extend(
+                    {"producto_id": pid, "cantidad_anterior": nuevos[pid] + cantidad, "cantidad_nueva": nuevos[pid],
+                     "tipo_movimiento": MOVIMIENTO_RESERVA, "referencia": referencia, "usuario_id": usuario_id}
+                    for pid, cantidad in batch
+                )
+            for batch in _chunks(sorted(reducciones.items()), self.batch_size):
+                nuevos = self._apply_delta(db, dict(batch), reserve=False)
+                movimientos.extend(
+                    {"producto_id": pid, "cantidad_anterior": nuevos[pid] - cantidad, "cantidad_nueva": nuevos[pid],
+                     "tipo_movimiento": MOVIMIENTO_LIBERACION, "referencia": referencia, "usuario_id": usuario_id}
+                    for pid, cantidad in batch if pid in nuevos
+                )
+
+            # Reservation rows: one per (clave, producto_id), reused across TTL expiries
+            existentes = set(db.scalars(
+                select(InventarioReserva.producto_id).where(InventarioReserva.clave == clave)
+            ).all())
+            cambiados = [pid for pid in cantidades if pid in existentes and cantidades[pid] != held.get(pid)]
+            for batch in _chunks(cambiados, self.batch_size):
+                db.execute(
+                    update(InventarioReserva)
+                    .where(InventarioReserva.clave == clave, InventarioReserva.producto_id.in_(batch))
+                    .values(cantidad=case({pid: cantidades[pid] for pid in batch}, value=InventarioReserva.producto_id),
+                            estado=ESTADO_ACTIVA, usuario_id=usuario_id, expira_en=expira_en),
+                    execution_options={"synchronize_session": False},
+                )
+            nuevas = [pid for pid in cantidades if pid not in existentes]
+            if nuevas:
+                db.execute(insert(InventarioReserva), [
+                    {"clave": clave, "producto_id": pid, "cantidad": cantidades[pid], "estado": ESTADO_ACTIVA,
+                     "usuario_id": usuario_id, "expira_en": expira_en}
+                    for pid in nuevas
+                ])
+            quitados = [pid for pid in held if pid not in cantidades]
+            if quitados:
+                db.execute(
+                    update(InventarioReserva)
+                    .where(InventarioReserva.clave == clave, InventarioReserva.producto_id.in_(quitados))
+                    .values(estado=ESTADO_LIBERADA),
+                    execution_options={"synchronize_session": False},
+                )
+            if movimientos:
+                db.execute(insert(InventarioHistorial), movimientos)
+                inventory_stats_service.apply_movements(db, movimientos)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        logger.debug(f"{referencia} holds {len(cantidades)} products (+{len(aumentos)} / -{len(reducciones)})")
+        return cantidades
+
+    def _restore(self, db: Session, claimed) -> None:
+        """Give stock back for claimed reservation rows and log one movement per row"""
+        por_producto: Dict[int, list] = {}
+        for row in claimed:
+            por_producto.setdefault(row.producto_id, []).append(row)
+
+        movimientos = []
+        productos = sorted(por_producto.items())
+        for batch in _chunks(productos, self.batch_size):
+            totales = {pid: sum(r.cantidad for r in rows) for pid, rows in batch}
+            nuevos = self._apply_delta(db, totales, reserve=False)
+            for producto_id, rows in batch:
+                if producto_id not in nuevos:
+                    continue
+                actual = nuevos[producto_id] - totales[producto_id]
+                for row in rows:
+                    movimientos.append({
+                        "producto_id": producto_id,
+                        "cantidad_anterior": actual,
+                        "cantidad_nueva": actual + row.cantidad,
+                        "tipo_movimiento": MOVIMIENTO_LIBERACION,
+                        "referencia": f"reserva:{row.clave}",
+                        "usuario_id": row.usuario_id,
+                    })
+                    actual += row.cantidad
+        if movimientos:
+            db.execute(insert(InventarioHistorial), movimientos)
+            inventory_stats_service.apply_movements(db, movimientos)
+
+    @staticmethod
+    def _claim(db: Session, *criteria):
+        """Flip ACTIVA -> LIBERADA and return the rows this call won (safe across replicas)"""
+        return db.execute(
+            update(InventarioReserva)
+            .where(InventarioReserva.estado == ESTADO_ACTIVA, *criteria)
+            .values(estado=ESTADO_LIBERADA)
+            .returning(
+                InventarioReserva.clave,
+                InventarioReserva.producto_id,
+                InventarioReserva.cantidad,
+                InventarioReserva.usuario_id,
+            ),
+            execution_options={"synchronize_session": False},
+        ).all()
+
+    def release(self, db: Session, clave: str) -> int:
+        """Release an active reservation early (cart emptied)"""
+        try:
+            claimed = self._claim(db, InventarioReserva.clave == clave)
+            self._restore(db, claimed)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        return len(claimed)
+
+    def release_expired(self, db: Session, now: Optional[datetime] = None) -> int:
+        """Release every reservation past its TTL, one batch per transaction"""
+        now = now or datetime.utcnow()
+        total = 0
+        while True:
+            ids = db.scalars(
+                select(InventarioReserva.id)
+                .where(InventarioReserva.estado == ESTADO_ACTIVA, InventarioReserva.expira_en < now)
+                .order_by(InventarioReserva.expira_en)
+                .limit(self.batch_size)
+            ).all()
+            if not ids:
+                break
+            try:
+                # Re-checked: hold() may have restarted the TTL since the SELECT
+                claimed = self._claim(db, InventarioReserva.id.in_(ids), InventarioReserva.expira_en < now)
+                self._restore(db, claimed)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            total += len(claimed)
+        if total:
+            logger.info(f"Released {total} expired inventory reservations")
+        return total
+
+
+# Global reservation service instance
+reservation_service = ReservationService()
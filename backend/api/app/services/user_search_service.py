@@ -0,0 +1,212 @@
+"""
+Admin customer search
+nombre/email are matched on accent-folded, lowercased copies (UsuariosBusqueda). Substring
+terms of 3+ characters are narrowed through a trigram index (UsuariosTrigramas) before the
+LIKE runs, so no query scans Usuarios; shorter terms use an indexed prefix match. Results are
+ranked (cedula, exact email, name prefix, email prefix, substring) and keyset-paginated.
+"""
+from datetime import datetime
+from typing import Any, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+import base64
+import json
+import logging
+import unicodedata
+
+from sqlalchemy import and_, case, delete, func, insert, literal, or_, select
+from sqlalchemy.orm import Session, load_only
+
+from app.config import settings
+from app.models import Usuario, UsuarioBusqueda, UsuarioTrigrama
+
+logger = logging.getLogger(__name__)
+
+CAMPO_NOMBRE = "n"
+CAMPO_EMAIL = "e"
+
+
+# Columns of an admin listing row (UsuarioDetailResponse); fecha_registro also keys the cursor
+LISTING_COLUMNS = ("nombre_completo", "email", "cedula", "fecha_registro", "ultimo_login")
+
+
+def _listing_columns(fields: Optional[FrozenSet[str]]):
+    """load_only option for the requested fields (every listing column when None)"""
+    names = [name for name in LISTING_COLUMNS if fields is None or name in fields or name == "fecha_registro"]
+    return load_only(*(getattr(Usuario, name) for name in names))
+
+
+class CursorInvalidoError(ValueError):
+    """The pagination cursor could not be decoded"""
+
+
+def normalize(value: Optional[str]) -> str:
+    """Accent-folded, lowercased, whitespace-collapsed form used for indexing and querying"""
+    if not value:
+        return ""
+    folded = unicodedata.normalize("NFKD", value)
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return " ".join(folded.casefold().split())
+
+
+def trigrams(value: str) -> List[str]:
+    """Distinct 3-character windows of an already normalized string"""
+    return sorted({value[i:i + 3] for i in range(len(value) - 2)})
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise CursorInvalidoError(str(e))
+    if not isinstance(values, list) or len(values) != 2:
+        raise CursorInvalidoError("cursor must hold two values")
+    return values
+
+
+class UserSearchService:
+    """Maintains the user search index and answers admin listing queries"""
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or settings.USER_SEARCH_BATCH_SIZE
+
+    @staticmethod
+    def index_users(db: Session, usuarios: Iterable[Any]) -> int:
+        """
+        (Re)index users (objects or rows with id, nombre_completo, email).
+        Does not commit; call it in the transaction that creates or edits the user.
+        """
+        usuarios = list(usuarios)
+        if not usuarios:
+            return 0
+        ids = [u.id for u in usuarios]
+        ahora = datetime.utcnow()
+        filas, gramas = [], []
+        for u in usuarios:
+            nombre, email = normalize(u.nombre_completo), normalize(u.email)
+            filas.append({"usuario_id": u.id, "nombre_normalizado": nombre,
+                          "email_normalizado": email, "fecha_indexado": ahora})
+            gramas += [{"campo": CAMPO_NOMBRE, "trigrama": g, "usuario_id": u.id} for g in trigrams(nombre)]
+            gramas += [{"campo": CAMPO_EMAIL, "trigrama": g, "usuario_id": u.id} for g in trigrams(email)]
+        db.execute(delete(UsuarioTrigrama).where(UsuarioTrigrama.usuario_id.in_(ids)))
+        db.execute(delete(UsuarioBusqueda).where(UsuarioBusqueda.usuario_id.in_(ids)))
+        db.execute(insert(UsuarioBusqueda), filas)
+        if gramas:
+            db.execute(insert(UsuarioTrigrama), gramas)
+        return len(filas)
+
+    def refresh(self, db: Session) -> int:
+        """Periodic job: index users that are missing or changed since they were indexed"""
+        total = 0
+        while True:
+            pendientes = db.execute(
+                select(Usuario.id, Usuario.nombre_completo, Usuario.email)
+                .outerjoin(UsuarioBusqueda, UsuarioBusqueda.usuario_id == Usuario.id)
+                .where(or_(UsuarioBusqueda.usuario_id.is_(None),
+                           Usuario.updated_at > UsuarioBusqueda.fecha_indexado))
+                .order_by(Usuario.id)
+                .limit(self.batch_size)
+            ).all()
+            if not pendientes:
+                break
+            try:
+                total += self.index_users(db, pendientes)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            if len(pendientes) < self.batch_size:
+                break
+        if total:
+            logger.info(f"Indexed {total} users for search")
+        return total
+
+    @staticmethod
+    def _candidates(campo: str, termino: str):
+        """Ids whose field contains every trigram of the term (a superset of the substring matches)"""
+        gramas = trigrams(termino)
+        return (
+            select(UsuarioTrigrama.usuario_id)
+            .where(UsuarioTrigrama.campo == campo, UsuarioTrigrama.trigrama.in_(gramas))
+            .group_by(UsuarioTrigrama.usuario_id)
+            .having(func.count() == len(gramas))
+        )
+
+    def _match(self, campo: str, termino: str):
+        columna = UsuarioBusqueda.nombre_normalizado if campo == CAMPO_NOMBRE else UsuarioBusqueda.email_normalizado
+        if len(termino) < 3:
+            return columna.startswith(termino, autoescape=True)
+        return and_(UsuarioBusqueda.usuario_id.in_(self._candidates(campo, termino)),
+                    columna.contains(termino, autoescape=True))
+
+    def search(self, db: Session, q: Optional[str] = None, nombre: Optional[str] = None,
+               email: Optional[str] = None, cedula: Optional[str] = None, cursor: Optional[str] = None,
+               limit: int = 20, fields: Optional[FrozenSet[str]] = None) -> Tuple[List[Usuario], Optional[str]]:
+        """
+        One page of users and the cursor of the next page (None on the last page).
+        Without search terms users are listed by fecha_registro DESC. Only the listing
+        columns (or the requested `fields`) are loaded; never password_hash.
+        """
+        q, nombre, email = normalize(q), normalize(nombre), normalize(email)
+        cedula = (cedula or "").strip()
+        posicion = decode_cursor(cursor) if cursor else None
+
+        if not (q or nombre or email or cedula):
+            stmt = select(Usuario).options(_listing_columns(fields))
+            if posicion is not None:
+                try:
+                    fecha, ultimo_id = datetime.fromisoformat(posicion[0]), int(posicion[1])
+                except (TypeError, ValueError) as e:
+                    raise CursorInvalidoError(str(e))
+                stmt = stmt.where(or_(Usuario.fecha_registro < fecha,
+                                      and_(Usuario.fecha_registro == fecha, Usuario.id < ultimo_id)))
+            rows = db.execute(
+                stmt.order_by(Usuario.fecha_registro.desc(), Usuario.id.desc()).limit(limit + 1)
+            ).scalars().all()
+            siguiente = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                siguiente = encode_cursor([rows[-1].fecha_registro.isoformat(), rows[-1].id])
+            return rows, siguiente
+
+        criterios, rangos = [], []
+        if cedula:
+            criterios.append(Usuario.cedula == cedula)
+        if nombre:
+            criterios.append(self._match(CAMPO_NOMBRE, nombre))
+            rangos.append((UsuarioBusqueda.nombre_normalizado.startswith(nombre, autoescape=True), 2))
+        if email:
+            criterios.append(self._match(CAMPO_EMAIL, email))
+            rangos += [(UsuarioBusqueda.email_normalizado == email, 3),
+                       (UsuarioBusqueda.email_normalizado.startswith(email, autoescape=True), 1)]
+        if q:
+            criterios.append(or_(Usuario.cedula == q, self._match(CAMPO_NOMBRE, q), self._match(CAMPO_EMAIL, q)))
+            rangos = [(Usuario.cedula == q, 4), (UsuarioBusqueda.email_normalizado == q, 3),
+                      (UsuarioBusqueda.nombre_normalizado.startswith(q, autoescape=True), 2),
+                      (UsuarioBusqueda.email_normalizado.startswith(q, autoescape=True), 1)] + rangos
+        rango = case(*rangos, else_=0) if rangos else literal(0)
+
+        stmt = (
+            select(Usuario, rango.label("rango"))
+            .join(UsuarioBusqueda, UsuarioBusqueda.usuario_id == Usuario.id)
+            .where(*criterios)
+            .options(_listing_columns(fields))
+        )
+        if posicion is not None:
+            try:
+                ultimo_rango, ultimo_id = int(posicion[0]), int(posicion[1])
+            except (TypeError, ValueError) as e:
+                raise CursorInvalidoError(str(e))
+            stmt = stmt.where(or_(rango < ultimo_rango, and_(rango == ultimo_rango, Usuario.id < ultimo_id)))
+        rows = db.execute(stmt.order_by(rango.desc(), Usuario.id.desc()).limit(limit + 1)).all()
+        siguiente = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            siguiente = encode_cursor([rows[-1].rango, rows[-1].Usuario.id])
+        return [row.Usuario for row in rows], siguiente
+
+
+# Global user search service instance
+user_search_service = UserSearchService()
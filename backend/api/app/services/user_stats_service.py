@@ -0,0 +1,186 @@
+"""
+Customer statistics projection (UsuariosEstadisticas)
+Total orders, total spent, last order date and preferred category per customer, adjusted
+from the pedido.* events inside the transaction that produced them, so admin profiles and
+the user listing read one row per customer instead of joining Pedidos/PedidoItems/Productos.
+Cancelled orders still count as placed but not as spent (nor towards the preferred category).
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+
+from sqlalchemy import case, delete, func, insert, null, select, update
+from sqlalchemy.orm import Session
+
+from app.models import (
+    Categoria,
+    Pedido,
+    PedidoItem,
+    Producto,
+    Usuario,
+    UsuarioCategoriaEstadistica,
+    UsuarioEstadistica,
+)
+from app.services.archive_service import union_with_archive
+from app.utils.upsert import upsert
+
+logger = logging.getLogger(__name__)
+
+ESTADO_CANCELADO = "Cancelado"
+
+
+def _event_signs(eventos: Iterable[Dict[str, Any]]) -> Dict[int, Tuple[int, Dict[str, Any]]]:
+    """pedido_id -> (+1 on creation, -1 on cancellation, event); other transitions don't matter"""
+    signos = {}
+    for evento in eventos:
+        if not evento.get("estadoAnterior"):
+            signos[evento["pedidoId"]] = (1, evento)
+        elif evento["estadoNuevo"] == ESTADO_CANCELADO:
+            signos[evento["pedidoId"]] = (-1, evento)
+    return signos
+
+
+class UserStatsService:
+    """Maintains and serves the per-customer statistics"""
+
+    @staticmethod
+    def _refresh_preferred(db: Session, usuario_ids: Optional[List[int]] = None) -> None:
+        """Recompute categoria_preferida_id from the (small) per-category counters"""
+        preferida = (
+            select(UsuarioCategoriaEstadistica.categoria_id)
+            .where(UsuarioCategoriaEstadistica.usuario_id == UsuarioEstadistica.usuario_id,
+                   UsuarioCategoriaEstadistica.unidades > 0)
+            .order_by(UsuarioCategoriaEstadistica.unidades.desc(), UsuarioCategoriaEstadistica.categoria_id)
+            .limit(1)
+            .correlate(UsuarioEstadistica)
+            .scalar_subquery()
+        )
+        stmt = update(UsuarioEstadistica).values(categoria_preferida_id=preferida)
+        if usuario_ids is not None:
+            stmt = stmt.where(UsuarioEstadistica.usuario_id.in_(usuario_ids))
+        db.execute(stmt, execution_options={"synchronize_session": False})
+
+    def apply_events(self, db: Session, eventos: List[Dict[str, Any]]) -> None:
+        """Adjust the projection for these events (caller commits, in the same transaction)"""
+        signos = _event_signs(eventos)
+        if not signos:
+            return
+
+        # Owner and units per category of every affected order, in one query
+        rows = db.execute(
+            select(Pedido.id, Pedido.usuario_id, Producto.categoria_id,
+                   func.sum(PedidoItem.cantidad).label("unidades"))
+            .outerjoin(PedidoItem, PedidoItem.pedido_id == Pedido.id)
+            .outerjoin(Producto, Producto.id == PedidoItem.producto_id)
+            .where(Pedido.id.in_(list(signos)))
+            .group_by(Pedido.id, Pedido.usuario_id, Producto.categoria_id)
+        ).all()
+
+        ahora = datetime.utcnow()
+        usuarios: Dict[int, Dict[str, Any]] = {}
+        categorias: Dict[Tuple[int, int], int] = {}
+        vistos = set()
+        for row in rows:
+            signo, evento = signos[row.id]
+            if row.id not in vistos:
+                vistos.add(row.id)
+                fila = usuarios.setdefault(row.usuario_id, {
+                    "usuario_id": row.usuario_id, "total_pedidos": 0, "total_gastado": Decimal(0),
+                    "ultimo_pedido": None, "fecha_actualizacion": ahora,
+                })
+                fila["total_gastado"] += signo * Decimal(str(evento["total"]))
+                if signo > 0:
+                    fila["total_pedidos"] += 1
+                    fecha = datetime.fromisoformat(evento["fechaPedido"])
+                    if fila["ultimo_pedido"] is None or fecha > fila["ultimo_pedido"]:
+                        fila["ultimo_pedido"] = fecha
+            if row.categoria_id is not None:
+                clave = (row.usuario_id, row.categoria_id)
+                categorias[clave] = categorias.get(clave, 0) + signo * int(row.unidades)
+
+        upsert(db, UsuarioEstadistica, ["usuario_id"], [usuarios[uid] for uid in sorted(usuarios)],
+               increment=["total_pedidos", "total_gastado"], greatest=["ultimo_pedido"],
+               assign=["fecha_actualizacion"])
+        upsert(db, UsuarioCategoriaEstadistica, ["usuario_id", "categoria_id"],
+               [{"usuario_id": uid, "categoria_id": cid, "unidades": unidades}
+                for (uid, cid), unidades in sorted(categorias.items())],
+               increment=["unidades"])
+        self._refresh_preferred(db, sorted(usuarios))
+
+    def stats_for(self, db: Session, usuario_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Statistics for many customers in one query (users without orders get zeros).
+        Ids that are not users are absent from the result.
+        """
+        if not usuario_ids:
+            return {}
+        rows = db.execute(
+            select(Usuario.id, UsuarioEstadistica.total_pedidos, UsuarioEstadistica.total_gastado,
+                   UsuarioEstadistica.ultimo_pedido, UsuarioEstadistica.categoria_preferida_id,
+                   Categoria.nombre.label("categoria_preferida"))
+            .outerjoin(UsuarioEstadistica, UsuarioEstadistica.usuario_id == Usuario.id)
+            .outerjoin(Categoria, Categoria.id == UsuarioEstadistica.categoria_preferida_id)
+            .where(Usuario.id.in_(usuario_ids))
+        ).all()
+        return {
+            row.id: {
+                "usuario_id": row.id,
+                "total_pedidos": row.total_pedidos or 0,
+                "total_gastado": row.total_gastado or Decimal(0),
+                "ultimo_pedido": row.ultimo_pedido,
+                "categoria_preferida_id": row.categoria_preferida_id,
+                "categoria_preferida": row.categoria_preferida,
+            }
+            for row in rows
+        }
+
+    def rebuild(self, db: Session, usuario_ids: Optional[List[int]] = None) -> None:
+        """Recompute the projection from Pedidos and its archive (all customers when usuario_ids is None)"""
+        def de_usuarios(stmt, pedido):
+            return stmt if usuario_ids is None else stmt.where(pedido.usuario_id.in_(usuario_ids))
+
+        pedidos = union_with_archive(lambda pedido, _item: de_usuarios(
+            select(pedido.usuario_id, pedido.estado, pedido.total, pedido.fecha_creacion), pedido
+        ))
+        gastado = case((pedidos.c.estado != ESTADO_CANCELADO, pedidos.c.total), else_=0)
+        totales = (
+            select(pedidos.c.usuario_id, func.count(), func.coalesce(func.sum(gastado), 0),
+                   func.max(pedidos.c.fecha_creacion), null(), func.current_timestamp())
+            .group_by(pedidos.c.usuario_id)
+        )
+        lineas = union_with_archive(lambda pedido, item: de_usuarios(
+            select(pedido.usuario_id, Producto.categoria_id, item.cantidad)
+            .join(item, item.pedido_id == pedido.id)
+            .join(Producto, Producto.id == item.producto_id)
+            .where(pedido.estado != ESTADO_CANCELADO), pedido
+        ))
+        unidades = (
+            select(lineas.c.usuario_id, lineas.c.categoria_id, func.sum(lineas.c.cantidad))
+            .group_by(lineas.c.usuario_id, lineas.c.categoria_id)
+        )
+        borrar_totales = delete(UsuarioEstadistica)
+        borrar_unidades = delete(UsuarioCategoriaEstadistica)
+        if usuario_ids is not None:
+            borrar_totales = borrar_totales.where(UsuarioEstadistica.usuario_id.in_(usuario_ids))
+            borrar_unidades = borrar_unidades.where(UsuarioCategoriaEstadistica.usuario_id.in_(usuario_ids))
+        try:
+            db.execute(borrar_unidades)
+            db.execute(borrar_totales)
+            db.execute(insert(UsuarioEstadistica).from_select(
+                ["usuario_id", "total_pedidos", "total_gastado", "ultimo_pedido",
+                 "categoria_preferida_id", "fecha_actualizacion"], totales,
+            ))
+            db.execute(insert(UsuarioCategoriaEstadistica).from_select(
+                ["usuario_id", "categoria_id", "unidades"], unidades,
+            ))
+            self._refresh_preferred(db, usuario_ids)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        logger.info("Rebuilt customer statistics" + (f" for {len(usuario_ids)} users" if usuario_ids else ""))
+
+
+# Global user stats service instance
+user_stats_service = UserStatsService()
@@ -0,0 +1,249 @@
+"""
+Email verification codes
+Active codes are served from a bounded TTL store (MemoryVerificationStore) so a verify
+attempt is a dict lookup; VerificationCodes only receives what durability needs: one
+INSERT per issued code and one UPDATE when it is used. A store miss (restart, another
+replica) falls back to the table. Wrong attempts are counted per email by the rate
+limiter, which is shared across replicas with RATE_LIMIT_BACKEND=sql. Expired rows are
+deleted in batches of users, each DELETE a seek on idx_verif_usuario.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional, Tuple
+import hashlib
+import hmac
+import logging
+import secrets
+import threading
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.middleware.rate_limiting import rate_limiter
+from app.models import Usuario, VerificationCode
+
+logger = logging.getLogger(__name__)
+
+
+class VerificationError(Exception):
+    """Base class for verification failures (message is user-facing)"""
+
+    def __init__(self, message: str):
+        self.message = message
+        super().__init__(message)
+
+
+class CodigoInvalidoError(VerificationError):
+    def __init__(self):
+        super().__init__("Código de verificación incorrecto.")
+
+
+class CodigoExpiradoError(VerificationError):
+    def __init__(self):
+        super().__init__("El código de verificación expiró o no existe. Solicita uno nuevo.")
+
+
+class DemasiadosIntentosError(VerificationError):
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__("Demasiados intentos fallidos. Intenta más tarde.")
+
+
+class CodeEntry(NamedTuple):
+    usuario_id: int
+    code_hash: str
+    expira_en: datetime
+
+
+def generate_code() -> str:
+    """Uniform 6-digit code"""
+    return f"{secrets.randbelow(1000000):06d}"
+
+
+def hash_code(code: str) -> str:
+    """Keyed hash: cheap to check, useless without SECRET_KEY (bcrypt would be wasted on 10^6 codes)"""
+    return hmac.new(settings.SECRET_KEY.encode(), code.encode(), hashlib.sha256).hexdigest()
+
+
+def _key(email: str) -> str:
+    return email.strip().lower()
+
+
+def _mark_used(db: Session, usuario_id: int) -> None:
+    """Retire the user's pending codes (seek on idx_verif_usuario)"""
+    db.execute(
+        update(VerificationCode)
+        .where(VerificationCode.usuario_id == usuario_id, VerificationCode.usado == False)  # noqa: E712
+        .values(usado=True)
+    )
+
+
+class MemoryVerificationStore:
+    """Active codes by email, bounded: expired entries go first, then the oldest"""
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or settings.VERIFICATION_STORE_MAX_ENTRIES
+        self._entries: "OrderedDict[str, CodeEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email: str, now: datetime) -> Optional[CodeEntry]:
+        with self._lock:
+            entry = self._entries.get(_key(email))
+            if entry is not None and entry.expira_en <= now:
+                del self._entries[_key(email)]
+                return None
+            return entry
+
+    def put(self, email: str, entry: CodeEntry) -> None:
+        with self._lock:
+            self._entries.pop(_key(email), None)
+            if len(self._entries) >= self.max_entries:
+                self._prune(datetime.utcnow())
+            while len(self._entries) >= self.max_entries:
+                self._entries.popitem(last=False)
+            self._entries[_key(email)] = entry
+
+    def pop(self, email: str) -> None:
+        with self._lock:
+            self._entries.pop(_key(email), None)
+
+    def _prune(self, now: datetime) -> int:
+        expired = [k for k, e in self._entries.items() if e.expira_en <= now]
+        for key in expired:
+            del self._entries[key]
+        return len(expired)
+
+    def prune(self, now: datetime) -> int:
+        with self._lock:
+            return self._prune(now)
+
+
+class SQLVerificationStore:
+    """No hot copy: every lookup reads VerificationCodes (replicas without sticky sessions)"""
+
+    def get(self, email: str, now: datetime) -> Optional[CodeEntry]:
+        return None
+
+    def put(self, email: str, entry: CodeEntry) -> None:
+        pass
+
+    def pop(self, email: str) -> None:
+        pass
+
+    def prune(self, now: datetime) -> int:
+        return 0
+
+
+def _create_store():
+    if settings.VERIFICATION_STORE_BACKEND == "sql":
+        return SQLVerificationStore()
+    return MemoryVerificationStore()
+
+
+class VerificationService:
+    """Issues and checks email verification codes"""
+
+    def __init__(self, store=None, limiter=None, ttl_seconds: Optional[int] = None,
+                 max_attempts: Optional[int] = None, batch_size: Optional[int] = None):
+        self.store = store if store is not None else _create_store()
+        self.limiter = limiter
+        self.ttl_seconds = ttl_seconds or settings.VERIFICATION_CODE_TTL_SECONDS
+        self.max_attempts = max_attempts or settings.VERIFICATION_MAX_ATTEMPTS
+        self.batch_size = batch_size or settings.VERIFICATION_PURGE_BATCH_SIZE
+
+    @property
+    def _limiter(self):
+        return self.limiter or rate_limiter
+
+    def issue(self, db: Session, usuario_id: int, email: str,
+              now: Optional[datetime] = None) -> Tuple[str, datetime]:
+        """
+        New code for the user, replacing any previous one. Does not commit; call it in the
+        transaction that creates the user (and forget() the email if that rolls back).
+        """
+        now = now or datetime.utcnow()
+        code = generate_code()
+        entry = CodeEntry(usuario_id, hash_code(code), now + timedelta(seconds=self.ttl_seconds))
+        _mark_used(db, usuario_id)
+        db.add(VerificationCode(usuario_id=usuario_id, code_hash=entry.code_hash, expira_en=entry.expira_en))
+        self.store.put(email, entry)
+        return code, entry.expira_en
+
+    def forget(self, email: str) -> None:
+        self.store.pop(email)
+
+    def check(self, email: str, code: str, entry: Optional[CodeEntry], now: datetime) -> int:
+        """Attempt limit and comparison against an entry (no I/O beyond the limiter)"""
+        attempts_key = f"verify:{_key(email)}"
+        limit = self._limiter.peek(attempts_key, self.max_attempts, self.ttl_seconds)
+        if not limit.allowed:
+            raise DemasiadosIntentosError(limit.retry_after)
+        if entry is None or entry.expira_en <= now:
+            raise CodigoExpiradoError()
+        if not hmac.compare_digest(entry.code_hash, hash_code(code)):
+            self._limiter.record(attempts_key, self.ttl_seconds)
+            raise CodigoInvalidoError()
+        self._limiter.reset(attempts_key)
+        return entry.usuario_id
+
+    def _load(self, db: Session, email: str, now: datetime) -> Optional[CodeEntry]:
+        row = db.execute(
+            select(VerificationCode.usuario_id, VerificationCode.code_hash, VerificationCode.expira_en)
+            .join(Usuario, Usuario.id == VerificationCode.usuario_id)
+            .where(Usuario.email == email, VerificationCode.usado == False,  # noqa: E712
+                   VerificationCode.expira_en > now)
+            .order_by(VerificationCode.id.desc())
+            .limit(1)
+        ).first()
+        return CodeEntry(*row) if row else None
+
+    def verify(self, db: Session, email: str, code: str, now: Optional[datetime] = None) -> int:
+        """
+        Check the code and mark it used; returns the user id. Does not commit.
+        Raises CodigoInvalidoError, CodigoExpiradoError or DemasiadosIntentosError.
+        """
+        now = now or datetime.utcnow()
+        entry = self.store.get(email, now)
+        if entry is None:
+            entry = self._load(db, email, now)
+            if entry is not None:
+                self.store.put(email, entry)
+        usuario_id = self.check(email, code, entry, now)
+        _mark_used(db, usuario_id)
+        self.store.pop(email)
+        return usuario_id
+
+    def purge_expired(self, db: Session, now: Optional[datetime] = None) -> int:
+        """Periodic job: delete expired codes, batch_size users per DELETE. Returns rows deleted."""
+        now = now or datetime.utcnow()
+        self.store.prune(now)
+        total = 0
+        while True:
+            usuario_ids = db.scalars(
+                select(VerificationCode.usuario_id)
+                .where(VerificationCode.expira_en < now)
+                .distinct()
+                .limit(self.batch_size)
+            ).all()
+            if not usuario_ids:
+                break
+            try:
+                total += db.execute(
+                    delete(VerificationCode)
+                    .where(VerificationCode.usuario_id.in_(usuario_ids), VerificationCode.expira_en < now),
+                    execution_options={"synchronize_session": False},
+                ).rowcount
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            if len(usuario_ids) < self.batch_size:
+                break
+        if total:
+            logger.info(f"Purged {total} expired verification codes")
+        return total
+
+
+# Global verification service instance
+verification_service = VerificationService()
@@ -5,6 +5,10 @@ from app.utils.security import security_utils, SecurityUtils
 from app.utils.validators import validator_utils, ValidatorUtils
 from app.utils.logger import setup_logging, get_logger
 from app.utils.rabbitmq import rabbitmq_producer, RabbitMQProducer
+from app.utils.confirm_publisher import confirm_publisher, ConfirmPublisher
+from app.utils.serialization import ORJSONResponse, ModelSerializer, serializer_for, orm_response
+from app.utils.single_flight import SingleFlight
+from app.utils.response_cache import ResponseCache, CachedResponse
 
 __all__ = [
     'security_utils',
@@ -15,4 +19,13 @@ __all__ = [
     'get_logger',
     'rabbitmq_producer',
     'RabbitMQProducer',
+    'confirm_publisher',
+    'ConfirmPublisher',
+    'ORJSONResponse',
+    'ModelSerializer',
+    'serializer_for',
+    'orm_response',
+    'SingleFlight',
+    'ResponseCache',
+    'CachedResponse',
 ]
@@ -0,0 +1,60 @@
+"""
+Periodic background jobs run inside the API process (expiry sweeps, flushes, reconciliation)
+"""
+import asyncio
+import logging
+from typing import Callable, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from app import database
+
+logger = logging.getLogger(__name__)
+
+
+def with_session(job: Callable[[Session], object]) -> Callable[[], object]:
+    """Wrap a job taking a DB session so it opens and closes its own session"""
+    def runner():
+        db = database.SessionLocal()
+        try:
+            return job(db)
+        finally:
+            db.close()
+    runner.__name__ = getattr(job, "__name__", "job")
+    return runner
+
+
+class PeriodicTask:
+    """Runs a blocking callable every `interval_seconds` in the threadpool"""
+
+    def __init__(self, name: str, interval_seconds: float, job: Callable[[], object]):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.job = job
+        self._task: Optional[asyncio.Task] = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                await run_in_threadpool(self.job)
+            except Exception as e:
+                logger.warning(f"Background job {self.name} failed: {str(e)}")
+
+    def start(self):
+        """Schedule the job on the running event loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+            logger.info(f"Background job started: {self.name}")
+
+    async def stop(self):
+        """Cancel the job and wait for it to finish"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info(f"Background job stopped: {self.name}")
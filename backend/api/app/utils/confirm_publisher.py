@@ -0,0 +1,236 @@
+"""
+Publisher-confirm publishing to RabbitMQ
+ConfirmPublisher keeps one long-lived connection in confirm mode on its own I/O thread
+(pika SelectConnection). publish() returns a Future immediately: the message is sent
+without waiting, its delivery tag is tracked, and the broker's (possibly multiple) acks
+resolve the futures as they arrive, so many publishes are in flight at once. Nacked
+messages are republished up to RABBITMQ_CONFIRM_MAX_RETRIES times; messages that were
+unconfirmed when the connection dropped are republished after reconnecting. At most
+RABBITMQ_CONFIRM_MAX_IN_FLIGHT messages are unconfirmed: publish() then blocks (up to
+RABBITMQ_CONFIRM_BLOCK_SECONDS) until acks free a slot.
+"""
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, Optional, Set
+import logging
+import threading
+import time
+
+import pika
+
+from app.config import settings
+from app.events import encode
+
+logger = logging.getLogger(__name__)
+
+
+class PublishError(Exception):
+    """Base class for confirm-mode publish failures"""
+
+
+class PublishNackedError(PublishError):
+    """The broker nacked the message more times than allowed"""
+
+
+class PublishBackpressureError(PublishError):
+    """Too many unconfirmed messages; nothing was sent"""
+
+
+class _Pending:
+    __slots__ = ("queue", "body", "properties", "future", "attempts")
+
+    def __init__(self, queue: str, body: bytes, properties: pika.BasicProperties, future: Future):
+        self.queue = queue
+        self.body = body
+        self.properties = properties
+        self.future = future
+        self.attempts = 0
+
+
+class ConfirmPublisher:
+    """Pipelined confirm-mode publisher with per-message futures"""
+
+    def __init__(self, max_in_flight: Optional[int] = None, max_retries: Optional[int] = None,
+                 block_seconds: Optional[float] = None, reconnect_seconds: float = 5.0):
+        self.max_in_flight = max_in_flight or settings.RABBITMQ_CONFIRM_MAX_IN_FLIGHT
+        self.max_retries = settings.RABBITMQ_CONFIRM_MAX_RETRIES if max_retries is None else max_retries
+        self.block_seconds = settings.RABBITMQ_CONFIRM_BLOCK_SECONDS if block_seconds is None else block_seconds
+        self.reconnect_seconds = reconnect_seconds
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._lock = threading.Lock()
+        self._inbox: Deque[_Pending] = deque()  # waiting for a channel (any thread appends)
+        self._unconfirmed: "OrderedDict[int, _Pending]" = OrderedDict()  # by delivery tag (I/O thread)
+        self._declared: Set[str] = set()
+        self._next_tag = 0
+        self._connection = None
+        self._channel = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._inbox) + len(self._unconfirmed)
+
+    # -- any thread --
+
+    def publish(self, queue: str, message: Dict[str, Any], durable: bool = True, block: bool = True) -> Future:
+        """
+        Queue a message for confirmed delivery; the Future resolves to True on ack.
+        With block=False (request handlers on the event loop) a full window fails at once.
+        """
+        # Encoded before taking a slot: an unencodable message must not leak one
+        body, content_type, content_encoding = encode(queue, message)
+        properties = pika.BasicProperties(delivery_mode=2 if durable else 1, content_type=content_type,
+                                          content_encoding=content_encoding)
+        acquired = self._slots.acquire(timeout=self.block_seconds) if block else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise PublishBackpressureError(f"{self.max_in_flight} messages awaiting confirmation")
+        future: Future = Future()
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self._inbox.append(_Pending(queue, body, properties, future))
+        self._wake()
+        return future
+
+    def _wake(self):
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(self._flush)
+            except Exception:
+                pass  # closing: the inbox is flushed after reconnecting
+
+    # -- I/O thread --
+
+    def _flush(self):
+        """Send everything waiting in the inbox, tracking each delivery tag"""
+        channel = self._channel
+        if channel is None or not channel.is_open:
+            return
+        while True:
+            with self._lock:
+                if not self._inbox:
+                    return
+                pending = self._inbox.popleft()
+                if pending.queue not in self._declared:
+                    channel.queue_declare(queue=pending.queue, durable=True)
+                    self._declared.add(pending.queue)
+                self._next_tag += 1
+                self._unconfirmed[self._next_tag] = pending
+            channel.basic_publish(exchange='', routing_key=pending.queue, body=pending.body,
+                                  properties=pending.properties)
+
+    def _on_confirm(self, frame):
+        """Basic.Ack / Basic.Nack from the broker (multiple covers every tag up to it)"""
+        method = frame.method
+        acked = isinstance(method, pika.spec.Basic.Ack)
+        with self._lock:
+            if method.multiple:
+                tags = []
+                for tag in self._unconfirmed:
+                    if tag > method.delivery_tag:
+                        break
+                    tags.append(tag)
+            else:
+                tags = [method.delivery_tag] if method.delivery_tag in self._unconfirmed else []
+            settled = [self._unconfirmed.pop(tag) for tag in tags]
+            retry = []
+            for pending in settled:
+                if not acked and pending.attempts < self.max_retries:
+                    pending.attempts += 1
+                    retry.append(pending)
+            self._inbox.extendleft(reversed(retry))
+        for pending in settled:
+            if acked:
+                pending.future.set_result(True)
+            elif pending not in retry:
+                logger.error(f"Broker nacked message to {pending.queue} {pending.attempts + 1} times")
+                pending.future.set_exception(PublishNackedError(f"Message to {pending.queue} was nacked"))
+        if retry:
+            logger.warning(f"Republishing {len(retry)} nacked messages")
+            self._flush()
+
+    def _on_channel_open(self, channel):
+        channel.confirm_delivery(self._on_confirm)
+        channel.add_on_close_callback(self._on_channel_closed)
+        with self._lock:
+            self._channel = channel
+            self._declared = set()
+            self._next_tag = 0
+        logger.info("Confirm-mode publisher connected")
+        self._flush()
+
+    def _requeue_unconfirmed(self):
+        # Unconfirmed messages may or may not have landed: republish them (at-least-once)
+        with self._lock:
+            self._inbox.extendleft(reversed(list(self._unconfirmed.values())))
+            self._unconfirmed.clear()
+            self._channel = None
+
+    def _on_channel_closed(self, channel, reason):
+        logger.warning(f"Confirm-mode channel closed: {reason}")
+        self._requeue_unconfirmed()
+        if self._connection is not None and self._connection.is_open:
+            self._connection.close()
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_closed(self, connection, reason):
+        self._requeue_unconfirmed()
+        connection.ioloop.stop()
+
+    def _on_connection_error(self, connection, error):
+        logger.warning(f"Confirm-mode publisher could not connect: {error}")
+        connection.ioloop.stop()
+
+    def _run(self):
+        parameters = pika.URLParameters(settings.RABBITMQ_URL)
+        while not self._stopping.is_set():
+            try:
+                self._connection = pika.SelectConnection(
+                    parameters,
+                    on_open_callback=self._on_connection_open,
+                    on_open_error_callback=self._on_connection_error,
+                    on_close_callback=self._on_connection_closed,
+                )
+                self._connection.ioloop.start()
+            except Exception as e:
+                logger.error(f"Confirm-mode publisher error: {str(e)}")
+            self._connection = None
+            self._stopping.wait(self.reconnect_seconds)
+
+    # -- lifecycle --
+
+    def start(self):
+        if not self.running:
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="rabbitmq-confirms", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Wait (up to timeout) for outstanding confirms, then close the connection"""
+        deadline = time.monotonic() + timeout
+        while self.in_flight and time.monotonic() < deadline and self._channel is not None:
+            time.sleep(0.05)
+        if self.in_flight:
+            logger.warning(f"Stopping publisher with {self.in_flight} unconfirmed messages")
+        self._stopping.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.ioloop.add_callback_threadsafe(connection.close)
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# Global confirm-mode publisher instance (started by the app when RABBITMQ_PUBLISHER_CONFIRMS)
+confirm_publisher = ConfirmPublisher()
@@ -1,15 +1,25 @@
 """
 RabbitMQ producer for publishing messages to message queues
+While the confirm-mode publisher runs (RABBITMQ_PUBLISHER_CONFIRMS), publish, publish_batch
+and publish_event all go through it and connect/close open no connection of their own.
 """
 import pika
-import json
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from app.config import settings
+from app.events import encode, envelope
+from app.utils.confirm_publisher import confirm_publisher
 
 logger = logging.getLogger(__name__)
 
 
+def _log_unconfirmed(queue_name: str):
+    def callback(future):
+        if future.exception() is not None:
+            logger.error(f"Message to {queue_name} was not confirmed: {future.exception()}")
+    return callback
+
+
 class RabbitMQProducer:
     """Publisher for RabbitMQ messages"""
     
@@ -18,7 +28,9 @@ class RabbitMQProducer:
         self.channel: Optional[pika.adapters.blocking_connection.BlockingChannel] = None
     
     def connect(self):
-        """Establish connection to RabbitMQ"""
+        """Establish connection to RabbitMQ (nothing to do while the confirm publisher runs)"""
+        if confirm_publisher.running:
+            return
         try:
             credentials = pika.PlainCredentials(settings.RABBITMQ_USER, settings.RABBITMQ_PASSWORD)
             parameters = pika.ConnectionParameters(
@@ -44,25 +56,95 @@ class RabbitMQProducer:
             logger.error(f"Failed to declare queue {queue_name}: {str(e)}")
             raise
     
+    @staticmethod
+    def _encode(queue_name: str, message: Dict[str, Any], durable: bool):
+        """Body and properties as chosen by app.events (content type, compression)"""
+        body, content_type, content_encoding = encode(queue_name, message)
+        properties = pika.BasicProperties(
+            delivery_mode=2 if durable else 1,  # 2 = persistent
+            content_type=content_type,
+            content_encoding=content_encoding
+        )
+        return body, properties
+
+    @staticmethod
+    def _publish_confirmed(queue_name: str, message: Dict[str, Any], durable: bool, block: bool = True):
+        future = confirm_publisher.publish(queue_name, message, durable, block=block)
+        future.add_done_callback(_log_unconfirmed(queue_name))
+
     def publish(self, queue_name: str, message: Dict[str, Any], durable: bool = True):
         """Publish message to queue"""
         try:
+            if confirm_publisher.running:
+                self._publish_confirmed(queue_name, message, durable)
+                logger.info(f"Message queued for confirmed delivery to: {queue_name}")
+                return
             self.declare_queue(queue_name, durable)
-            
+            body, properties = self._encode(queue_name, message, durable)
             self.channel.basic_publish(
                 exchange='',
                 routing_key=queue_name,
-                body=json.dumps(message),
-                properties=pika.BasicProperties(
-                    delivery_mode=2 if durable else 1,  # 2 = persistent
-                    content_type='application/json'
-                )
+                body=body,
+                properties=properties
             )
             logger.info(f"Message published to queue: {queue_name}")
         except Exception as e:
             logger.error(f"Failed to publish message to {queue_name}: {str(e)}")
             raise
     
+    def publish_batch(self, queue_name: str, messages: List[Dict[str, Any]], durable: bool = True,
+                      block: bool = True):
+        """
+        Publish many messages to one queue over the open channel (queue declared once).
+        block=False: fail at once instead of waiting for confirm-window slots (async routes).
+        """
+        try:
+            if confirm_publisher.running:
+                for message in messages:
+                    self._publish_confirmed(queue_name, message, durable, block)
+                logger.info(f"{len(messages)} messages queued for confirmed delivery to: {queue_name}")
+                return
+            self.declare_queue(queue_name, durable)
+            for message in messages:
+                body, properties = self._encode(queue_name, message, durable)
+                self.channel.basic_publish(
+                    exchange='',
+                    routing_key=queue_name,
+                    body=body,
+                    properties=properties
+                )
+            logger.info(f"{len(messages)} messages published to queue: {queue_name}")
+        except Exception as e:
+            logger.error(f"Failed to publish messages to {queue_name}: {str(e)}")
+            raise
+    
+    def publish_event(self, queue_name: str, payload: Any, action: Optional[str] = None) -> bool:
+        """
+        Best-effort publish of one event (payload validated against its schema in app.events).
+        Goes through the confirm-mode publisher when it is running (no wait for the ack or for
+        a free slot, since callers run on the event loop; a final nack is logged), otherwise
+        connect/publish/close. Failures are logged, never raised.
+        """
+        if confirm_publisher.running:
+            try:
+                self._publish_confirmed(queue_name, envelope(queue_name, payload, action=action), True, block=False)
+                return True
+            except Exception as e:
+                logger.warning(f"Could not publish RabbitMQ message to {queue_name}: {str(e)}")
+                return False
+        try:
+            self.connect()
+            self.publish(queue_name, envelope(queue_name, payload, action=action))
+            return True
+        except Exception as e:
+            logger.warning(f"Could not publish RabbitMQ message to {queue_name}: {str(e)}")
+            return False
+        finally:
+            try:
+                self.close()
+            except Exception:
+                pass
+
     def close(self):
         """Close connection"""
         try:
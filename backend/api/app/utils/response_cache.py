@@ -0,0 +1,103 @@
+"""
+In-process cache of rendered JSON responses
+A CachedResponse holds the JSON-ready data, its orjson body and a strong ETag computed
+from the body; the precompressed variants (CompressedPayload) are built on first use and
+then reused by every request. ResponseCache keeps CachedResponses per key for a TTL
+(bounded, least recently used evicted first) and is invalidated by the writers of the
+data it caches. Misses are coalesced: concurrent requests for one key share a single load;
+expired entries are served stale while one refresh runs, and failed loads are cached
+briefly (stale_seconds / negative_ttl_seconds).
+"""
+from typing import Any, Callable, Hashable, Optional
+import hashlib
+import logging
+
+from fastapi import Request, status
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from app.middleware.compression import CompressedPayload
+from app.utils.serialization import dumps
+from app.utils.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def etag_for(*parts: bytes) -> str:
+    """Strong ETag over one or more bodies"""
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(part)
+        digest.update(b"\x00")
+    return f'"{digest.hexdigest()}"'
+
+
+def not_modified(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names etag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def not_modified_response(etag: str, headers: Optional[dict] = None) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={**(headers or {}), "ETag": etag})
+
+
+class CachedResponse:
+    """Rendered JSON body, its ETag and (lazily) its precompressed variants"""
+
+    __slots__ = ("data", "body", "etag", "_payload")
+
+    def __init__(self, data: Any):
+        self.data = data
+        self.body = dumps(data)
+        self.etag = etag_for(self.body)
+        self._payload: Optional[CompressedPayload] = None
+
+    @property
+    def payload(self) -> CompressedPayload:
+        # Races only build the same payload twice; either result is fine to keep
+        if self._payload is None:
+            self._payload = CompressedPayload(self.body)
+        return self._payload
+
+    def response(self, request: Request, headers: Optional[dict] = None) -> Response:
+        """200 with the negotiated variant, or 304 when the client's copy is current"""
+        headers = {**(headers or {}), "ETag": self.etag}
+        if not_modified(request, self.etag):
+            return not_modified_response(self.etag, headers)
+        return self.payload.response(request.headers.get("accept-encoding"), headers=headers)
+
+
+class ResponseCache:
+    """TTL + LRU cache of CachedResponses, loaded single-flight (see SingleFlight)"""
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int = 256, stale_seconds: float = 0,
+                 negative_ttl_seconds: float = 0):
+        self.name = name
+        self.flight: SingleFlight[CachedResponse] = SingleFlight(
+            name, ttl_seconds, stale_seconds, negative_ttl_seconds, max_entries
+        )
+
+    @property
+    def hits(self) -> int:
+        return self.flight.hits + self.flight.stale_hits
+
+    @property
+    def misses(self) -> int:
+        return self.flight.misses
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> CachedResponse:
+        """
+        Cached entry for key, else loader()'s data rendered and stored.
+        loader is blocking (DB queries): it runs in the threadpool, once per key however
+        many requests miss together, and must not depend on any one request's session.
+        """
+        return await self.flight.get(key, lambda: run_in_threadpool(lambda: CachedResponse(loader())))
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one key, or everything (no stale copy is served afterwards)"""
+        self.flight.invalidate(key)
+        logger.debug(f"Invalidated {self.name} cache ({'all' if key is None else key})")
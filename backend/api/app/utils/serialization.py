@@ -0,0 +1,193 @@
+"""
+Fast JSON responses
+ORJSONResponse renders with orjson and is the app's default response class. For routes
+that return ORM rows, orm_response() skips FastAPI's response_model round-trip (Pydantic
+validation, jsonable_encoder, stdlib json): a ModelSerializer precomputed once per schema
+reads the schema's fields straight off the row, with the same keys and value formats the
+response_model produced (aliases, ISO datetimes, Decimal as string).
+
+Listing routes accept sparse fieldsets (?fields=id,nombre,precio) through the SparseFields
+dependency: ModelSerializer.project() renders only those keys, and the services pass the
+same names to load_only / their explicit column lists so the SELECT shrinks as well.
+"""
+from decimal import Decimal
+from operator import attrgetter
+from typing import (Any, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple, Type, Union,
+                    get_args, get_origin)
+import threading
+
+import orjson
+from fastapi import Query
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+_ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=_ORJSON_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _unwrap_optional(annotation: Any) -> Any:
+    if get_origin(annotation) is Union:
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _model_of(annotation: Any) -> Tuple[Optional[Type[BaseModel]], bool]:
+    """(nested schema, is a list) for Model, Optional[Model] and List[Model] annotations"""
+    annotation = _unwrap_optional(annotation)
+    if get_origin(annotation) is Union:
+        return None, False
+    if get_origin(annotation) in (list, List):
+        args = get_args(annotation)
+        model, _ = _model_of(args[0]) if args else (None, False)
+        return model, model is not None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    return None, False
+
+
+class _Field(NamedTuple):
+    key: str  # output key (the alias, as response_model renders by_alias)
+    source: str  # attribute / mapping key read from the row
+    get: Callable[[Any], Any]
+    default: Any
+    nested: Optional["ModelSerializer"]
+    many: bool
+    convert: Optional[Callable[[Any], Any]]  # e.g. Numeric column (Decimal) -> float field
+
+
+class ModelSerializer:
+    """Precomputed field plan of a response schema: ORM row (or dict) -> JSON-ready dict"""
+
+    def __init__(self, schema: Type[BaseModel], fields: Optional[List[_Field]] = None):
+        self.schema = schema
+        self._projections: Dict[FrozenSet[str], "ModelSerializer"] = {}
+        if fields is not None:
+            self.fields = fields
+            return
+        self.fields = []
+        for name, field in schema.model_fields.items():
+            source = field.validation_alias if isinstance(field.validation_alias, str) else (field.alias or name)
+            key = field.serialization_alias or field.alias or name
+            default = None if field.is_required() else field.get_default(call_default_factory=True)
+            model, many = _model_of(field.annotation)
+            nested = serializer_for(model) if model is not None else None
+            convert = float if _unwrap_optional(field.annotation) is float else None
+            self.fields.append(_Field(key, source, attrgetter(source), default, nested, many, convert))
+
+    @property
+    def keys(self) -> List[str]:
+        return [field.key for field in self.fields]
+
+    def project(self, fields: Optional[FrozenSet[str]]) -> "ModelSerializer":
+        """Serializer limited to the given output keys (itself when fields is None)"""
+        if fields is None:
+            return self
+        projected = self._projections.get(fields)
+        if projected is None:
+            projected = ModelSerializer(self.schema, [f for f in self.fields if f.key in fields])
+            self._projections[fields] = projected
+        return projected
+
+    def to_dict(self, obj: Any) -> Dict[str, Any]:
+        data = {}
+        mapping = isinstance(obj, dict)
+        for field in self.fields:
+            if mapping:
+                value = obj.get(field.source, field.default)
+            else:
+                try:
+                    value = field.get(obj)
+                except AttributeError:
+                    value = field.default
+            if value is not None:
+                if field.nested is not None:
+                    value = [field.nested.to_dict(v) for v in value] if field.many else field.nested.to_dict(value)
+                elif field.convert is not None:
+                    value = field.convert(value)
+            data[field.key] = value
+        return data
+
+    def to_list(self, objs: Iterable[Any]) -> List[Dict[str, Any]]:
+        to_dict = self.to_dict
+        return [to_dict(obj) for obj in objs]
+
+    def response(self, data: Any, status_code: int = 200) -> ORJSONResponse:
+        """Response for one row, or a list of them"""
+        content = self.to_list(data) if isinstance(data, (list, tuple)) else self.to_dict(data)
+        return ORJSONResponse(content=content, status_code=status_code)
+
+
+_serializers: Dict[Type[BaseModel], ModelSerializer] = {}
+_serializers_lock = threading.RLock()  # nested schemas are built while holding it
+
+
+def serializer_for(schema: Type[BaseModel]) -> ModelSerializer:
+    """Cached ModelSerializer for schema (built on first use)"""
+    serializer = _serializers.get(schema)
+    if serializer is None:
+        with _serializers_lock:
+            serializer = _serializers.get(schema)
+            if serializer is None:
+                serializer = _serializers[schema] = ModelSerializer(schema)
+    return serializer
+
+
+def orm_response(schema: Type[BaseModel], data: Any, status_code: int = 200) -> ORJSONResponse:
+    """Response for one ORM row, or a list of them, shaped as schema"""
+    return serializer_for(schema).response(data, status_code)
+
+
+class SparseFields:
+    """
+    FastAPI dependency parsing ?fields= against a response schema.
+    Returns None (every field) or the requested output keys, always including "id";
+    unknown names are a 422 like any other invalid query parameter.
+
+    Usage:
+        fields: Optional[FrozenSet[str]] = Depends(SparseFields(ProductoResponse))
+    """
+
+    def __init__(self, schema: Type[BaseModel], always: Tuple[str, ...] = ("id",)):
+        self.schema = schema
+        self.always = always
+
+    def parse(self, fields: Optional[str]) -> Optional[FrozenSet[str]]:
+        if fields is None or not fields.strip():
+            return None
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+        allowed = serializer_for(self.schema).keys
+        unknown = sorted(names.difference(allowed))
+        if unknown:
+            raise RequestValidationError([{
+                "loc": ("query", "fields"),
+                "msg": f"Campos desconocidos: {', '.join(unknown)}. Disponibles: {', '.join(allowed)}",
+                "type": "value_error",
+            }])
+        return frozenset(names.union(name for name in self.always if name in allowed))
+
+    def __call__(self, fields: Optional[str] = Query(None, description="Campos a incluir, separados por comas")
+                 ) -> Optional[FrozenSet[str]]:
+        return self.parse(fields)
@@ -0,0 +1,115 @@
+"""
+Single-flight loading with stale-while-revalidate and negative caching
+SingleFlight caches one value per key. On a miss only one coroutine runs the loader; every
+other request for the key awaits that same load instead of hitting the database again.
+After ttl_seconds a value turns stale: for stale_seconds more it is still served at once
+while a single background refresh replaces it (a failed refresh keeps the stale value).
+A failed load with nothing to serve is remembered for negative_ttl_seconds and re-raised,
+so a struggling database is not retried by every request.
+"""
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Generic, Hashable, NamedTuple, Optional, Tuple, TypeVar
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class _Entry(NamedTuple):
+    value: object
+    fresh_until: float
+    stale_until: float
+
+
+class SingleFlight(Generic[T]):
+    """Per-key coalesced loads over an LRU of values (one event loop)"""
+
+    def __init__(self, name: str, ttl_seconds: float, stale_seconds: float = 0, negative_ttl_seconds: float = 0,
+                 max_entries: int = 256):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._failures: Dict[Hashable, Tuple[BaseException, float]] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._generation = 0  # bumped by invalidate(): loads started before it are not stored
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    async def get(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> T:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and now < entry.fresh_until:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry.value
+        failure = self._failures.get(key)
+        if failure is not None and now >= failure[1]:
+            del self._failures[key]
+            failure = None
+        if entry is not None and now < entry.stale_until:
+            self.stale_hits += 1
+            if failure is None and key not in self._inflight:
+                self._start(key, loader)
+            return entry.value
+        if failure is not None:
+            raise failure[0]
+        self.misses += 1
+        task = self._inflight.get(key) or self._start(key, loader)
+        # Shielded: a waiter that goes away must not cancel the load the others share
+        return await asyncio.shield(task)
+
+    def _start(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(self._load(key, loader, self._generation))
+        task.add_done_callback(self._log_failure)
+        self._inflight[key] = task
+        return task
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[T]], generation: int) -> T:
+        self.loads += 1
+        try:
+            value = await loader()
+        except Exception as e:
+            if generation == self._generation and self.negative_ttl_seconds > 0:
+                self._failures[key] = (e, time.monotonic() + self.negative_ttl_seconds)
+            raise
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+        if generation == self._generation:
+            now = time.monotonic()
+            self._entries[key] = _Entry(value, now + self.ttl_seconds, now + self.ttl_seconds + self.stale_seconds)
+            self._entries.move_to_end(key)
+            self._failures.pop(key, None)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def _log_failure(self, task: asyncio.Task) -> None:
+        # Retrieved here so background refreshes nobody awaits don't warn
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Loading {self.name} failed: {task.exception()}")
+
+    def peek(self, key: Hashable) -> Optional[T]:
+        """Cached value (fresh or stale) without loading"""
+        entry = self._entries.get(key)
+        return None if entry is None else entry.value
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one key, or everything; loads already running will not be stored"""
+        self._generation += 1
+        if key is None:
+            self._entries.clear()
+            self._failures.clear()
+            self._inflight.clear()
+        else:
+            self._entries.pop(key, None)
+            self._failures.pop(key, None)
+            self._inflight.pop(key, None)
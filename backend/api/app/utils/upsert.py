@@ -0,0 +1,95 @@
+"""
+Set-based upserts for summary/counter tables
+One statement per chunk of rows: MERGE on SQL Server, INSERT ... ON CONFLICT elsewhere.
+"""
+from typing import Any, Dict, List, Sequence
+
+from sqlalchemy import case, text
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+# SQL Server allows 2100 parameters per statement
+_MSSQL_MAX_PARAMS = 2000
+
+
+def _mssql_merge(db: Session, table: str, columns: List[str], keys: Sequence[str],
+                 rows: List[Dict[str, Any]], increment: Sequence[str], greatest: Sequence[str],
+                 assign: Sequence[str], returning: Sequence[str]) -> List[Any]:
+    set_clauses = [f"t.{c} = t.{c} + s.{c}" for c in increment]
+    set_clauses += [f"t.{c} = CASE WHEN t.{c} IS NULL OR s.{c} > t.{c} THEN s.{c} ELSE t.{c} END" for c in greatest]
+    set_clauses += [f"t.{c} = s.{c}" for c in assign]
+    on_clause = " AND ".join(f"t.{k} = s.{k}" for k in keys)
+    column_list = ", ".join(columns)
+
+    output = f"OUTPUT {', '.join('inserted.' + c for c in returning)}" if returning else ""
+
+    chunk = max(1, _MSSQL_MAX_PARAMS // len(columns))
+    result = []
+    for start in range(0, len(rows), chunk):
+        params: Dict[str, Any] = {}
+        values = []
+        for i, row in enumerate(rows[start:start + chunk]):
+            names = []
+            for j, column in enumerate(columns):
+                name = f"p{i}_{j}"
+                params[name] = row.get(column)
+                names.append(f":{name}")
+            values.append(f"({', '.join(names)})")
+        statement = (
+            f"MERGE {table} WITH (HOLDLOCK) AS t "
+            f"USING (VALUES {', '.join(values)}) AS s ({column_list}) "
+            f"ON {on_clause} "
+            + (f"WHEN MATCHED THEN UPDATE SET {', '.join(set_clauses)} " if set_clauses else "")
+            + f"WHEN NOT MATCHED THEN INSERT ({column_list}) VALUES ({', '.join('s.' + c for c in columns)}) "
+            + f"{output};"
+        )
+        executed = db.execute(text(statement), params)
+        if returning:
+            result += executed.all()
+    return result
+
+
+def upsert(db: Session, model, keys: Sequence[str], rows: List[Dict[str, Any]],
+           increment: Sequence[str] = (), greatest: Sequence[str] = (), assign: Sequence[str] = (),
+           returning: Sequence[str] = ()) -> List[Any]:
+    """
+    Insert `rows` into `model`'s table or, when the `keys` already exist, merge them:
+    - increment: column = column + new value
+    - greatest: column = max(column, new value), NULLs ignored
+    - assign: column = new value
+    - returning: columns to read back from each written row (in no particular order)
+    Does not commit; runs inside the caller's transaction.
+    """
+    if not rows:
+        return []
+    columns = list(rows[0].keys())
+    dialect = db.bind.dialect.name
+    if dialect == "mssql":
+        return _mssql_merge(db, model.__tablename__, columns, keys, rows, increment, greatest, assign, returning)
+
+    insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+    table = model.__table__
+    result = []
+    for start in range(0, len(rows), 500):
+        stmt = insert(table).values(rows[start:start + 500])
+        excluded = stmt.excluded
+        set_ = {c: table.c[c] + excluded[c] for c in increment}
+        set_.update({
+            c: case(
+                (table.c[c].is_(None), excluded[c]),
+                (excluded[c] > table.c[c], excluded[c]),
+                else_=table.c[c],
+            )
+            for c in greatest
+        })
+        set_.update({c: excluded[c] for c in assign})
+        if set_:
+            stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=set_)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=list(keys))
+        if returning:
+            result += db.execute(stmt.returning(*(table.c[c] for c in returning))).all()
+        else:
+            db.execute(stmt)
+    return result
@@ -6,12 +6,31 @@ import os
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from app.config import settings
 from app.database import init_db, close_db
+from app.middleware.compression import CompressionMiddleware
 from app.middleware.error_handler import setup_error_handlers
+from app.middleware.idempotency import IdempotencyMiddleware
+from app.middleware.read_your_writes import ReadYourWritesMiddleware
+from app.middleware.rate_limiting import rate_limiter, SQLRateLimitBackend
+from app.services import (
+    reservation_service,
+    inventory_journal,
+    cart_engine,
+    order_stats_service,
+    user_stats_service,
+    user_search_service,
+    archive_service,
+    verification_service,
+)
+from app.consumers import consumer_runtime
+from app.utils.background import PeriodicTask, with_session
+from app.utils.confirm_publisher import confirm_publisher
+from app.utils.serialization import ORJSONResponse
 from app.routers import (
     auth_router,
     categories_router,
@@ -24,6 +43,50 @@ from app.routers import (
 )
 
 
+# Periodic jobs started with the app
+background_tasks = [
+    PeriodicTask(
+        "inventory-reservation-expiry",
+        settings.INVENTORY_RESERVATION_SWEEP_SECONDS,
+        with_session(reservation_service.release_expired),
+    ),
+    PeriodicTask(
+        "cart-flush",
+        settings.CART_FLUSH_INTERVAL_SECONDS,
+        with_session(cart_engine.flush_due),
+    ),
+    PeriodicTask(
+        "order-stats-reconcile",
+        settings.ORDER_STATS_RECONCILE_SECONDS,
+        with_session(order_stats_service.reconcile_recent),
+    ),
+    PeriodicTask(
+        "user-stats-rebuild",
+        settings.USER_STATS_REBUILD_SECONDS,
+        with_session(user_stats_service.rebuild),
+    ),
+    PeriodicTask(
+        "user-search-refresh",
+        settings.USER_SEARCH_REFRESH_SECONDS,
+        with_session(user_search_service.refresh),
+    ),
+    PeriodicTask(
+        "history-archive",
+        settings.ARCHIVE_INTERVAL_SECONDS,
+        with_session(archive_service.run),
+    ),
+    PeriodicTask(
+        "verification-code-purge",
+        settings.VERIFICATION_PURGE_SECONDS,
+        with_session(verification_service.purge_expired),
+    ),
+]
+if isinstance(rate_limiter, SQLRateLimitBackend):
+    background_tasks.append(
+        PeriodicTask("rate-limit-purge", 600, with_session(rate_limiter.purge_expired))
+    )
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -39,11 +102,30 @@ async def lifespan(app: FastAPI):
         print(f"Warning: Could not initialize database: {str(e)}")
         print("Application will continue without database connection")
         # Don't raise - allow app to start for development
+
+    for task in background_tasks:
+        task.start()
+    inventory_journal.start()
+    if settings.RABBITMQ_PUBLISHER_CONFIRMS:
+        confirm_publisher.start()
+    if settings.CONSUMER_IN_PROCESS:
+        consumer_runtime.start()
     
     yield
     
     # Shutdown
     print("Shutting down API")
+    await consumer_runtime.stop()
+    for task in background_tasks:
+        await task.stop()
+    await run_in_threadpool(inventory_journal.stop)
+    try:
+        # Carts held only in memory would be lost otherwise
+        await run_in_threadpool(with_session(lambda db: cart_engine.flush_due(db, force=True)))
+    except Exception as e:
+        print(f"Error flushing carts: {str(e)}")
+    # Waits for outstanding confirms once the last producers (carts) are done
+    await run_in_threadpool(confirm_publisher.stop)
     try:
         close_db()
         print("Database connections closed")
@@ -56,9 +138,14 @@ app = FastAPI(
     title="Distribuidora Perros y Gatos API",
     description="Backend API para tienda de productos para mascotas",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Idempotency-Key: los reintentos de escrituras reciben la primera respuesta sin repetirla
+if settings.IDEMPOTENCY_ENABLED:
+    app.add_middleware(IdempotencyMiddleware)
+
 # Middleware CORS
 app.add_middleware(
     CORSMiddleware,
@@ -68,6 +155,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Middleware de compresión (gzip/br) para respuestas grandes
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_BYTES)
+
+# Lecturas en réplicas: quien acaba de escribir lee del primario (read-your-writes)
+if settings.DATABASE_READ_URLS:
+    app.add_middleware(ReadYourWritesMiddleware)
+
 # Middleware para hosts de confianza
 app.add_middleware(
     TrustedHostMiddleware,
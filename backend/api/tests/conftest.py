@@ -0,0 +1,47 @@
+"""
+Shared fixtures: a fresh in-memory SQLite database per test, installed as
+database.SessionLocal. Test modules seed their own rows by overriding session_factory.
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.database as database
+from app.database import Base
+from app import models
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine, monkeypatch):
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    return TestingSessionLocal
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def add_user():
+    """add_user(db, **overrides): stage an active customer (Ana Pérez, id 1 by default)"""
+    def add(db, **overrides):
+        fields = dict(id=1, nombre_completo="Ana Pérez", email="ana@example.com", cedula="1234567",
+                      password_hash="x", is_active=True)
+        fields.update(overrides)
+        usuario = models.Usuario(**fields)
+        db.add(usuario)
+        return usuario
+    return add
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app import models
+from app.routers.admin_users import router as admin_users_router
+from app.routers.orders import router as orders_router
+from app.services.archive_service import ArchiveService
+from app.services.inventory_journal_service import InventoryJournal
+from app.services.user_stats_service import user_stats_service
+
+NOW = datetime(2025, 6, 1)
+
+
+@pytest.fixture
+def session_factory(session_factory, add_user):
+    db = session_factory()
+    add_user(db)
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    db.add(models.Producto(id=1, nombre="Croquetas", precio=10, peso_gramos=1000,
+                           cantidad_disponible=10, categoria_id=1, subcategoria_id=1, activo=True))
+    viejo, reciente = NOW - timedelta(days=400), NOW - timedelta(days=5)
+    # 1-3: delivered long ago (archived), 4: still pending after a year, 5: delivered recently
+    for pid, estado, fecha in [(1, "Entregado", viejo), (2, "Entregado", viejo), (3, "Cancelado", viejo),
+                               (4, "Pendiente", viejo), (5, "Entregado", reciente)]:
+        db.add(models.Pedido(id=pid, usuario_id=1, estado=estado, total=20, direccion_entrega="Calle 1 # 2-3",
+                             telefono_contacto="3001234567", fecha_creacion=fecha, fecha_actualizacion=fecha))
+        db.add(models.PedidoItem(pedido_id=pid, producto_id=1, cantidad=2, precio_unitario=10))
+        db.add(models.PedidoHistorialEstado(pedido_id=pid, estado_anterior=None, estado_nuevo="Pendiente",
+                                            fecha=fecha - timedelta(hours=1)))
+    for i in range(3):
+        db.add(models.PedidoHistorialEstado(pedido_id=4, estado_anterior="Pendiente", estado_nuevo="Pendiente",
+                                            nota=f"reciente {i}", fecha=reciente + timedelta(hours=i)))
+    for i in range(6):
+        fecha = viejo + timedelta(days=i) if i < 4 else reciente + timedelta(days=i)
+        db.add(models.InventarioHistorial(producto_id=1, cantidad_anterior=i, cantidad_nueva=i + 1,
+                                          tipo_movimiento="REABASTECIMIENTO", fecha=fecha))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def count(db, model):
+    return db.scalar(select(func.count()).select_from(model))
+
+
+def test_archive_moves_cold_rows_and_reads_fall_back(db, tmp_path):
+    user_stats_service.rebuild(db)
+    antes = user_stats_service.stats_for(db, [1])
+
+    moved = ArchiveService(horizon_days=365, batch_size=2).run(db, now=NOW)
+    assert moved == {"pedidos": 3, "historial_pedidos": 1, "historial_inventario": 4}
+    assert count(db, models.Pedido) == 2 and count(db, models.PedidoArchivo) == 3
+    assert count(db, models.PedidoItem) == 2 and count(db, models.PedidoItemArchivo) == 3
+    assert count(db, models.PedidoHistorialEstado) == 4
+    assert count(db, models.InventarioHistorial) == 2
+    assert ArchiveService(horizon_days=365).run(db, now=NOW) == {
+        "pedidos": 0, "historial_pedidos": 0, "historial_inventario": 0,
+    }
+
+    # Aggregates over hot + archive are unchanged
+    user_stats_service.rebuild(db)
+    assert user_stats_service.stats_for(db, [1]) == antes
+
+    journal = InventoryJournal(directory=str(tmp_path))
+    fechas = [m.fecha for m in journal.history(db, 1, skip=0, limit=10)]
+    assert len(fechas) == 6 and fechas == sorted(fechas, reverse=True)
+    assert [m.cantidad_nueva for m in journal.history(db, 1, skip=3, limit=2)] == [3, 2]
+
+    app = FastAPI()
+    app.include_router(orders_router)
+    app.include_router(admin_users_router)
+    client = TestClient(app)
+    assert client.get("/api/admin/pedidos/1").json()["total"] == 20.0
+    # Listings continue past the hot orders into the archive
+    pedidos = client.get("/api/admin/pedidos").json()
+    assert [p["id"] for p in pedidos] == [5, 4, 3, 2, 1]
+    assert all(len(p["items"]) == 1 and p["total"] == 20.0 for p in pedidos)
+    assert [p["id"] for p in client.get("/api/admin/pedidos", params={"skip": 3, "limit": 1}).json()] == [2]
+    entregados = client.get("/api/admin/pedidos", params={"estado": "Entregado"}).json()
+    assert [p["id"] for p in entregados] == [5, 2, 1]
+    assert len(client.get("/api/admin/usuarios/1/pedidos").json()) == 5
+    assert len(client.get("/api/admin/pedidos/usuario/1", params={"skip": 4}).json()) == 1
+    assert [h["estado_nuevo"] for h in client.get("/api/admin/pedidos/1/historial").json()] == ["Pendiente"]
+    notas = [h["nota"] for h in client.get("/api/admin/pedidos/4/historial", params={"skip": 2}).json()]
+    assert notas == ["reciente 0", None]
+    assert client.get("/api/admin/pedidos/4/historial", params={"skip": 3}).json()[0]["nota"] is None
+    assert client.get("/api/admin/pedidos/99/historial").status_code == 404
+
+    export = client.get("/api/admin/pedidos/exportar", params={"desde": "2024-01-01", "hasta": "2025-12-31",
+                                                              "formato": "jsonl"})
+    assert len(export.text.splitlines()) == 5
@@ -5,6 +5,7 @@ from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
 import app.database as database
 from app.database import Base
@@ -13,8 +14,8 @@ from app.utils import rabbitmq_producer
 
 
 def setup_test_db():
-    # Use in-memory SQLite for tests
-    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    # Use in-memory SQLite for tests (one shared connection, so every session sees the tables)
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool)
     TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     # Patch database module objects
     database.engine = engine
@@ -55,8 +56,8 @@ def test_add_and_list_and_limit(monkeypatch):
         assert resp.status_code == 201, resp.text
         assert resp.json()["message"] == "Imagen agregada al carrusel"
 
-    # Sixth should fail with exact message
-    resp6 = upload(6)
+    # Sixth should fail with exact message (a valid orden, so it reaches the limit check)
+    resp6 = upload(5)
     assert resp6.status_code == 400
     assert resp6.json()["message"] == "El carrusel ya tiene el número máximo de imágenes."
 
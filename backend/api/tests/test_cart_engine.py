@@ -0,0 +1,149 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import models
+from app.routers.home_products import router as home_router
+from app.services.cart_service import CartEngine, MemoryCartStore, SQLCartStore
+from app.utils import RabbitMQProducer, security_utils
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    db = session_factory()
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    db.add(models.Producto(id=1, nombre="Croquetas", precio=12.5, peso_gramos=1000,
+                           cantidad_disponible=10, categoria_id=1, subcategoria_id=1, activo=True))
+    db.add(models.Producto(id=2, nombre="Snacks", precio=3, peso_gramos=200,
+                           cantidad_disponible=2, categoria_id=1, subcategoria_id=1, activo=True))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def capture_events(monkeypatch):
+    published = []
+    monkeypatch.setattr(RabbitMQProducer, "connect", lambda self: None)
+    monkeypatch.setattr(RabbitMQProducer, "publish",
+                        lambda self, queue, message, **k: published.append((queue, message)))
+    monkeypatch.setattr(RabbitMQProducer, "close", lambda self: None)
+    return published
+
+
+def test_mutations_stay_in_memory_until_debounced_flush(monkeypatch, db):
+    published = capture_events(monkeypatch)
+    engine = CartEngine(MemoryCartStore(), debounce=30, max_delay=300, idle_ttl=3600)
+
+    engine.add_item(db, None, "sess-1", 1, 2)
+    engine.add_item(db, None, "sess-1", 1, 1)
+    state = engine.add_item(db, None, "sess-1", 2, 2)
+    assert state["total"] == "43.50"
+    assert state["cantidad_total"] == 5
+    state = engine.remove_item(db, None, "sess-1", 2)
+    assert state["total"] == "37.50"
+
+    # Nothing written while the cart is still being edited
+    assert engine.flush_due(db) == 0
+    assert db.query(models.CartItem).count() == 0
+
+    assert engine.flush_due(db, now=state["actualizado"] + 31) == 1
+    items = db.query(models.CartItem).all()
+    assert [(i.producto_id, i.cantidad) for i in items] == [(1, 3)]
+    assert [queue for queue, _ in published] == ["cart.item.agregar"] * 3 + ["cart.item.eliminar"]
+    assert engine.flush_due(db, now=state["actualizado"] + 62) == 0
+
+    # A cold engine reloads the persisted cart in one query
+    reloaded = CartEngine(MemoryCartStore()).get(db, None, "sess-1")
+    assert reloaded["cart_id"] == items[0].cart_id
+    assert reloaded["total"] == "37.50"
+
+
+def test_sql_store_shares_carts_between_replicas(monkeypatch, session_factory, db):
+    capture_events(monkeypatch)
+    replica_a = CartEngine(SQLCartStore(session_factory))
+    replica_b = CartEngine(SQLCartStore(session_factory))
+
+    replica_a.add_item(db, 7, None, 1, 1)
+    state = replica_b.add_item(db, 7, None, 1, 2)
+    assert state["items"]["1"]["cantidad"] == 3
+
+    assert replica_a.flush_due(db, force=True) == 1
+    assert replica_b.flush_due(db, force=True) == 0
+    assert db.query(models.CartItem).one().cantidad == 3
+
+
+def test_failing_cart_does_not_block_the_flush(monkeypatch, db):
+    capture_events(monkeypatch)
+    engine = CartEngine(MemoryCartStore())
+    engine.add_item(db, None, "sess-ok", 1, 1)
+    engine.add_item(db, None, "sess-bad", 2, 1)
+
+    write = engine._write
+    def failing_write(db, states):
+        if any(s["session_id"] == "sess-bad" for s in states):
+            raise RuntimeError("column too long")
+        write(db, states)
+    monkeypatch.setattr(engine, "_write", failing_write)
+
+    assert engine.flush_due(db, force=True) == 1
+    assert db.query(models.Cart).one().session_id == "sess-ok"
+    # The failed cart stays dirty for the next flush
+    assert engine.flush_due(db, force=True) == 0
+    monkeypatch.setattr(engine, "_write", write)
+    assert engine.flush_due(db, force=True) == 1
+
+
+def test_events_survive_a_failed_publish(monkeypatch, db):
+    published = capture_events(monkeypatch)
+    engine = CartEngine(MemoryCartStore())
+    engine.add_item(db, None, "sess-1", 1, 1)
+
+    def broker_down(self, queue, message, **k):
+        raise ConnectionError("broker down")
+    with monkeypatch.context() as m:
+        m.setattr(RabbitMQProducer, "publish", broker_down)
+        assert engine.flush_due(db, force=True) == 1
+    assert db.query(models.CartItem).count() == 1
+
+    # The cart stays dirty with its events until they go out
+    assert engine.flush_due(db, force=True) == 1
+    assert [queue for queue, _ in published] == ["cart.item.agregar"]
+    assert engine.flush_due(db, force=True) == 0
+
+
+def test_cart_endpoints(monkeypatch, session_factory):
+    capture_events(monkeypatch)
+    monkeypatch.setattr("app.routers.home_products.cart_engine", CartEngine(MemoryCartStore()))
+
+    app = FastAPI()
+    app.include_router(home_router)
+    client = TestClient(app)
+
+    added = client.post("/api/cart/add", json={"producto_id": 1, "cantidad": 2})
+    assert added.status_code == 200, added.text
+    assert added.json()["message"] == "Producto agregado al carrito"
+    session_id = added.cookies["session_id"]
+    assert added.json()["data"]["session_id"] == session_id
+
+    no_stock = client.post("/api/cart/add", json={"producto_id": 2, "cantidad": 3})
+    assert no_stock.status_code == 409
+    assert no_stock.json()["message"] == "Sin existencias"
+    assert client.post("/api/cart/add", json={"producto_id": 9, "cantidad": 1}).status_code == 404
+
+    updated = client.put("/api/cart/items/1", params={"cantidad": 4})
+    assert updated.json()["data"]["total"] == 50.0
+
+    token = security_utils.create_access_token({"sub": "5"})
+    user_cart = client.get("/api/cart", headers={"Authorization": f"Bearer {token}"}).json()["data"]
+    assert user_cart["usuario_id"] == 5 and user_cart["items"] == []
+
+    cleared = client.delete("/api/cart")
+    assert cleared.json()["data"]["items"] == []
+
+    # Oversized or malformed session ids are replaced with a fresh session
+    oversized = TestClient(app).post("/api/cart/add", json={"producto_id": 1, "cantidad": 1},
+                                     headers={"session-id": "x" * 500})
+    assert oversized.status_code == 200
+    assert oversized.cookies["session_id"] != "x" * 500
+    assert len(oversized.json()["data"]["session_id"]) == 32
@@ -0,0 +1,98 @@
+import importlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import models
+from app.middleware.error_handler import setup_error_handlers
+from app.middleware.rate_limiting import MemoryRateLimitBackend
+from app.routers.auth import router as auth_router
+from app.services.cart_merge_service import cart_merge_service
+from app.services.cart_service import CartEngine, MemoryCartStore
+from app.utils import RabbitMQProducer, security_utils
+
+
+@pytest.fixture
+def session_factory(session_factory, add_user):
+    db = session_factory()
+    add_user(db, password_hash=security_utils.hash_password("Secreta123!"))
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    db.add(models.Producto(id=1, nombre="Croquetas", precio=10, peso_gramos=1000,
+                           cantidad_disponible=10, categoria_id=1, subcategoria_id=1, activo=True))
+    db.add(models.Producto(id=2, nombre="Snacks", precio=4, peso_gramos=200,
+                           cantidad_disponible=5, categoria_id=1, subcategoria_id=1, activo=True))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def use_engine(monkeypatch, reserve_stock=True):
+    monkeypatch.setattr(RabbitMQProducer, "connect", lambda self: None)
+    monkeypatch.setattr(RabbitMQProducer, "publish", lambda *a, **k: None)
+    monkeypatch.setattr(RabbitMQProducer, "close", lambda self: None)
+    engine = CartEngine(MemoryCartStore(), reserve_stock=reserve_stock)
+    # The services package re-exports the instance under the module's name
+    monkeypatch.setattr(importlib.import_module("app.services.cart_merge_service"), "cart_engine", engine)
+    return engine
+
+
+def test_merge_sums_clamps_and_deletes_anonymous_cart(monkeypatch, db):
+    # Without reservations both carts can exceed the stock between them
+    engine = use_engine(monkeypatch, reserve_stock=False)
+
+    engine.add_item(db, 1, None, 1, 8)
+    engine.flush_due(db, force=True)
+    # The anonymous cart was never flushed: the merge persists it first
+    engine.add_item(db, None, "anon", 1, 5)
+    engine.add_item(db, None, "anon", 2, 1)
+
+    merged = cart_merge_service.merge(db, "anon", 1)
+    assert merged["items"] == {"1": {"cantidad": 10, "precio_unitario": "10.00"},
+                               "2": {"cantidad": 1, "precio_unitario": "4.00"}}
+    assert merged["total"] == "104.00"
+    assert merged["sucio_desde"] is None
+
+    assert db.query(models.Cart).count() == 1
+    rows = db.query(models.CartItem).order_by(models.CartItem.producto_id).all()
+    assert [(r.cart_id, r.producto_id, r.cantidad) for r in rows] == [(merged["cart_id"], 1, 10), (merged["cart_id"], 2, 1)]
+    assert engine.store.load("s:anon") is None
+    assert engine.get(db, 1, None)["total"] == "104.00"
+
+    assert cart_merge_service.merge(db, "anon", 1) is None
+
+
+def test_merge_moves_stock_reservations_to_the_user_cart(monkeypatch, db):
+    engine = use_engine(monkeypatch)
+
+    engine.add_item(db, 1, None, 1, 6)
+    engine.add_item(db, None, "anon", 1, 3)
+    engine.add_item(db, None, "anon", 2, 2)
+    db.expire_all()
+    assert db.get(models.Producto, 1).cantidad_disponible == 1
+
+    cart_merge_service.merge(db, "anon", 1)
+    db.expire_all()
+    assert db.get(models.Producto, 1).cantidad_disponible == 1
+    assert db.get(models.Producto, 2).cantidad_disponible == 3
+    activas = db.query(models.InventarioReserva).filter_by(estado="ACTIVA").order_by(models.InventarioReserva.producto_id).all()
+    assert [(r.clave, r.producto_id, r.cantidad) for r in activas] == [("carrito:u:1", 1, 9), ("carrito:u:1", 2, 2)]
+
+
+def test_login_returns_merged_cart(monkeypatch, db):
+    engine = use_engine(monkeypatch)
+    monkeypatch.setattr("app.routers.auth.rate_limiter", MemoryRateLimitBackend())
+    engine.add_item(db, None, "anon", 2, 2)
+
+    app = FastAPI()
+    setup_error_handlers(app)
+    app.include_router(auth_router)
+    client = TestClient(app)
+
+    resp = client.post("/api/auth/login", json={"email": "ana@example.com", "password": "Secreta123!"},
+                       headers={"session-id": "anon"})
+    assert resp.status_code == 200, resp.text
+    cart = resp.json()["cart"]
+    assert cart["usuario_id"] == 1
+    assert [(i["producto_id"], i["cantidad"]) for i in cart["items"]] == [(2, 2)]
@@ -0,0 +1,73 @@
+import gzip
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.compression import CompressedPayload, CompressionMiddleware, negotiate
+
+GRANDE = b'{"productos": "' + b"croquetas " * 500 + b'"}'
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1000)
+    payload = CompressedPayload(GRANDE, minimum_size=1000)
+
+    @app.get("/grande")
+    def grande():
+        return Response(GRANDE, media_type="application/json")
+
+    @app.get("/pequena")
+    def pequena():
+        return Response(b'{"ok": true}', media_type="application/json")
+
+    @app.get("/imagen")
+    def imagen():
+        return Response(b"\x89PNG" + b"\x00" * 5000, media_type="image/png")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((b"id,total\n" + b"1,10.00\n" * 200 for _ in range(3)), media_type="text/csv")
+
+    @app.get("/cache")
+    def cache(request: Request):
+        return payload.response(request.headers.get("accept-encoding"))
+
+    return app, payload
+
+
+def test_compresses_large_and_streamed_bodies_only():
+    client = TestClient(make_app()[0])
+    gz = {"Accept-Encoding": "gzip"}
+
+    resp = client.get("/grande", headers=gz)
+    assert resp.headers["content-encoding"] == "gzip" and "Accept-Encoding" in resp.headers["vary"]
+    assert resp.content == GRANDE  # decoded by the client
+    assert "content-encoding" not in client.get("/pequena", headers=gz).headers
+    assert "content-encoding" not in client.get("/imagen", headers=gz).headers
+    assert "content-encoding" not in client.get("/grande", headers={"Accept-Encoding": "identity"}).headers
+
+    resp = client.get("/stream", headers=gz)
+    assert resp.headers["content-encoding"] == "gzip" and "content-length" not in resp.headers
+    assert resp.text == ("id,total\n" + "1,10.00\n" * 200) * 3
+
+
+def test_precompressed_payload_is_served_without_recompression(monkeypatch):
+    app, payload = make_app()
+    calls = []
+    monkeypatch.setattr("app.middleware.compression.compress", lambda *a, **k: calls.append(a))
+    client = TestClient(app)
+
+    resp = client.get("/cache", headers={"Accept-Encoding": "gzip, br;q=0"})
+    assert resp.headers["content-encoding"] == "gzip" and resp.content == GRANDE
+    assert gzip.decompress(payload.variants["gzip"]) == GRANDE
+    assert calls == []
+    assert "content-encoding" not in client.get("/cache", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_negotiate_honours_q_values():
+    assert negotiate("gzip;q=0") is None
+    assert negotiate("*") is not None
+    assert negotiate("deflate, gzip;q=0.5") == "gzip"
+    assert negotiate(None) is None
@@ -0,0 +1,110 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from pika.spec import Basic
+
+from app.utils import rabbitmq
+from app.utils.confirm_publisher import ConfirmPublisher, PublishBackpressureError, PublishNackedError
+
+
+class FakeChannel:
+    is_open = True
+
+    def __init__(self):
+        self.published = []
+        self.declared = []
+
+    def confirm_delivery(self, callback):
+        self.on_confirm = callback
+
+    def add_on_close_callback(self, callback):
+        pass
+
+    def queue_declare(self, queue, durable):
+        self.declared.append(queue)
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append(body)
+
+
+def confirm(method, tag, multiple=False):
+    return SimpleNamespace(method=method(delivery_tag=tag, multiple=multiple))
+
+
+def test_pipelined_publishes_resolve_on_acks_and_retry_nacks():
+    publisher = ConfirmPublisher(max_in_flight=4, max_retries=1, block_seconds=0)
+    channel = FakeChannel()
+    publisher._on_channel_open(channel)
+
+    futures = [publisher.publish("cola.x", {"n": i}) for i in range(4)]
+    publisher._flush()
+    # All four were sent before any confirm arrived; the queue is declared once per channel
+    assert len(channel.published) == 4 and channel.declared == ["cola.x"]
+    with pytest.raises(PublishBackpressureError):
+        publisher.publish("cola.x", {"n": 4})
+
+    channel.on_confirm(confirm(Basic.Ack, 2, multiple=True))
+    assert [f.done() for f in futures] == [True, True, False, False]
+    assert futures[0].result() is True and publisher.in_flight == 2
+
+    # Nack of tag 3: republished as tag 5; the retry's nack is final
+    channel.on_confirm(confirm(Basic.Nack, 3))
+    assert len(channel.published) == 5 and not futures[2].done()
+    channel.on_confirm(confirm(Basic.Ack, 4))
+    channel.on_confirm(confirm(Basic.Nack, 5))
+    assert futures[3].result() is True
+    with pytest.raises(PublishNackedError):
+        futures[2].result()
+    assert publisher.in_flight == 0
+
+    # Unconfirmed messages are republished on a new channel after a reconnect
+    pendiente = publisher.publish("cola.x", {"n": 6})
+    publisher._flush()
+    publisher._requeue_unconfirmed()
+    nuevo = FakeChannel()
+    publisher._on_channel_open(nuevo)
+    assert len(nuevo.published) == 1 and nuevo.declared == ["cola.x"]
+    nuevo.on_confirm(confirm(Basic.Ack, 1))
+    assert pendiente.result() is True
+
+
+def test_unencodable_message_does_not_take_a_slot():
+    publisher = ConfirmPublisher(max_in_flight=1, block_seconds=0)
+    publisher._on_channel_open(FakeChannel())
+    for _ in range(2):
+        with pytest.raises(TypeError):
+            publisher.publish("cola.x", {"n": object()})
+    assert not publisher.publish("cola.x", {"n": 1}).done()
+
+
+def test_producer_publishes_through_running_confirm_publisher(monkeypatch):
+    publisher = ConfirmPublisher(max_in_flight=8, block_seconds=0)
+    channel = FakeChannel()
+    publisher._on_channel_open(channel)
+    monkeypatch.setattr(ConfirmPublisher, "running", property(lambda self: True))
+    monkeypatch.setattr(rabbitmq, "confirm_publisher", publisher)
+    monkeypatch.setattr(rabbitmq.pika, "BlockingConnection", lambda *a, **k: pytest.fail("opened a connection"))
+
+    producer = rabbitmq.RabbitMQProducer()
+    producer.connect()
+    producer.publish_batch("pedido.estado.cambiar", [{"n": 1}, {"n": 2}])
+    producer.publish("carrito.agregar", {"n": 3})
+    producer.close()
+    publisher._flush()
+    assert len(channel.published) == 3 and publisher.in_flight == 3
+    assert channel.declared == ["pedido.estado.cambiar", "carrito.agregar"]
+
+
+def test_request_path_fails_fast_when_the_window_is_full(monkeypatch):
+    publisher = ConfirmPublisher(max_in_flight=1, block_seconds=30)
+    publisher._on_channel_open(FakeChannel())
+    monkeypatch.setattr(ConfirmPublisher, "running", property(lambda self: True))
+    monkeypatch.setattr(rabbitmq, "confirm_publisher", publisher)
+    publisher.publish("cola.x", {"n": 1})
+
+    inicio = time.monotonic()
+    with pytest.raises(PublishBackpressureError):
+        publisher.publish("cola.x", {"n": 2}, block=False)
+    assert rabbitmq.RabbitMQProducer().publish_event("auth.login", {"usuarioId": 1}) is False
+    assert time.monotonic() - inicio < 1
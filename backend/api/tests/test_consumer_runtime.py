@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+from app import models
+from app.consumers import consumer_runtime
+from app.consumers.runtime import ConsumerRuntime, decode, keep_latest
+
+
+class RecordingChannel:
+    def __init__(self):
+        self.published = []
+        self.acks = []
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((routing_key, body, properties.headers))
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acks.append((delivery_tag, multiple))
+
+
+def message(accion, **payload):
+    return json.dumps({"requestId": "r", "action": accion, "payload": payload, "meta": {}}).encode()
+
+
+def test_round_is_coalesced_limited_and_settled_with_one_ack():
+    runtime = ConsumerRuntime(prefetch=10, concurrency=2, max_retries=1)
+    vistos, activos, pico = [], [0], [0]
+
+    @runtime.handler("cola.trabajo")
+    async def trabajo(msg):
+        activos[0] += 1
+        pico[0] = max(pico[0], activos[0])
+        await asyncio.sleep(0.01)
+        activos[0] -= 1
+        if msg["payload"]["n"] == 3:
+            raise ValueError("falla")
+        vistos.append(msg["payload"]["n"])
+
+    runtime.register("cola.snapshot", lambda msg: vistos.append(("snap", msg["payload"]["v"])), keep_latest)
+
+    deliveries = [decode("cola.trabajo", tag, message("x", n=tag)) for tag in range(1, 6)]
+    deliveries += [decode("cola.snapshot", 6, message("s", v=1)), decode("cola.snapshot", 7, message("s", v=2)),
+                   decode("cola.trabajo", 8, b"no es json"),
+                   decode("cola.trabajo", 9, message("x", n=3), {"x-retries": 1})]
+    failures = asyncio.run(runtime.process(deliveries))
+
+    assert sorted(v for v in vistos if isinstance(v, int)) == [1, 2, 4, 5]
+    assert ("snap", 2) in vistos and ("snap", 1) not in vistos
+    assert pico[0] == 2
+
+    channel = RecordingChannel()
+    runtime.settle(channel, deliveries, failures)
+    destinos = sorted((routing_key, headers["x-retries"]) for routing_key, _, headers in channel.published)
+    assert destinos == [("cola.trabajo", 1), ("cola.trabajo.dlq", 1), ("cola.trabajo.dlq", 2)]
+    assert channel.acks == [(9, True)]
+
+
+def test_carousel_reorder_burst_renumbers_once(db):
+    for i, orden in enumerate([2, 5, 5], start=1):
+        db.add(models.CarruselImagen(id=i, imagen_url=f"/tmp/{i}.png", orden=orden, activo=True))
+    db.commit()
+
+    burst = [decode("carrusel.imagen.reordenar", tag, message("reordenar", ordenes=[])) for tag in range(1, 4)]
+    assert asyncio.run(consumer_runtime.process(burst)) == []
+
+    db.expire_all()
+    assert [img.orden for img in db.query(models.CarruselImagen).order_by(models.CarruselImagen.id)] == [1, 2, 3]
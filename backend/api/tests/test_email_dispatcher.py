@@ -0,0 +1,101 @@
+import socketserver
+import threading
+from datetime import datetime
+from email import message_from_bytes, policy
+
+from app.consumers.email_dispatcher import EmailDispatcher, SMTPTransport, parse, render
+from app.events import EmailVerificationEvent
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Bare-bones SMTP server: records sessions and delivered messages, rejects 'rebota@' recipients"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.sessions = 0
+        self.delivered = []
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.sessions += 1
+        self.reply("220 stand-in")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            verb = line[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 stand-in")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                if "rebota@" in line:
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(line.split("<")[1].rstrip(">"))
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk == b".\r\n":
+                        break
+                    data += chunk
+                self.server.delivered.append((recipients, message_from_bytes(data, policy=policy.default)))
+                self.reply("250 OK")
+            elif verb == "RSET":
+                self.reply("250 OK")
+            else:
+                self.reply("221 Bye")
+                return
+
+
+def event(email, codigo):
+    return EmailVerificationEvent(usuarioId=1, email=email, nombre="Ana", codigo=codigo,
+                                  expiraEn=datetime(2025, 6, 1, 12, 10))
+
+
+def test_batch_is_coalesced_and_sent_over_one_session():
+    server = SMTPStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        transport = SMTPTransport(host="127.0.0.1", port=server.server_address[1], user="", password="")
+        dispatcher = EmailDispatcher(transport=transport, dedupe_seconds=60)
+
+        batch = [event("ana@example.com", "111111"), event("luis@example.com", "222222"),
+                 event("Ana@Example.com", "333333"), event("rebota@example.com", "444444"),
+                 event("luis@example.com", "222222")]
+        assert dispatcher.dispatch(batch, now=1000) == 2
+        assert server.sessions == 1
+        assert sorted(r[0] for r, _ in server.delivered) == ["Ana@example.com", "luis@example.com"]
+        ana = next(m for r, m in server.delivered if r == ["Ana@example.com"])
+        assert "333333" in ana.get_body(("plain",)).get_content()
+
+        # Resend of a code just delivered: dropped without opening a session
+        assert dispatcher.dispatch([event("ana@example.com", "333333")], now=1030) == 0
+        assert server.sessions == 1
+        # ...but a new code, or the same one after the window, goes out
+        assert dispatcher.dispatch([event("ana@example.com", "333333"), event("luis@example.com", "555555")],
+                                   now=1070) == 2
+        assert server.sessions == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert parse(b'{"payload": {"email": "no-es-correo"}}') is None
+    assert parse(b'{"payload": ' + event("ana@example.com", "123456").model_dump_json().encode() + b'}').codigo == "123456"
+
+
+def test_html_part_escapes_the_name():
+    message = render(EmailVerificationEvent(usuarioId=1, email="ana@example.com", nombre="<b>Ana</b> & Co",
+                                            codigo="123456", expiraEn=datetime(2025, 6, 1, 12, 10)))
+    html_part = message.get_body(preferencelist=("html",)).get_content()
+    assert "&lt;b&gt;Ana&lt;/b&gt; &amp; Co" in html_part and "<b>" not in html_part
+    assert "Hola <b>Ana</b> & Co" in message.get_body(preferencelist=("plain",)).get_content()
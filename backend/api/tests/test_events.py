@@ -0,0 +1,38 @@
+import gzip
+
+import orjson
+import pytest
+
+from app import events
+from app.config import settings
+
+
+def test_envelope_validates_and_encodes_by_queue(monkeypatch):
+    message = events.envelope("carrusel.imagen.reordenar", {"ordenes": [{"id": 1, "orden": "2"}]})
+    assert message["action"] == "reordenar" and message["version"] == 1
+    assert message["payload"] == {"ordenes": [{"id": 1, "orden": 2}]}
+    with pytest.raises(ValueError):
+        events.envelope("carrusel.imagen.eliminar", {"id": "uno"})
+    with pytest.raises(events.EventError):
+        events.envelope("cola.inexistente", {})
+
+    monkeypatch.setattr(settings, "EVENT_COMPRESS_MIN_BYTES", 256)
+    grande = events.envelope("carrusel.imagen.reordenar", {"ordenes": [{"id": i, "orden": i} for i in range(50)]})
+    body, content_type, content_encoding = events.encode("carrusel.imagen.reordenar", grande)
+    assert content_encoding == events.ENCODING_GZIP and len(body) < len(orjson.dumps(grande))
+    assert events.decode(body, content_type, content_encoding) == grande
+    assert events.parse("carrusel.imagen.reordenar", grande).ordenes[49].orden == 49
+
+    # Queues read by the TypeScript worker stay plain JSON whatever the settings say
+    monkeypatch.setattr(settings, "EVENT_CONTENT_TYPE", events.CONTENT_TYPE_MSGPACK)
+    pedido = events.envelope("pedido.estado.cambiar", {
+        "pedidoId": 1, "estadoAnterior": "Pendiente", "estadoNuevo": "Enviado", "total": "10.00",
+        "fechaPedido": "2024-05-01T00:00:00", "usuarioId": None, "nota": "x" * 300,
+    })
+    body, content_type, content_encoding = events.encode("pedido.estado.cambiar", pedido)
+    assert (content_type, content_encoding) == (events.CONTENT_TYPE_JSON, None)
+    assert orjson.loads(body)["payload"]["usuarioId"] is None
+
+    # Plain JSON from any producer is still accepted
+    assert events.decode(b'{"payload": {"id": 3}}')["payload"]["id"] == 3
+    assert events.decode(gzip.compress(b'{"a": 1}'), "application/json", "gzip") == {"a": 1}
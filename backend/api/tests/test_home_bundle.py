@@ -0,0 +1,77 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import models
+from app.routers.carousel import router as carousel_router
+from app.routers.categories import router as categories_router
+from app.routers.home_products import router as home_router
+from app.services.cart_service import CartEngine, MemoryCartStore
+from app.services.catalog_service import CatalogService
+from app.utils import rabbitmq_producer
+
+
+def make_client(monkeypatch, db):
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Categoria(id=2, nombre="Gatos"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    db.add(models.Producto(id=1, nombre="Croquetas", precio=12.5, peso_gramos=1000,
+                           cantidad_disponible=10, categoria_id=1, subcategoria_id=1, activo=True))
+    db.add(models.Producto(id=2, nombre="Agotado", precio=3, peso_gramos=200,
+                           cantidad_disponible=0, categoria_id=1, subcategoria_id=1, activo=True))
+    db.add(models.CarruselImagen(id=1, imagen_url="/uploads/1.png", orden=1, activo=True))
+    db.commit()
+
+    monkeypatch.setattr(rabbitmq_producer, "connect", lambda: None)
+    monkeypatch.setattr(rabbitmq_producer, "publish", lambda *a, **k: None)
+    monkeypatch.setattr(rabbitmq_producer, "close", lambda: None)
+    monkeypatch.setattr("app.routers.home_products.cart_engine", CartEngine(MemoryCartStore()))
+    catalog = CatalogService(ttl_seconds=60)
+    for module in ("home_products", "carousel", "categories"):
+        monkeypatch.setattr(f"app.routers.{module}.catalog_service", catalog)
+
+    app = FastAPI()
+    app.include_router(home_router)
+    app.include_router(carousel_router)
+    app.include_router(categories_router)
+    return TestClient(app), catalog
+
+
+def test_bundle_matches_individual_endpoints_and_revalidates(monkeypatch, db):
+    client, catalog = make_client(monkeypatch, db)
+
+    resp = client.get("/api/home/bundle")
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert data["carrusel"] == client.get("/api/admin/carrusel").json()
+    assert data["categorias"] == client.get("/api/admin/categorias").json()
+    assert data["categorias"][1] == {"id": 1, "nombre": "Perros", "subcategorias": [{"id": 1, "nombre": "Alimento"}]}
+    assert data["productos"] == client.get("/api/home/productos").json()
+    assert [p["id"] for p in data["productos"]] == [1] and data["productos"][0]["precio"] == 12.5
+    assert data["carrito"] is None
+
+    # Parts came from the caches the endpoints filled
+    assert catalog.carousel_cache.hits >= 1 and catalog.products_cache.hits >= 1
+    etag = resp.headers["etag"]
+    assert client.get("/api/home/bundle", headers={"If-None-Match": etag}).status_code == 304
+
+    # A carousel write changes the bundle's ETag
+    client.put("/api/admin/carrusel/1", json={"link_url": "https://example.com"})
+    cambiado = client.get("/api/home/bundle", headers={"If-None-Match": etag})
+    assert cambiado.status_code == 200 and cambiado.headers["etag"] != etag
+    assert cambiado.json()["data"]["carrusel"][0]["link_url"] == "https://example.com"
+
+
+def test_bundle_includes_session_cart(monkeypatch, db):
+    client, _ = make_client(monkeypatch, db)
+    client.post("/api/cart/add", json={"producto_id": 1, "cantidad": 2})
+
+    carrito = client.get("/api/home/bundle").json()["data"]["carrito"]
+    assert carrito["items"][0]["producto_id"] == 1 and carrito["total"] == 25.0
+
+
+def test_browse_products_sparse_fields(monkeypatch, db):
+    client, _ = make_client(monkeypatch, db)
+    productos = client.get("/api/home/productos", params={"fields": "nombre,precio"}).json()
+    assert productos == [{"id": 1, "nombre": "Croquetas", "precio": 12.5}]
+    completos = client.get("/api/home/productos").json()
+    assert completos[0]["descripcion"] is None and completos[0]["cantidad_disponible"] == 10
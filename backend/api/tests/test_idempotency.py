@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app import models
+from app.middleware.idempotency import IdempotencyMiddleware, IdempotencyStore
+from app.routers.home_products import router as home_router
+from app.services.cart_service import CartEngine, MemoryCartStore
+from app.utils import rabbitmq_producer
+
+
+def test_cart_add_retry_is_replayed_without_running_again(monkeypatch, db):
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    db.add(models.Producto(id=1, nombre="Croquetas", precio=12.5, peso_gramos=1000,
+                           cantidad_disponible=10, categoria_id=1, subcategoria_id=1, activo=True))
+    db.commit()
+    monkeypatch.setattr(rabbitmq_producer, "connect", lambda: None)
+    monkeypatch.setattr(rabbitmq_producer, "publish", lambda *a, **k: None)
+    monkeypatch.setattr(rabbitmq_producer, "close", lambda: None)
+    monkeypatch.setattr("app.routers.home_products.cart_engine", CartEngine(MemoryCartStore()))
+
+    app = FastAPI()
+    app.include_router(home_router)
+    app.add_middleware(IdempotencyMiddleware, store=IdempotencyStore(ttl_seconds=60))
+    client = TestClient(app)
+
+    headers = {"Idempotency-Key": "add-1", "session-id": "s1"}
+    primero = client.post("/api/cart/add", json={"producto_id": 1, "cantidad": 2}, headers=headers)
+    reintento = client.post("/api/cart/add", json={"producto_id": 1, "cantidad": 2}, headers=headers)
+    assert primero.status_code == reintento.status_code == 200
+    assert reintento.headers["idempotent-replayed"] == "true" and "idempotent-replayed" not in primero.headers
+    assert reintento.content == primero.content
+    assert client.get("/api/cart", headers={"session-id": "s1"}).json()["data"]["items"][0]["cantidad"] == 2
+
+    # Same key from another session is another request; same key with another body is rejected
+    otro = client.post("/api/cart/add", json={"producto_id": 1, "cantidad": 2},
+                       headers={"Idempotency-Key": "add-1", "session-id": "s2"})
+    assert "idempotent-replayed" not in otro.headers
+    distinto = client.post("/api/cart/add", json={"producto_id": 1, "cantidad": 3}, headers=headers)
+    assert distinto.status_code == 422
+    # Without the header nothing changes
+    client.post("/api/cart/add", json={"producto_id": 1, "cantidad": 1}, headers={"session-id": "s1"})
+    assert client.get("/api/cart", headers={"session-id": "s1"}).json()["data"]["items"][0]["cantidad"] == 3
+
+
+def make_app(store):
+    calls = []
+    app = FastAPI()
+
+    @app.post("/lento")
+    async def lento(request: Request):
+        calls.append(await request.body())
+        await asyncio.sleep(0.05)
+        if request.query_params.get("falla"):
+            return JSONResponse(status_code=500, content={"ok": False})
+        return {"llamada": len(calls)}
+
+    app.add_middleware(IdempotencyMiddleware, store=store)
+    return app, calls
+
+
+def test_concurrent_duplicates_wait_for_the_first_request():
+    async def run():
+        store = IdempotencyStore(ttl_seconds=60)
+        app, calls = make_app(store)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            respuestas = await asyncio.gather(*(
+                client.post("/lento", content=b"x", headers={"Idempotency-Key": "k"}) for _ in range(5)
+            ))
+            assert [r.json() for r in respuestas] == [{"llamada": 1}] * 5 and len(calls) == 1
+            assert sum(r.headers.get("idempotent-replayed") == "true" for r in respuestas) == 4
+
+            # Server errors are not stored: the retry runs again
+            for _ in range(2):
+                fallo = await client.post("/lento?falla=1", headers={"Idempotency-Key": "f"})
+                assert fallo.status_code == 500 and "idempotent-replayed" not in fallo.headers
+            assert len(calls) == 3 and len(store) == 1
+
+    asyncio.run(run())
+
+
+def test_multipart_retry_with_new_boundary_matches():
+    async def run():
+        app, calls = make_app(IdempotencyStore(ttl_seconds=60))
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            for _ in range(2):  # httpx draws a fresh boundary per request
+                resp = await client.post("/lento", files={"file": ("a.png", b"png")}, data={"orden": "1"},
+                                         headers={"Idempotency-Key": "upload"})
+                assert resp.status_code == 200
+            assert len(calls) == 1 and resp.headers["idempotent-replayed"] == "true"
+
+    asyncio.run(run())
@@ -0,0 +1,132 @@
+import os
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import app.database as database
+from app import models
+from app.routers.inventory import router as inventory_router
+from app.services.inventory_journal_service import InventoryJournal, inventory_journal
+from app.utils import rabbitmq_producer, security_utils
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    db = session_factory()
+    db.add(models.Categoria(id=1, nombre="Gatos"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Arena"))
+    db.add(models.Producto(id=1, nombre="Arena 10kg", precio=30, peso_gramos=10000,
+                           cantidad_disponible=5, categoria_id=1, subcategoria_id=1, activo=True))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def field(entry, name):
+    # Pending entries are dicts, flushed ones are ORM rows
+    return entry[name] if isinstance(entry, dict) else getattr(entry, name)
+
+
+def movement(journal, anterior, nueva):
+    return journal.append(producto_id=1, cantidad_anterior=anterior, cantidad_nueva=nueva,
+                          tipo_movimiento="REABASTECIMIENTO", referencia=None, usuario_id=None)
+
+
+def test_history_merges_pending_and_flushed_entries(db, tmp_path):
+    journal = InventoryJournal(directory=str(tmp_path), batch_size=100, flush_interval=1, stale_after=60)
+
+    movement(journal, 5, 7)
+    movement(journal, 7, 9)
+    assert journal.flush(db) == 2
+    assert os.listdir(tmp_path) == []
+
+    movement(journal, 9, 12)
+    page = journal.history(db, 1, skip=0, limit=2)
+    assert [field(e, "id") is None for e in page] == [True, False]
+    assert [field(e, "cantidad_nueva") for e in page] == [12, 9]
+
+    page2 = journal.history(db, 1, skip=2, limit=2)
+    assert [e.cantidad_nueva for e in page2] == [7]
+
+
+def test_orphaned_journal_is_replayed_once(db, tmp_path):
+    crashed = InventoryJournal(directory=str(tmp_path), batch_size=100, flush_interval=1, stale_after=0.01)
+    movement(crashed, 5, 6)
+    movement(crashed, 6, 8)
+    # Simulate a crash after the batch was inserted but before the WAL was removed
+    crashed._insert(db, list(crashed._buffer))
+
+    time.sleep(0.05)
+    survivor = InventoryJournal(directory=str(tmp_path), batch_size=100, flush_interval=1, stale_after=0.01)
+    assert survivor.recover(db) == 0
+    assert os.listdir(tmp_path) == []
+    assert db.query(models.InventarioHistorial).count() == 2
+
+
+def test_discarded_movement_is_not_flushed_or_replayed(db, tmp_path):
+    crashed = InventoryJournal(directory=str(tmp_path), batch_size=100, flush_interval=1, stale_after=0.01)
+    movement(crashed, 5, 6)
+    assert crashed.discard(movement(crashed, 6, 8))
+    assert [e["cantidad_nueva"] for e in crashed.pending(1)] == [6]
+
+    time.sleep(0.05)
+    survivor = InventoryJournal(directory=str(tmp_path), batch_size=100, flush_interval=1, stale_after=0.01)
+    assert survivor.recover(db) == 1
+    assert [h.cantidad_nueva for h in db.query(models.InventarioHistorial)] == [6]
+
+
+def test_restock_updates_stock_and_journals_movement(monkeypatch, tmp_path, db):
+    monkeypatch.setattr(rabbitmq_producer, "connect", lambda: None)
+    monkeypatch.setattr(rabbitmq_producer, "publish", lambda *a, **k: None)
+    monkeypatch.setattr(rabbitmq_producer, "close", lambda: None)
+    monkeypatch.setattr(inventory_journal, "directory", str(tmp_path))
+
+    app = FastAPI()
+    app.include_router(inventory_router)
+    client = TestClient(app)
+
+    token = security_utils.create_access_token({"sub": "7"})
+    resp = client.post("/api/admin/productos/1/reabastecer", json={"cantidad": 10},
+                       headers={"Authorization": f"Bearer {token}"})
+    assert resp.status_code == 200, resp.text
+    assert resp.json()["message"] == "Existencias actualizadas exitosamente"
+    assert resp.json()["data"]["cantidad_nueva"] == 15
+
+    history = client.get("/api/admin/productos/1/historial").json()
+    assert history[0]["cantidad_anterior"] == 5
+    assert history[0]["cantidad_nueva"] == 15
+    assert history[0]["id"] is None and history[0]["usuario_id"] == 7
+
+    inventory_journal.flush(db)
+    history = client.get("/api/admin/productos/1/historial").json()
+    assert len(history) == 1 and history[0]["id"] is not None
+
+    missing = client.post("/api/admin/productos/99/reabastecer", json={"cantidad": 1})
+    assert missing.status_code == 404
+    assert missing.json()["message"] == "Producto no encontrado."
+
+
+def test_failed_restock_commit_discards_its_movement(monkeypatch, tmp_path, session_factory):
+    monkeypatch.setattr(inventory_journal, "directory", str(tmp_path))
+
+    def failing_db():
+        db = session_factory()
+        def commit():
+            raise RuntimeError("conexión perdida")
+        db.commit = commit
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app = FastAPI()
+    app.include_router(inventory_router)
+    app.dependency_overrides[database.get_db] = failing_db
+    resp = TestClient(app).post("/api/admin/productos/1/reabastecer", json={"cantidad": 10})
+    assert resp.status_code == 500
+    assert inventory_journal.pending(1) == []
+    db = session_factory()
+    assert db.get(models.Producto, 1).cantidad_disponible == 5
+    db.close()
@@ -0,0 +1,92 @@
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import models
+from app.routers.inventory import router as inventory_router
+from app.services.inventory_journal_service import InventoryJournal, inventory_journal
+from app.services.inventory_stats_service import inventory_stats_service
+from app.services.reservation_service import ReservationService
+from app.utils import rabbitmq_producer
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    db = session_factory()
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    for pid in (1, 2):
+        db.add(models.Producto(id=pid, nombre=f"Producto {pid}", precio=10, peso_gramos=1000,
+                               cantidad_disponible=10, categoria_id=1, subcategoria_id=1, activo=True))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def test_aggregates_follow_journal_and_reservations(tmp_path, db):
+    journal = InventoryJournal(directory=str(tmp_path), batch_size=100, flush_interval=1, stale_after=60)
+    journal.append(producto_id=1, cantidad_anterior=10, cantidad_nueva=15,
+                   tipo_movimiento="REABASTECIMIENTO", referencia=None, usuario_id=None)
+    entries = list(journal._buffer)
+    assert journal.flush(db) == 1
+    # Replaying the same batch must not double count
+    assert journal._insert(db, entries) == 0
+
+    ReservationService(batch_size=10).hold(db, "carrito-1", [(1, 3), (2, 4)])
+
+    # Reservations move cantidad_disponible but are not counted as stock movements
+    resumen = db.get(models.InventarioResumen, 1)
+    assert (resumen.total_movimientos, resumen.unidades_entrada, resumen.unidades_salida) == (1, 5, 0)
+    assert resumen.ultimo_reabastecimiento == entries[0]["fecha"]
+    assert db.get(models.InventarioResumen, 2) is None
+    assert db.query(models.InventarioHistorial).filter_by(tipo_movimiento="RESERVA").count() == 2
+
+    db.expire_all()
+    assert inventory_stats_service.rebuild(db) == 1
+    r = db.get(models.InventarioResumen, 1)
+    assert (r.total_movimientos, r.unidades_entrada, r.unidades_salida) == (1, 5, 0)
+    assert db.get(models.InventarioResumen, 2) is None
+
+
+def test_rebuild_includes_archived_history(db):
+    fecha = datetime(2024, 1, 10)
+    db.add(models.InventarioHistorialArchivo(id=1, producto_id=1, cantidad_anterior=0, cantidad_nueva=10,
+                                             tipo_movimiento="REABASTECIMIENTO", fecha=fecha))
+    db.add(models.InventarioHistorial(producto_id=1, cantidad_anterior=10, cantidad_nueva=8,
+                                      tipo_movimiento="VENTA", fecha=datetime(2025, 3, 1)))
+    db.commit()
+
+    assert inventory_stats_service.rebuild(db) == 1
+    resumen = db.get(models.InventarioResumen, 1)
+    assert (resumen.total_movimientos, resumen.unidades_entrada, resumen.unidades_salida) == (2, 10, 2)
+    assert resumen.ultimo_reabastecimiento == fecha
+
+
+def test_stock_endpoints_include_unflushed_movements(monkeypatch, tmp_path, db):
+    monkeypatch.setattr(rabbitmq_producer, "connect", lambda: None)
+    monkeypatch.setattr(rabbitmq_producer, "publish", lambda *a, **k: None)
+    monkeypatch.setattr(rabbitmq_producer, "close", lambda: None)
+    monkeypatch.setattr(inventory_journal, "directory", str(tmp_path))
+
+    app = FastAPI()
+    app.include_router(inventory_router)
+    client = TestClient(app)
+
+    assert client.post("/api/admin/productos/1/reabastecer", json={"cantidad": 4}).status_code == 200
+
+    stock = client.get("/api/admin/productos/1/stock").json()["data"]
+    assert stock["cantidad_disponible"] == 14
+    assert stock["total_movimientos"] == 1
+    assert stock["ultimo_reabastecimiento"] is not None
+
+    inventory_journal.flush(db)
+    batch = client.post("/api/admin/productos/stock/batch", json={"producto_ids": [2, 1, 99]}).json()
+    assert [s["producto_id"] for s in batch["data"]] == [2, 1]
+    assert batch["data"][1]["total_movimientos"] == 1
+    assert batch["data"][1]["unidades_entrada"] == 4
+    assert batch["faltantes"] == [99]
+
+    missing = client.get("/api/admin/productos/99/stock")
+    assert missing.status_code == 404
@@ -0,0 +1,85 @@
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func, select
+
+from app import models
+from app.routers.orders import router as orders_router
+from app.utils import rabbitmq_producer
+
+
+@pytest.fixture
+def session_factory(session_factory, add_user):
+    db = session_factory()
+    add_user(db)
+    for i in range(1, 7):
+        db.add(models.Pedido(id=i, usuario_id=1, estado="Entregado" if i == 6 else "Pendiente", total=10,
+                             direccion_entrega="Calle 1 # 2-3", telefono_contacto="3001234567",
+                             fecha_creacion=datetime(2024, 5, i)))
+    db.commit()
+    return session_factory
+
+
+def make_client(monkeypatch):
+    published = []
+    monkeypatch.setattr(rabbitmq_producer, "connect", lambda: published.append("connect"))
+    monkeypatch.setattr(rabbitmq_producer, "publish_batch", lambda queue, messages, **k: published.append((queue, messages)))
+    monkeypatch.setattr(rabbitmq_producer, "close", lambda: None)
+    app = FastAPI()
+    app.include_router(orders_router)
+    return TestClient(app), published
+
+
+def test_bulk_transition_is_set_based_with_per_order_results(monkeypatch, engine, db):
+    client, published = make_client(monkeypatch)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    response = client.post("/api/admin/pedidos/estado/lote", json={
+        "pedido_ids": [1, 2, 3, 4, 5, 6, 99], "estado": "Enviado", "nota": "Despacho del día",
+    })
+    body = response.json()["data"]
+    assert (body["actualizados"], body["fallidos"]) == (5, 2)
+    assert [r["exito"] for r in body["resultados"]] == [True] * 5 + [False, False]
+    assert body["resultados"][5]["message"] == "Transición de estado no permitida."
+    assert body["resultados"][6]["message"] == "Pedido no encontrado."
+
+    # read + update + history insert + stats upserts, independent of the batch size
+    assert len([s for s in statements if s.startswith('UPDATE "Pedidos"')]) == 1
+    assert len([s for s in statements if s.startswith('INSERT INTO "PedidosHistorialEstado"')]) == 1
+
+    assert published[0] == "connect" and len(published) == 2
+    queue, messages = published[1]
+    assert queue == "pedido.estado.cambiar" and len(messages) == 5
+    assert {m["payload"]["pedidoId"] for m in messages} == {1, 2, 3, 4, 5}
+
+    assert db.scalar(select(func.count()).select_from(models.PedidoHistorialEstado)) == 5
+    assert db.scalar(select(func.count()).where(models.Pedido.estado == "Enviado")) == 5
+    enviados = db.scalar(select(func.sum(models.PedidoEstadistica.cantidad))
+                         .where(models.PedidoEstadistica.estado == "Enviado"))
+    assert enviados == 5
+
+
+def test_bulk_transition_reports_orders_changed_concurrently(monkeypatch, engine, db):
+    client, published = make_client(monkeypatch)
+
+    def cancel_first(conn, cursor, statement, parameters, context, executemany):
+        # Another admin cancels order 2 between the read and the UPDATE
+        if statement.startswith('UPDATE "Pedidos"'):
+            cursor.execute("UPDATE \"Pedidos\" SET estado = 'Cancelado' WHERE id = 2")
+    event.listen(engine, "before_cursor_execute", cancel_first)
+
+    body = client.post("/api/admin/pedidos/estado/lote", json={
+        "pedido_ids": [1, 2, 3], "estado": "Enviado",
+    }).json()["data"]
+    event.remove(engine, "before_cursor_execute", cancel_first)
+    assert (body["actualizados"], body["fallidos"]) == (2, 1)
+    assert [r["exito"] for r in body["resultados"]] == [True, False, True]
+    assert body["resultados"][1]["message"] == "El pedido cambió de estado durante la operación."
+
+    queue, messages = published[1]
+    assert {m["payload"]["pedidoId"] for m in messages} == {1, 3}
+    assert db.get(models.Pedido, 2).estado == "Cancelado"
+    assert db.scalars(select(models.PedidoHistorialEstado.pedido_id)).all() == [1, 3]
@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import models
+from app.routers.orders import router as orders_router
+from app.services.order_export_service import OrderExportService
+
+
+@pytest.fixture
+def session_factory(session_factory, add_user):
+    db = session_factory()
+    add_user(db)
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    db.add(models.Producto(id=1, nombre="Croquetas", precio=10, peso_gramos=1000,
+                           cantidad_disponible=10, categoria_id=1, subcategoria_id=1, activo=True))
+    fechas = [datetime(2024, 2, 29, 23, 59), datetime(2024, 3, 1, 0, 0), datetime(2024, 3, 15, 12),
+              datetime(2024, 3, 31, 23, 59, 59), datetime(2024, 4, 1, 0, 0)]
+    for i, fecha in enumerate(fechas, start=1):
+        db.add(models.Pedido(id=i, usuario_id=1, estado="Pendiente", total=10 * i,
+                             direccion_entrega="Calle 1 # 2-3", telefono_contacto="3001234567", fecha_creacion=fecha))
+        for _ in range(i):
+            db.add(models.PedidoItem(pedido_id=i, producto_id=1, cantidad=1, precio_unitario=10))
+    db.add(models.Pedido(id=6, usuario_id=1, estado="Cancelado", total=0, direccion_entrega="Calle 1 # 2-3",
+                         telefono_contacto="3001234567", fecha_creacion=datetime(2024, 3, 10)))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def test_export_streams_range_as_csv_and_jsonl(monkeypatch, session_factory):
+    monkeypatch.setattr("app.routers.orders.order_export_service", OrderExportService(chunk_size=2))
+    app = FastAPI()
+    app.include_router(orders_router)
+    client = TestClient(app)
+    rango = {"desde": "2024-03-01", "hasta": "2024-03-31"}
+
+    response = client.get("/api/admin/pedidos/exportar", params=rango)
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "pedidos_2024-03-01_2024-03-31.csv" in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [int(r["pedido_id"]) for r in rows] == [2, 2, 6, 3, 3, 3, 4, 4, 4, 4]
+    assert rows[2]["producto_id"] == ""
+    assert rows[0]["producto"] == "Croquetas" and rows[0]["subtotal"] == "10.00"
+
+    response = client.get("/api/admin/pedidos/exportar", params=dict(rango, formato="jsonl", estado="Pendiente"))
+    pedidos = [json.loads(line) for line in response.text.splitlines()]
+    assert [p["id"] for p in pedidos] == [2, 3, 4]
+    assert [len(p["items"]) for p in pedidos] == [2, 3, 4]
+    assert pedidos[1]["total"] == "30.00"
+
+    assert client.get("/api/admin/pedidos/exportar",
+                      params={"desde": "2024-04-01", "hasta": "2024-03-01"}).status_code == 400
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import models
+from app.middleware.error_handler import setup_error_handlers
+from app.routers.admin_users import router as admin_users_router
+from app.routers.orders import router as orders_router
+
+
+@pytest.fixture
+def session_factory(session_factory, add_user):
+    db = session_factory()
+    add_user(db)
+    add_user(db, id=2, nombre_completo="Luis Gómez", email="luis@example.com", cedula="7654321")
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    db.add(models.Producto(id=1, nombre="Croquetas", precio=10, peso_gramos=1000,
+                           cantidad_disponible=10, categoria_id=1, subcategoria_id=1, activo=True))
+    base = datetime(2024, 1, 1)
+    for i in range(1, 31):
+        db.add(models.Pedido(id=i, usuario_id=1, estado="Pendiente" if i % 2 else "Enviado", total=0,
+                             direccion_entrega="Calle 1 # 2-3", telefono_contacto="3001234567",
+                             fecha_creacion=base + timedelta(days=i)))
+        db.add(models.PedidoItem(pedido_id=i, producto_id=1, cantidad=i, precio_unitario=10))
+        db.add(models.PedidoItem(pedido_id=i, producto_id=1, cantidad=1, precio_unitario=2.5))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def test_order_pages_take_two_queries(engine, session_factory):
+    app = FastAPI()
+    app.include_router(orders_router)
+    app.include_router(admin_users_router)
+    client = TestClient(app)
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    page = client.get("/api/admin/pedidos", params={"limit": 25}).json()
+    assert len(statements) == 2
+    assert [p["id"] for p in page[:2]] == [30, 29]
+    assert page[0]["total"] == 302.5
+    assert len(page[0]["items"]) == 2
+
+    filtered = client.get("/api/admin/pedidos", params={"estado": "Enviado", "limit": 100}).json()
+    assert len(filtered) == 15 and all(p["estado"] == "Enviado" for p in filtered)
+
+    assert client.get("/api/admin/pedidos/3").json()["total"] == 32.5
+    assert client.get("/api/admin/pedidos/99").status_code == 404
+
+    assert len(client.get("/api/admin/usuarios/1/pedidos", params={"skip": 20}).json()) == 10
+    assert client.get("/api/admin/usuarios/2/pedidos").json() == []
+    assert client.get("/api/admin/usuarios/3/pedidos").status_code == 404
+
+
+def test_sparse_fieldsets_shrink_select_and_payload(engine, session_factory):
+    app = FastAPI()
+    setup_error_handlers(app)
+    app.include_router(orders_router)
+    app.include_router(admin_users_router)
+    client = TestClient(app)
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    page = client.get("/api/admin/pedidos", params={"fields": "estado", "limit": 2}).json()
+    assert page == [{"id": 30, "estado": "Enviado"}, {"id": 29, "estado": "Pendiente"}]
+    # No items query and no total subquery
+    assert len(statements) == 1 and "PedidoItems" not in statements[0]
+
+    page = client.get("/api/admin/usuarios/1/pedidos", params={"fields": "total,items", "limit": 1}).json()
+    assert page[0]["total"] == 302.5 and set(page[0]) == {"id", "total", "items"}
+
+    statements.clear()
+    usuarios = client.get("/api/admin/usuarios", params={"fields": "email"}).json()
+    assert sorted(u["email"] for u in usuarios) == ["ana@example.com", "luis@example.com"]
+    assert set(usuarios[0]) == {"id", "email"}
+    assert "password_hash" not in statements[0] and "cedula" not in statements[0]
+
+    invalido = client.get("/api/admin/pedidos", params={"fields": "estado,secreto"})
+    assert invalido.status_code == 422
+    assert "secreto" in invalido.json()["errors"][0]["message"]
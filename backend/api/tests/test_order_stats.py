@@ -0,0 +1,90 @@
+from datetime import date, datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, select
+
+from app import models
+from app.routers.orders import router as orders_router
+from app.services.order_stats_service import order_stats_service
+from app.utils import rabbitmq_producer
+
+
+@pytest.fixture
+def session_factory(session_factory, add_user):
+    db = session_factory()
+    add_user(db)
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    db.add(models.Producto(id=1, nombre="Croquetas", precio=10, peso_gramos=1000,
+                           cantidad_disponible=10, categoria_id=1, subcategoria_id=1, activo=True))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def make_client(monkeypatch):
+    published = []
+    monkeypatch.setattr(rabbitmq_producer, "connect", lambda: None)
+    monkeypatch.setattr(rabbitmq_producer, "publish", lambda queue, message: published.append((queue, message)))
+    monkeypatch.setattr(rabbitmq_producer, "close", lambda: None)
+    app = FastAPI()
+    app.include_router(orders_router)
+    return TestClient(app), published
+
+
+def place_orders(db, *totales):
+    """Pendiente orders created outside this API, picked up by the reconciliation job"""
+    ahora = datetime.utcnow()
+    for pedido_id, total in enumerate(totales, 1):
+        db.add(models.Pedido(id=pedido_id, usuario_id=1, estado="Pendiente", total=total,
+                             direccion_entrega="Calle 10 # 20-30", telefono_contacto="3001234567",
+                             fecha_creacion=ahora, fecha_actualizacion=ahora))
+    db.commit()
+    order_stats_service.reconcile(db)
+    return range(1, len(totales) + 1)
+
+
+def test_counters_follow_transitions(monkeypatch, engine, db):
+    client, published = make_client(monkeypatch)
+    primero, segundo = place_orders(db, 20, 30)
+
+    assert client.put(f"/api/admin/pedidos/{primero}/estado", json={"estado": "Enviado"}).status_code == 200
+    assert client.put(f"/api/admin/pedidos/{segundo}/estado", json={"estado": "Cancelado"}).status_code == 200
+    assert client.put(f"/api/admin/pedidos/{segundo}/estado", json={"estado": "Enviado"}).status_code == 400
+    assert client.put("/api/admin/pedidos/99/estado", json={"estado": "Enviado"}).status_code == 404
+    assert [q for q, _ in published if q.startswith("pedido.")] == ["pedido.estado.cambiar", "pedido.estado.cambiar"]
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    data = client.get("/api/admin/pedidos/estadisticas").json()["data"]
+    assert all("PedidosEstadisticas" in s and "FROM Pedidos " not in s for s in statements)
+    assert data["por_estado"] == {
+        "Enviado": {"cantidad": 1, "ingresos": 20.0},
+        "Cancelado": {"cantidad": 1, "ingresos": 30.0},
+    }
+    assert data["ingresos_por_dia"] == [
+        {"dia": datetime.utcnow().date().isoformat(), "pedidos": 1, "ingresos": 20.0},
+    ]
+
+    historial = db.execute(select(models.PedidoHistorialEstado.estado_nuevo)
+                           .where(models.PedidoHistorialEstado.pedido_id == primero)
+                           .order_by(models.PedidoHistorialEstado.id)).scalars().all()
+    assert historial == ["Enviado"]
+
+
+def test_reconcile_rebuilds_drifted_counters(monkeypatch, db):
+    client, _ = make_client(monkeypatch)
+    db.add(models.Pedido(id=1, usuario_id=1, estado="Entregado", total=50, direccion_entrega="Calle 1 # 2-3",
+                         telefono_contacto="3001234567", fecha_creacion=datetime(2024, 3, 1, 15, 30)))
+    db.add(models.Pedido(id=2, usuario_id=1, estado="Entregado", total=25, direccion_entrega="Calle 1 # 2-3",
+                         telefono_contacto="3001234567", fecha_creacion=datetime(2024, 3, 1, 9, 0)))
+    db.add(models.PedidoEstadistica(dia=date(2024, 3, 1), estado="Pendiente", cantidad=7, ingresos=1))
+    db.commit()
+
+    assert order_stats_service.reconcile(db) == 1
+    data = client.get("/api/admin/pedidos/estadisticas",
+                      params={"desde": "2024-02-01", "hasta": "2024-03-31"}).json()["data"]
+    assert data["por_estado"] == {"Entregado": {"cantidad": 2, "ingresos": 75.0}}
+    assert data["ingresos_por_dia"] == [{"dia": "2024-03-01", "pedidos": 2, "ingresos": 75.0}]
@@ -0,0 +1,96 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.dialects import mssql, postgresql
+
+from app import models
+from app.middleware.error_handler import setup_error_handlers
+from app.middleware.rate_limiting import MemoryRateLimitBackend, SQLRateLimitBackend
+from app.routers.auth import router as auth_router
+from app.utils import rabbitmq_producer, security_utils
+
+
+def test_memory_backend_sliding_window():
+    backend = MemoryRateLimitBackend()
+    for i in range(3):
+        assert backend.attempt("k", 3, 60, now=100 + i).allowed
+    blocked = backend.attempt("k", 3, 60, now=110)
+    assert not blocked.allowed
+    assert blocked.retry_after == 50
+    # The first hit slides out of the window
+    assert backend.attempt("k", 3, 60, now=161).allowed
+    backend.reset("k")
+    assert backend.peek("k", 3, 60, now=161).remaining == 3
+
+
+def test_sql_backend_shares_counters_between_instances(session_factory, db):
+    replica_a = SQLRateLimitBackend(session_factory)
+    replica_b = SQLRateLimitBackend(session_factory)
+
+    assert replica_a.attempt("restock:1", 2, 3600, now=7200).allowed
+    assert replica_b.attempt("restock:1", 2, 3600, now=7201).allowed
+    assert not replica_a.attempt("restock:1", 2, 3600, now=7202).allowed
+    # 75% of the previous window still overlaps: 2 * 0.75 + 1 > 2
+    assert not replica_b.attempt("restock:1", 2, 3600, now=10800 + 900).allowed
+    # 25% overlaps: 2 * 0.25 + 1 <= 2
+    assert replica_b.attempt("restock:1", 2, 3600, now=10800 + 2700).allowed
+
+    assert db.get(models.RateLimitCounter, ("restock:1", 2)).contador == 2
+
+
+def test_sql_backend_counter_upsert_per_dialect():
+    for dialect, expected in ((postgresql.dialect(), ("ON CONFLICT", "RETURNING")),
+                              (mssql.dialect(), ("MERGE", "OUTPUT inserted.contador"))):
+        statements = []
+        def execute(stmt, params=None):
+            statements.append(str(stmt.compile(dialect=dialect)))
+            return SimpleNamespace(all=lambda: [SimpleNamespace(contador=3)])
+        db = SimpleNamespace(bind=SimpleNamespace(dialect=dialect), execute=execute)
+
+        assert SQLRateLimitBackend._increment(db, "login:ana", 5, 1, datetime(2024, 1, 1)) == 3
+        assert len(statements) == 1 and all(part in statements[0] for part in expected)
+
+
+def test_lockout_runs_from_the_locking_failure_for_failures_spread_over_the_window(session_factory):
+    # Failures at 0-3 min and 14 min: the 5th locks for the full 15 min, not until the 1st slides out
+    for backend in (MemoryRateLimitBackend(), SQLRateLimitBackend(session_factory)):
+        base = 9000
+        for offset in (0, 60, 120, 180):
+            assert not backend.record("login:ana", 900, now=base + offset, lock_after=5, lockout_seconds=900)
+        assert backend.peek("login:ana", 5, 900, now=base + 600).allowed
+        assert backend.record("login:ana", 900, now=base + 840, lock_after=5, lockout_seconds=900)
+
+        locked = backend.peek("login:ana", 5, 900, now=base + 900)
+        assert not locked.allowed and locked.retry_after == 840
+        assert not backend.attempt("login:ana", 5, 900, now=base + 1700).allowed
+        assert backend.peek("login:ana", 5, 900, now=base + 1741).allowed
+
+
+def test_login_locks_account_after_max_failures(monkeypatch, db, add_user):
+    monkeypatch.setattr(rabbitmq_producer, "connect", lambda: None)
+    monkeypatch.setattr(rabbitmq_producer, "publish", lambda *a, **k: None)
+    monkeypatch.setattr(rabbitmq_producer, "close", lambda: None)
+    monkeypatch.setattr("app.routers.auth.rate_limiter", MemoryRateLimitBackend())
+    add_user(db, password_hash=security_utils.hash_password("Secreta123!"))
+    db.commit()
+
+    app = FastAPI()
+    setup_error_handlers(app)
+    app.include_router(auth_router)
+    client = TestClient(app)
+
+    ok = client.post("/api/auth/login", json={"email": "ana@example.com", "password": "Secreta123!"})
+    assert ok.status_code == 200, ok.text
+    assert ok.json()["message"] == "Inicio de sesión exitoso"
+    assert "refresh_token" in ok.cookies
+
+    for _ in range(5):
+        bad = client.post("/api/auth/login", json={"email": "ana@example.com", "password": "Incorrecta1!"})
+        assert bad.status_code == 401
+        assert bad.json()["message"] == "Correo o contraseña incorrectos"
+
+    locked = client.post("/api/auth/login", json={"email": "ana@example.com", "password": "Secreta123!"})
+    assert locked.status_code == 423
+    assert int(locked.headers["Retry-After"]) > 0
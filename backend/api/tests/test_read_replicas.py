@@ -0,0 +1,70 @@
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+import app.database as database
+from app.database import Base, get_db, get_read_db
+from app import models
+from app.middleware.read_your_writes import ReadYourWritesMiddleware
+
+
+def sqlite_file(path, cantidad):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Local = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = Local()
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    db.add(models.Producto(id=1, nombre="Croquetas", precio=10, peso_gramos=1000,
+                           cantidad_disponible=cantidad, categoria_id=1, subcategoria_id=1, activo=True))
+    db.commit()
+    db.close()
+    return Local
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware)
+
+    @app.get("/stock")
+    def leer(db: Session = Depends(get_read_db)):
+        return {"cantidad": db.get(models.Producto, 1).cantidad_disponible}
+
+    @app.post("/stock")
+    def escribir(db: Session = Depends(get_db)):
+        db.get(models.Producto, 1).cantidad_disponible += 5
+        db.commit()
+        return {"status": "success"}
+
+    return app
+
+
+def test_reads_go_to_replica_except_for_recent_writers(monkeypatch, tmp_path):
+    primary = sqlite_file(tmp_path / "primary.db", 10)
+    replica = sqlite_file(tmp_path / "replica.db", 10)  # never caught up: stands in for lag
+    monkeypatch.setattr(database, "SessionLocal", primary)
+    monkeypatch.setattr(database, "ReadSessionLocals", [replica])
+    monkeypatch.setattr(database, "read_your_writes", database.ReadYourWrites())
+    app = make_app()
+
+    escritor = TestClient(app)
+    assert escritor.get("/stock").json() == {"cantidad": 10}
+    resp = escritor.post("/stock")
+    assert database.READ_YOUR_WRITES_COOKIE in resp.cookies
+    # The writer reads its own write from the primary; everyone else stays on the replica
+    assert escritor.get("/stock").json() == {"cantidad": 15}
+    assert TestClient(app).get("/stock").json() == {"cantidad": 10}
+
+    # Without the cookie, the session id still pins the client to the primary
+    anonimo = TestClient(app, headers={"session-id": "abc"})
+    anonimo.post("/stock")
+    anonimo.cookies.clear()
+    assert anonimo.get("/stock").json() == {"cantidad": 20}
+    assert TestClient(app, headers={"session-id": "otro"}).get("/stock").json() == {"cantidad": 10}
+
+
+def test_without_replicas_reads_use_the_primary(monkeypatch, tmp_path):
+    monkeypatch.setattr(database, "SessionLocal", sqlite_file(tmp_path / "primary.db", 7))
+    monkeypatch.setattr(database, "ReadSessionLocals", [])
+    assert TestClient(make_app()).get("/stock").json() == {"cantidad": 7}
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.dialects import mssql
+
+from app import models
+from app.services.reservation_service import (
+    SQL_SERVER_MAX_PARAMS,
+    ReservationService,
+    StockInsuficienteError,
+)
+
+
+@pytest.fixture
+def session_factory(session_factory):
+    db = session_factory()
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    for pid, stock in ((1, 10), (2, 3), (3, 0)):
+        db.add(models.Producto(
+            id=pid, nombre=f"Producto {pid}", precio=10, peso_gramos=500,
+            cantidad_disponible=stock, categoria_id=1, subcategoria_id=1, activo=True,
+        ))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def stock(db, producto_id):
+    db.expire_all()
+    return db.get(models.Producto, producto_id).cantidad_disponible
+
+
+def test_hold_decrements_stock_and_logs_history(db):
+    service = ReservationService(batch_size=1)  # force several batches
+
+    reservado = service.hold(db, "cart-1", [(1, 4), (2, 1), (1, 1)], usuario_id=None)
+
+    assert reservado == {1: 5, 2: 1}
+    assert stock(db, 1) == 5
+    assert stock(db, 2) == 2
+    historial = db.query(models.InventarioHistorial).order_by(models.InventarioHistorial.producto_id).all()
+    assert [(h.producto_id, h.cantidad_anterior, h.cantidad_nueva, h.tipo_movimiento) for h in historial] == [
+        (1, 10, 5, "RESERVA"),
+        (2, 3, 2, "RESERVA"),
+    ]
+
+
+def test_hold_is_idempotent_per_key(db):
+    service = ReservationService()
+
+    service.hold(db, "cart-1", [(1, 2)])
+    again = service.hold(db, "cart-1", [(1, 2)])
+
+    assert again == {1: 2}
+    assert stock(db, 1) == 8
+    assert db.query(models.InventarioReserva).count() == 1
+
+
+def test_hold_is_all_or_nothing(db):
+    service = ReservationService()
+
+    with pytest.raises(StockInsuficienteError) as exc:
+        service.hold(db, "cart-1", [(1, 2), (2, 5), (3, 1)])
+
+    assert exc.value.producto_ids == [2, 3]
+    assert stock(db, 1) == 10
+    assert db.query(models.InventarioReserva).count() == 0
+    assert db.query(models.InventarioHistorial).count() == 0
+
+
+def test_expired_reservations_are_released_once(db):
+    service = ReservationService()
+    service.hold(db, "cart-1", [(1, 3)], ttl_seconds=60)
+    service.hold(db, "cart-2", [(1, 2), (2, 1)], ttl_seconds=60)
+
+    later = datetime.utcnow() + timedelta(minutes=5)
+    assert service.release_expired(db, now=later) == 3
+    assert service.release_expired(db, now=later) == 0
+
+    assert stock(db, 1) == 10
+    assert stock(db, 2) == 3
+    liberaciones = db.query(models.InventarioHistorial).filter_by(tipo_movimiento="LIBERACION", producto_id=1).order_by(models.InventarioHistorial.id).all()
+    assert [(h.cantidad_anterior, h.cantidad_nueva) for h in liberaciones] == [(5, 8), (8, 10)]
+
+
+def test_hold_moves_only_the_differences_and_survives_expiry(db):
+    service = ReservationService()
+
+    assert service.hold(db, "carrito:u:1", [(1, 4), (2, 1)], ttl_seconds=60) == {1: 4, 2: 1}
+    assert service.hold(db, "carrito:u:1", [(1, 6)], ttl_seconds=60) == {1: 6}
+    assert (stock(db, 1), stock(db, 2)) == (4, 3)
+    with pytest.raises(StockInsuficienteError):
+        service.hold(db, "carrito:u:1", [(1, 6), (2, 4)])
+    assert (stock(db, 1), stock(db, 2)) == (4, 3)
+
+    # Expired lines are held again on the next change
+    assert service.release_expired(db, now=datetime.utcnow() + timedelta(minutes=5)) == 1
+    assert stock(db, 1) == 10
+    service.hold(db, "carrito:u:1", [(1, 5)])
+    assert stock(db, 1) == 5
+    assert db.query(models.InventarioReserva).filter_by(clave="carrito:u:1").count() == 2
+
+    service.hold(db, "carrito:u:1", [])
+    assert stock(db, 1) == 10
+    movimientos = [h.tipo_movimiento for h in db.query(models.InventarioHistorial).filter_by(producto_id=1)]
+    assert movimientos == ["RESERVA", "RESERVA", "LIBERACION", "RESERVA", "LIBERACION"]
+
+
+def test_reserving_update_fits_sql_server_parameter_limit():
+    service = ReservationService(batch_size=500)
+    assert service.batch_size < 500
+    lote = {pid: 1 for pid in range(1, service.batch_size + 1)}
+    for reserve in (True, False):
+        compiled = ReservationService._delta_statement(lote, reserve).compile(
+            dialect=mssql.dialect(paramstyle="qmark"), compile_kwargs={"render_postcompile": True},
+        )
+        assert len(compiled.positiontup) <= SQL_SERVER_MAX_PARAMS
@@ -0,0 +1,55 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import List, Optional
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from app import models
+from app.schemas import CarruselImagenResponse
+from app.utils.serialization import ORJSONResponse, orm_response, serializer_for
+
+
+def imagen(i):
+    return models.CarruselImagen(id=i, imagen_url=f"/uploads/{i}.png", orden=i, link_url=None, activo=True,
+                                 created_at=datetime(2024, 5, 1, 12, 30, i, 1500, tzinfo=timezone.utc))
+
+
+def test_orm_response_matches_response_model_output():
+    app = FastAPI(default_response_class=ORJSONResponse)
+    rows = [imagen(1), imagen(2)]
+
+    @app.get("/modelo", response_model=List[CarruselImagenResponse])
+    def por_modelo():
+        return rows
+
+    @app.get("/rapido", response_model=List[CarruselImagenResponse])
+    def rapido():
+        return orm_response(CarruselImagenResponse, rows)
+
+    client = TestClient(app)
+    esperado = client.get("/modelo")
+    obtenido = client.get("/rapido")
+    assert obtenido.headers["content-type"] == "application/json"
+    assert obtenido.json() == esperado.json()
+    assert obtenido.json()[0]["imagen_url"] == "/uploads/1.png"
+
+
+class Linea(BaseModel):
+    producto_id: int
+    precio: Decimal
+
+
+class Pedido(BaseModel):
+    id: int
+    lineas: List[Linea]
+    nota: Optional[str] = "sin nota"
+
+
+def test_serializer_is_cached_and_handles_nested_rows_and_dicts():
+    assert serializer_for(Pedido) is serializer_for(Pedido)
+    fila = type("Fila", (), {"id": 7, "lineas": [{"producto_id": 1, "precio": Decimal("9.90")}]})()
+    data = serializer_for(Pedido).to_dict(fila)
+    assert data == {"id": 7, "lineas": [{"producto_id": 1, "precio": Decimal("9.90")}], "nota": "sin nota"}
+    assert ORJSONResponse(content=data).body == b'{"id":7,"lineas":[{"producto_id":1,"precio":"9.90"}],"nota":"sin nota"}'
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from app.utils.single_flight import SingleFlight
+
+
+class Loader:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def test_concurrent_misses_share_one_load():
+    async def run():
+        flight = SingleFlight("test", ttl_seconds=60)
+        loader = Loader("valor")
+        values = await asyncio.gather(*(flight.get("k", loader) for _ in range(20)))
+        assert values == ["valor"] * 20 and loader.calls == 1
+        assert await flight.get("k", loader) == "valor" and loader.calls == 1
+        assert flight.misses == 20 and flight.hits == 1
+
+    asyncio.run(run())
+
+
+def test_stale_value_served_while_one_refresh_runs():
+    async def run():
+        flight = SingleFlight("test", ttl_seconds=0, stale_seconds=60)
+        loader = Loader("viejo", "nuevo")
+        assert await flight.get("k", loader) == "viejo"
+        # Expired: both callers get the stale value at once, a single refresh starts
+        assert await asyncio.gather(flight.get("k", loader), flight.get("k", loader)) == ["viejo", "viejo"]
+        await asyncio.sleep(0.05)
+        assert loader.calls == 2 and flight.peek("k") == "nuevo"
+
+    asyncio.run(run())
+
+
+def test_failures_cached_negatively_and_refresh_failure_keeps_stale():
+    async def run():
+        flight = SingleFlight("test", ttl_seconds=60, negative_ttl_seconds=60)
+        loader = Loader(RuntimeError("db caida"), "valor")
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                await flight.get("k", loader)
+        assert loader.calls == 1
+        flight.invalidate("k")
+        assert await flight.get("k", loader) == "valor"
+
+        stale = SingleFlight("test", ttl_seconds=0, stale_seconds=60, negative_ttl_seconds=60)
+        loader = Loader("viejo", RuntimeError("db caida"))
+        assert await stale.get("k", loader) == "viejo"
+        assert await stale.get("k", loader) == "viejo"
+        await asyncio.sleep(0.05)
+        assert await stale.get("k", loader) == "viejo" and loader.calls == 2
+
+    asyncio.run(run())
+
+
+def test_invalidate_discards_load_in_flight():
+    async def run():
+        flight = SingleFlight("test", ttl_seconds=60)
+        loader = Loader("antes", "despues")
+        pending = asyncio.ensure_future(flight.get("k", loader))
+        await asyncio.sleep(0)
+        flight.invalidate()
+        assert await pending == "antes"
+        assert flight.peek("k") is None
+        assert await flight.get("k", loader) == "despues"
+
+    asyncio.run(run())
@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import models
+from app.routers.admin_users import router as admin_users_router
+from app.services.user_search_service import UserSearchService, normalize
+
+
+USUARIOS = [
+    (1, "José Álvarez", "jose.alvarez@example.com", "1000001"),
+    (2, "Ana Pérez", "ana@example.com", "1000002"),
+    (3, "Mariana Peña", "mpena@example.com", "1000003"),
+    (4, "Anabel Ruiz", "anabel@correo.com", "1000004"),
+    (5, "Luis Gómez", "lgomez@example.com", "1000005"),
+]
+
+
+def make_client(db, add_user):
+    base = datetime(2024, 1, 1)
+    for uid, nombre, email, cedula in USUARIOS:
+        add_user(db, id=uid, nombre_completo=nombre, email=email, cedula=cedula,
+                 fecha_registro=base + timedelta(days=uid), updated_at=base + timedelta(days=uid))
+    db.commit()
+    assert UserSearchService(batch_size=2).refresh(db) == 5
+    assert UserSearchService(batch_size=2).refresh(db) == 0
+    app = FastAPI()
+    app.include_router(admin_users_router)
+    return TestClient(app)
+
+
+def ids(response):
+    return [u["id"] for u in response.json()]
+
+
+def test_refresh_reindexes_edited_users(db, add_user):
+    client = make_client(db, add_user)
+    db.get(models.Usuario, 5).nombre_completo = "Luisa Gómez"
+    db.commit()
+
+    assert UserSearchService().refresh(db) == 1
+    assert ids(client.get("/api/admin/usuarios", params={"nombre": "luisa"})) == [5]
+
+
+def test_normalize_folds_accents_case_and_spaces():
+    assert normalize("  JOSÉ   Álvarez ") == "jose alvarez"
+
+
+def test_search_is_accent_insensitive_and_ranked(db, add_user):
+    client = make_client(db, add_user)
+    assert ids(client.get("/api/admin/usuarios", params={"nombre": "pena"})) == [3]
+    assert ids(client.get("/api/admin/usuarios", params={"nombre": "ALVAR"})) == [1]
+    assert ids(client.get("/api/admin/usuarios", params={"cedula": "1000005"})) == [5]
+    # name prefix (Anabel, Ana) ranks above substring (Mariana)
+    assert ids(client.get("/api/admin/usuarios", params={"q": "ana"})) == [4, 2, 3]
+    assert ids(client.get("/api/admin/usuarios", params={"q": "ana@example.com"})) == [2]
+    assert ids(client.get("/api/admin/usuarios", params={"q": "1000003"})) == [3]
+    assert ids(client.get("/api/admin/usuarios", params={"email": "an"})) == [4, 2]
+    assert ids(client.get("/api/admin/usuarios", params={"q": "100%"})) == []
+    assert "password_hash" not in client.get("/api/admin/usuarios").json()[0]
+
+
+def test_keyset_pagination(db, add_user):
+    client = make_client(db, add_user)
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/admin/usuarios", params=params)
+        seen += ids(response)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [5, 4, 3, 2, 1]
+
+    first = client.get("/api/admin/usuarios", params={"q": "ana", "limit": 1})
+    second = client.get("/api/admin/usuarios", params={"q": "ana", "limit": 5,
+                                                       "cursor": first.headers["X-Next-Cursor"]})
+    assert ids(first) + ids(second) == [4, 2, 3]
+    assert client.get("/api/admin/usuarios", params={"cursor": "nope"}).status_code == 400
@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app import models
+from app.routers.admin_users import router as admin_users_router
+from app.services.order_service import order_service
+from app.services.user_stats_service import user_stats_service
+
+
+@pytest.fixture
+def session_factory(session_factory, add_user):
+    db = session_factory()
+    add_user(db)
+    add_user(db, id=2, nombre_completo="Luis Gómez", email="luis@example.com", cedula="7654321")
+    db.add(models.Categoria(id=1, nombre="Perros"))
+    db.add(models.Categoria(id=2, nombre="Gatos"))
+    db.add(models.Subcategoria(id=1, categoria_id=1, nombre="Alimento"))
+    db.add(models.Subcategoria(id=2, categoria_id=2, nombre="Arena"))
+    db.add(models.Producto(id=1, nombre="Croquetas", precio=10, peso_gramos=1000,
+                           cantidad_disponible=50, categoria_id=1, subcategoria_id=1, activo=True))
+    db.add(models.Producto(id=2, nombre="Arena", precio=8, peso_gramos=4000,
+                           cantidad_disponible=50, categoria_id=2, subcategoria_id=2, activo=True))
+    db.commit()
+    db.close()
+    return session_factory
+
+
+def place_orders(db):
+    """Two orders of customer 1 created outside this API, picked up by a rebuild"""
+    direccion, telefono = "Calle 10 # 20-30", "3001234567"
+    for pedido_id, total, fecha, lineas in ((1, 28, datetime(2024, 5, 1), [(1, 2, 10), (2, 1, 8)]),
+                                            (2, 40, datetime(2024, 5, 3), [(2, 5, 8)])):
+        db.add(models.Pedido(id=pedido_id, usuario_id=1, estado="Pendiente", total=total, direccion_entrega=direccion,
+                             telefono_contacto=telefono, fecha_creacion=fecha, fecha_actualizacion=fecha))
+        for producto_id, cantidad, precio in lineas:
+            db.add(models.PedidoItem(pedido_id=pedido_id, producto_id=producto_id, cantidad=cantidad,
+                                     precio_unitario=precio))
+    db.commit()
+    user_stats_service.rebuild(db)
+    order_service.update_status(db, 1, "Enviado")
+    return 1, 2
+
+
+def test_projection_tracks_orders_and_matches_rebuild(engine, db):
+    client = TestClient(FastAPI())
+    client.app.include_router(admin_users_router)
+    primero, segundo = place_orders(db)
+
+    stats = client.get("/api/admin/usuarios/1/stats").json()["data"]
+    assert stats["total_pedidos"] == 2
+    assert stats["total_gastado"] == 68.0
+    assert stats["categoria_preferida"] == "Gatos"
+    assert stats["ultimo_pedido"] == datetime(2024, 5, 3).isoformat()
+
+    order_service.update_status(db, segundo, "Cancelado")
+    stats = client.get("/api/admin/usuarios/1/stats").json()["data"]
+    assert (stats["total_pedidos"], stats["total_gastado"], stats["categoria_preferida"]) == (2, 28.0, "Perros")
+
+    incremental = user_stats_service.stats_for(db, [1])
+    user_stats_service.rebuild(db)
+    assert user_stats_service.stats_for(db, [1]) == incremental
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    batch = client.post("/api/admin/usuarios/stats/batch", json={"usuario_ids": [2, 1, 9]}).json()
+    assert len(statements) == 1
+    assert [s["usuario_id"] for s in batch["data"]] == [2, 1]
+    assert batch["data"][0]["total_pedidos"] == 0 and batch["data"][0]["categoria_preferida"] is None
+    assert batch["faltantes"] == [9]
+    assert client.get("/api/admin/usuarios/9/stats").status_code == 404
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+
+from app import models
+from app.middleware.error_handler import setup_error_handlers
+from app.middleware.rate_limiting import MemoryRateLimitBackend
+from app.routers.auth import router as auth_router
+from app.services.verification_service import (
+    CodeEntry,
+    CodigoExpiradoError,
+    CodigoInvalidoError,
+    DemasiadosIntentosError,
+    MemoryVerificationStore,
+    VerificationService,
+    hash_code,
+)
+from app.utils import rabbitmq_producer
+
+NOW = datetime(2025, 6, 1, 12)
+
+
+def test_store_and_attempt_limit_without_db():
+    store = MemoryVerificationStore(max_entries=2)
+    service = VerificationService(store=store, limiter=MemoryRateLimitBackend(), max_attempts=3)
+    store.put("Ana@Example.com", CodeEntry(1, hash_code("123456"), NOW + timedelta(minutes=10)))
+    store.put("b@example.com", CodeEntry(2, hash_code("000000"), NOW - timedelta(seconds=1)))
+    store.put("c@example.com", CodeEntry(3, hash_code("111111"), NOW + timedelta(minutes=10)))
+    # Bounded: the oldest entry was evicted to make room
+    assert store.get("ana@example.com", NOW) is None
+    assert store.get("b@example.com", NOW) is None
+    assert store.prune(NOW + timedelta(hours=1)) == 1
+
+    entry = CodeEntry(1, hash_code("123456"), NOW + timedelta(minutes=10))
+    for _ in range(3):
+        with pytest.raises(CodigoInvalidoError):
+            service.check("ana@example.com", "654321", entry, NOW)
+    with pytest.raises(DemasiadosIntentosError):
+        service.check("ANA@example.com", "123456", entry, NOW)
+    assert service.check("otra@example.com", "123456", entry, NOW) == 1
+    with pytest.raises(CodigoExpiradoError):
+        service.check("otra@example.com", "123456", entry, NOW + timedelta(minutes=11))
+
+
+def test_register_verify_and_purge(monkeypatch, session_factory):
+    service = VerificationService(store=MemoryVerificationStore(), limiter=MemoryRateLimitBackend(),
+                                  max_attempts=2, batch_size=1)
+    monkeypatch.setattr("app.routers.auth.verification_service", service)
+    published = []
+    monkeypatch.setattr(rabbitmq_producer, "connect", lambda: None)
+    monkeypatch.setattr(rabbitmq_producer, "publish", lambda queue, message: published.append((queue, message)))
+    monkeypatch.setattr(rabbitmq_producer, "close", lambda: None)
+    app = FastAPI()
+    app.include_router(auth_router)
+    setup_error_handlers(app)
+    client = TestClient(app)
+
+    registro = {"nombre_completo": "Ana Pérez", "email": "ana@example.com",
+                "password": "Secreta123!", "cedula": "1234567"}
+    response = client.post("/api/auth/register", json=registro)
+    assert response.status_code == 201
+    assert client.post("/api/auth/register", json=dict(registro, cedula="7654321")).status_code == 409
+    queue, message = published[0]
+    assert queue == "email.verification" and message["payload"]["email"] == "ana@example.com"
+    codigo = message["payload"]["codigo"]
+
+    db = session_factory()
+    assert db.scalar(select(models.UsuarioBusqueda.email_normalizado)) == "ana@example.com"
+    db.close()
+
+    malo = "000000" if codigo != "000000" else "111111"
+    verificar = {"email": "ana@example.com", "code": malo}
+    assert client.post("/api/auth/verify-email", json=verificar).status_code == 400
+    # A restart loses the hot copy; the code is recovered from VerificationCodes
+    service.store = MemoryVerificationStore()
+    response = client.post("/api/auth/verify-email", json=dict(verificar, code=codigo))
+    assert response.status_code == 200
+    assert client.post("/api/auth/verify-email", json=dict(verificar, code=codigo)).status_code == 400
+
+    db = session_factory()
+    assert db.scalar(select(models.Usuario.is_active)) is True
+    for i in range(3):
+        db.add(models.Usuario(id=10 + i, nombre_completo="X", email=f"x{i}@example.com", cedula=f"99{i}",
+                              password_hash="x"))
+        db.add(models.VerificationCode(usuario_id=10 + i, code_hash="h", expira_en=NOW - timedelta(days=1)))
+    db.commit()
+    assert service.purge_expired(db, now=NOW) == 3
+    assert db.scalar(select(func.count()).select_from(models.VerificationCode)) == 1
+    db.close()
@@ -0,0 +1,47 @@
+-- Migration: Inventory reservations
+-- Purpose: Hold stock for carts/checkout with an atomic conditional UPDATE
+--          instead of read-check-write, and audit reservations in InventarioHistorial
+
+USE DistribuidoraDB;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'InventarioReservas')
+BEGIN
+    CREATE TABLE InventarioReservas (
+        id INT PRIMARY KEY IDENTITY(1,1),
+        clave NVARCHAR(100) NOT NULL,
+        producto_id INT NOT NULL,
+        cantidad INT NOT NULL CHECK (cantidad > 0),
+        estado NVARCHAR(20) NOT NULL DEFAULT 'ACTIVA' CHECK (estado IN ('ACTIVA', 'CONFIRMADA', 'LIBERADA')),
+        usuario_id INT NULL,
+        expira_en DATETIME NOT NULL,
+        fecha_creacion DATETIME DEFAULT GETUTCDATE(),
+        CONSTRAINT fk_reserva_producto FOREIGN KEY (producto_id)
+            REFERENCES Productos(id),
+        CONSTRAINT fk_reserva_usuario FOREIGN KEY (usuario_id)
+            REFERENCES Usuarios(id),
+        CONSTRAINT uq_reserva_clave_producto UNIQUE (clave, producto_id)
+    );
+
+    CREATE INDEX idx_reserva_estado_expira ON InventarioReservas(estado, expira_en);
+END
+GO
+
+-- Allow RESERVA / LIBERACION movements in InventarioHistorial
+DECLARE @chk NVARCHAR(256);
+SELECT @chk = cc.name
+FROM sys.check_constraints cc
+WHERE cc.parent_object_id = OBJECT_ID('InventarioHistorial')
+  AND cc.definition LIKE '%tipo_movimiento%';
+
+IF @chk IS NOT NULL AND @chk <> 'chk_inventario_tipo_movimiento'
+BEGIN
+    EXEC('ALTER TABLE InventarioHistorial DROP CONSTRAINT ' + @chk);
+END
+
+IF NOT EXISTS (SELECT 1 FROM sys.check_constraints WHERE name = 'chk_inventario_tipo_movimiento')
+BEGIN
+    ALTER TABLE InventarioHistorial ADD CONSTRAINT chk_inventario_tipo_movimiento
+        CHECK (tipo_movimiento IN ('REABASTECIMIENTO', 'VENTA', 'AJUSTE', 'DEVOLUCION', 'RESERVA', 'LIBERACION'));
+END
+GO
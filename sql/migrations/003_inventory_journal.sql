@@ -0,0 +1,21 @@
+-- Migration: Inventory history journal
+-- Purpose: InventarioHistorial rows are written in batches by the API's write-behind
+--          journal; journal_id lets a replay after a crash skip rows already inserted
+
+USE DistribuidoraDB;
+GO
+
+IF COL_LENGTH('InventarioHistorial', 'journal_id') IS NULL
+BEGIN
+    ALTER TABLE InventarioHistorial ADD journal_id NVARCHAR(32) NULL;
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'idx_inventario_journal')
+CREATE UNIQUE INDEX idx_inventario_journal ON InventarioHistorial(journal_id) WHERE journal_id IS NOT NULL;
+GO
+
+-- History pages are read per product, newest first
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'idx_inventario_producto_fecha')
+CREATE INDEX idx_inventario_producto_fecha ON InventarioHistorial(producto_id, fecha DESC);
+GO
@@ -0,0 +1,20 @@
+-- Migration: Shared rate limit counters
+-- Purpose: Sliding-window counters for restock and login limits shared by all API
+--          replicas (RATE_LIMIT_BACKEND=sql); one row per key and fixed window
+
+USE DistribuidoraDB;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'RateLimitCounters')
+BEGIN
+    CREATE TABLE RateLimitCounters (
+        clave NVARCHAR(200) NOT NULL,
+        ventana INT NOT NULL,
+        contador INT NOT NULL DEFAULT 0,
+        expira_en DATETIME NOT NULL,
+        CONSTRAINT pk_rate_limit_counters PRIMARY KEY (clave, ventana)
+    );
+
+    CREATE INDEX idx_rate_limit_expira ON RateLimitCounters(expira_en);
+END
+GO
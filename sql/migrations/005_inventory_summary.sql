@@ -0,0 +1,33 @@
+-- Migration: Per-product inventory aggregates
+-- Purpose: Last restock, movement count and units in/out per product, updated in the same
+--          transaction as InventarioHistorial so stock snapshots don't aggregate the history
+
+USE DistribuidoraDB;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'InventarioResumen')
+BEGIN
+    CREATE TABLE InventarioResumen (
+        producto_id INT NOT NULL PRIMARY KEY,
+        ultimo_reabastecimiento DATETIME NULL,
+        total_movimientos INT NOT NULL DEFAULT 0,
+        unidades_entrada INT NOT NULL DEFAULT 0,
+        unidades_salida INT NOT NULL DEFAULT 0,
+        fecha_actualizacion DATETIME DEFAULT GETDATE(),
+        CONSTRAINT fk_inventario_resumen_producto FOREIGN KEY (producto_id) REFERENCES Productos(id)
+    );
+
+    -- Backfill from the existing history
+    INSERT INTO InventarioResumen (producto_id, ultimo_reabastecimiento, total_movimientos,
+                                   unidades_entrada, unidades_salida, fecha_actualizacion)
+    SELECT
+        producto_id,
+        MAX(CASE WHEN tipo_movimiento = 'REABASTECIMIENTO' THEN fecha END),
+        COUNT(*),
+        SUM(CASE WHEN cantidad_nueva > cantidad_anterior THEN cantidad_nueva - cantidad_anterior ELSE 0 END),
+        SUM(CASE WHEN cantidad_nueva < cantidad_anterior THEN cantidad_anterior - cantidad_nueva ELSE 0 END),
+        GETDATE()
+    FROM InventarioHistorial
+    GROUP BY producto_id;
+END
+GO
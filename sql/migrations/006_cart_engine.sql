@@ -0,0 +1,44 @@
+-- Migration: Cart engine
+-- Purpose: Carts live in the API's hot tier and are persisted in batches; flushes upsert
+--          CartItems by (cart_id, producto_id). CartSnapshots is the optional shared hot
+--          tier used when several API replicas serve carts (CART_BACKEND=sql)
+
+USE DistribuidoraDB;
+GO
+
+-- Collapse duplicate lines before enforcing one row per product per cart
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'uq_cartitem_cart_producto')
+BEGIN
+    ;WITH duplicados AS (
+        SELECT id, cart_id, producto_id,
+               SUM(cantidad) OVER (PARTITION BY cart_id, producto_id) AS cantidad_total,
+               ROW_NUMBER() OVER (PARTITION BY cart_id, producto_id ORDER BY id) AS n
+        FROM CartItems
+    )
+    UPDATE CartItems SET cantidad = d.cantidad_total
+    FROM CartItems c JOIN duplicados d ON d.id = c.id
+    WHERE d.n = 1;
+
+    ;WITH duplicados AS (
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY cart_id, producto_id ORDER BY id) AS n
+        FROM CartItems
+    )
+    DELETE FROM duplicados WHERE n > 1;
+
+    CREATE UNIQUE INDEX uq_cartitem_cart_producto ON CartItems(cart_id, producto_id);
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'CartSnapshots')
+BEGIN
+    CREATE TABLE CartSnapshots (
+        clave NVARCHAR(120) NOT NULL PRIMARY KEY,
+        datos NVARCHAR(MAX) NOT NULL,
+        version INT NOT NULL DEFAULT 1,
+        sucio_desde DATETIME NULL,
+        fecha_actualizacion DATETIME NOT NULL
+    );
+
+    CREATE INDEX idx_cart_snapshots_sucio ON CartSnapshots(sucio_desde) WHERE sucio_desde IS NOT NULL;
+END
+GO
@@ -0,0 +1,15 @@
+-- Migration: Order listing indexes
+-- Purpose: Order pages sum item totals in SQL and load all items of the page with one
+--          IN query; a covering index keeps both seeks off the base table
+
+USE DistribuidoraDB;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'idx_pedidoitem_pedido_cubre')
+CREATE INDEX idx_pedidoitem_pedido_cubre ON PedidoItems(pedido_id) INCLUDE (producto_id, cantidad, precio_unitario);
+GO
+
+-- Newest-first pages per customer
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'idx_pedido_usuario_fecha')
+CREATE INDEX idx_pedido_usuario_fecha ON Pedidos(usuario_id, fecha_creacion DESC);
+GO
@@ -0,0 +1,25 @@
+-- Migration: Order dashboard counters
+-- Purpose: Order count and revenue per (creation day, estado), adjusted in the same transaction
+--          as order creation and estado transitions so the dashboard never aggregates Pedidos
+
+USE DistribuidoraDB;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'PedidosEstadisticas')
+BEGIN
+    CREATE TABLE PedidosEstadisticas (
+        dia DATE NOT NULL,
+        estado NVARCHAR(50) NOT NULL,
+        cantidad INT NOT NULL DEFAULT 0,
+        ingresos DECIMAL(14, 2) NOT NULL DEFAULT 0,
+        fecha_actualizacion DATETIME DEFAULT GETDATE(),
+        CONSTRAINT pk_pedidos_estadisticas PRIMARY KEY (dia, estado)
+    );
+
+    -- Backfill from the existing orders
+    INSERT INTO PedidosEstadisticas (dia, estado, cantidad, ingresos, fecha_actualizacion)
+    SELECT CAST(fecha_creacion AS DATE), estado, COUNT(*), COALESCE(SUM(total), 0), GETDATE()
+    FROM Pedidos
+    GROUP BY CAST(fecha_creacion AS DATE), estado;
+END
+GO
@@ -0,0 +1,52 @@
+-- Migration: Customer statistics projection
+-- Purpose: Total orders, total spent, last order and preferred category per customer, updated
+--          with each order event so admin profiles don't join Pedidos/PedidoItems/Productos
+
+USE DistribuidoraDB;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'UsuariosEstadisticas')
+BEGIN
+    CREATE TABLE UsuariosEstadisticas (
+        usuario_id INT NOT NULL PRIMARY KEY,
+        total_pedidos INT NOT NULL DEFAULT 0,
+        total_gastado DECIMAL(14, 2) NOT NULL DEFAULT 0,
+        ultimo_pedido DATETIME NULL,
+        categoria_preferida_id INT NULL,
+        fecha_actualizacion DATETIME DEFAULT GETDATE(),
+        CONSTRAINT fk_usuarios_estadisticas_usuario FOREIGN KEY (usuario_id) REFERENCES Usuarios(id),
+        CONSTRAINT fk_usuarios_estadisticas_categoria FOREIGN KEY (categoria_preferida_id) REFERENCES Categorias(id)
+    );
+
+    CREATE TABLE UsuariosCategoriasEstadisticas (
+        usuario_id INT NOT NULL,
+        categoria_id INT NOT NULL,
+        unidades INT NOT NULL DEFAULT 0,
+        CONSTRAINT pk_usuarios_categorias_estadisticas PRIMARY KEY (usuario_id, categoria_id),
+        CONSTRAINT fk_usuarios_categorias_usuario FOREIGN KEY (usuario_id) REFERENCES Usuarios(id),
+        CONSTRAINT fk_usuarios_categorias_categoria FOREIGN KEY (categoria_id) REFERENCES Categorias(id)
+    );
+
+    -- Backfill from the existing orders (cancelled orders count as placed, not as spent)
+    INSERT INTO UsuariosEstadisticas (usuario_id, total_pedidos, total_gastado, ultimo_pedido, fecha_actualizacion)
+    SELECT usuario_id, COUNT(*), COALESCE(SUM(CASE WHEN estado <> 'Cancelado' THEN total ELSE 0 END), 0),
+           MAX(fecha_creacion), GETDATE()
+    FROM Pedidos
+    GROUP BY usuario_id;
+
+    INSERT INTO UsuariosCategoriasEstadisticas (usuario_id, categoria_id, unidades)
+    SELECT p.usuario_id, pr.categoria_id, SUM(i.cantidad)
+    FROM Pedidos p
+    JOIN PedidoItems i ON i.pedido_id = p.id
+    JOIN Productos pr ON pr.id = i.producto_id
+    WHERE p.estado <> 'Cancelado'
+    GROUP BY p.usuario_id, pr.categoria_id;
+
+    UPDATE s SET categoria_preferida_id = (
+        SELECT TOP 1 c.categoria_id FROM UsuariosCategoriasEstadisticas c
+        WHERE c.usuario_id = s.usuario_id AND c.unidades > 0
+        ORDER BY c.unidades DESC, c.categoria_id
+    )
+    FROM UsuariosEstadisticas s;
+END
+GO
@@ -0,0 +1,36 @@
+-- Migration: Admin user search index
+-- Purpose: Accent-folded, lowercased nombre/email plus a trigram index so admin searches
+--          (prefix and substring) are served from indexes instead of scanning Usuarios.
+--          Rows are filled by the API's user-search-refresh job (Python normalization).
+
+USE DistribuidoraDB;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'UsuariosBusqueda')
+BEGIN
+    CREATE TABLE UsuariosBusqueda (
+        usuario_id INT NOT NULL PRIMARY KEY,
+        nombre_normalizado NVARCHAR(100) NOT NULL,
+        email_normalizado NVARCHAR(100) NOT NULL,
+        fecha_indexado DATETIME NOT NULL,
+        CONSTRAINT fk_usuarios_busqueda_usuario FOREIGN KEY (usuario_id) REFERENCES Usuarios(id) ON DELETE CASCADE
+    );
+
+    CREATE INDEX idx_usuarios_busqueda_nombre ON UsuariosBusqueda(nombre_normalizado);
+    CREATE INDEX idx_usuarios_busqueda_email ON UsuariosBusqueda(email_normalizado);
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'UsuariosTrigramas')
+BEGIN
+    CREATE TABLE UsuariosTrigramas (
+        campo CHAR(1) NOT NULL,
+        trigrama NVARCHAR(3) NOT NULL,
+        usuario_id INT NOT NULL,
+        CONSTRAINT pk_usuarios_trigramas PRIMARY KEY (campo, trigrama, usuario_id),
+        CONSTRAINT fk_usuarios_trigramas_usuario FOREIGN KEY (usuario_id) REFERENCES Usuarios(id) ON DELETE CASCADE
+    );
+
+    CREATE INDEX idx_usuarios_trigramas_usuario ON UsuariosTrigramas(usuario_id);
+END
+GO
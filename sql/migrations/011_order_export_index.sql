@@ -0,0 +1,20 @@
+-- Migration: Order export index
+-- Purpose: The accounting export filters a fecha_creacion range and walks it in
+--          (fecha_creacion, id) order; covering the exported columns keeps the range scan
+--          on idx_pedido_fecha without key lookups into Pedidos
+
+USE DistribuidoraDB;
+GO
+
+IF EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'idx_pedido_fecha' AND object_id = OBJECT_ID('Pedidos'))
+   AND NOT EXISTS (
+       SELECT 1 FROM sys.index_columns ic
+       JOIN sys.indexes i ON i.object_id = ic.object_id AND i.index_id = ic.index_id
+       WHERE i.name = 'idx_pedido_fecha' AND ic.is_included_column = 1
+   )
+BEGIN
+    CREATE INDEX idx_pedido_fecha ON Pedidos(fecha_creacion)
+        INCLUDE (usuario_id, estado, total)
+        WITH (DROP_EXISTING = ON);
+END
+GO
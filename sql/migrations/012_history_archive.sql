@@ -0,0 +1,76 @@
+-- Migration: Archive tables for cold history
+-- Purpose: Finished orders, estado history and inventory movements older than the archive
+--          horizon are moved here in batches by the API's history-archive job, keeping the
+--          hot tables and their indexes (idx_historial_fecha, idx_inventario_fecha, ...) bounded.
+--          Same columns as the hot tables; ids are preserved, so no IDENTITY and no FKs back to
+--          rows that may themselves be archived.
+
+USE DistribuidoraDB;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'PedidosArchivo')
+BEGIN
+    CREATE TABLE PedidosArchivo (
+        id INT NOT NULL PRIMARY KEY,
+        usuario_id INT NOT NULL,
+        estado NVARCHAR(50) NOT NULL,
+        total DECIMAL(10, 2) NOT NULL DEFAULT 0,
+        direccion_entrega NVARCHAR(500) NOT NULL,
+        telefono_contacto NVARCHAR(20) NOT NULL,
+        nota_especial NVARCHAR(500) NULL,
+        fecha_creacion DATETIME NULL,
+        fecha_actualizacion DATETIME NULL
+    );
+
+    CREATE INDEX idx_pedido_archivo_usuario ON PedidosArchivo(usuario_id);
+    CREATE INDEX idx_pedido_archivo_fecha ON PedidosArchivo(fecha_creacion);
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'PedidoItemsArchivo')
+BEGIN
+    CREATE TABLE PedidoItemsArchivo (
+        id INT NOT NULL PRIMARY KEY,
+        pedido_id INT NOT NULL,
+        producto_id INT NOT NULL,
+        cantidad INT NOT NULL,
+        precio_unitario DECIMAL(10, 2) NOT NULL
+    );
+
+    CREATE INDEX idx_pedidoitem_archivo_pedido ON PedidoItemsArchivo(pedido_id);
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'PedidosHistorialEstadoArchivo')
+BEGIN
+    CREATE TABLE PedidosHistorialEstadoArchivo (
+        id INT NOT NULL PRIMARY KEY,
+        pedido_id INT NOT NULL,
+        estado_anterior NVARCHAR(50) NULL,
+        estado_nuevo NVARCHAR(50) NOT NULL,
+        usuario_id INT NULL,
+        nota NVARCHAR(300) NULL,
+        fecha DATETIME NULL
+    );
+
+    CREATE INDEX idx_historial_archivo_pedido_fecha ON PedidosHistorialEstadoArchivo(pedido_id, fecha);
+END
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.tables WHERE name = 'InventarioHistorialArchivo')
+BEGIN
+    CREATE TABLE InventarioHistorialArchivo (
+        id INT NOT NULL PRIMARY KEY,
+        producto_id INT NOT NULL,
+        cantidad_anterior INT NOT NULL,
+        cantidad_nueva INT NOT NULL,
+        tipo_movimiento NVARCHAR(50) NOT NULL,
+        referencia NVARCHAR(200) NULL,
+        usuario_id INT NULL,
+        fecha DATETIME NULL,
+        journal_id NVARCHAR(32) NULL
+    );
+
+    CREATE INDEX idx_inventario_archivo_producto_fecha ON InventarioHistorialArchivo(producto_id, fecha);
+END
+GO
@@ -0,0 +1,15 @@
+-- Migration: Expiry index for VerificationCodes
+-- Purpose: The API's verification-code-purge job finds users with expired codes through
+--          idx_verif_expira (a range seek instead of a scan of every code ever issued) and then
+--          deletes their expired rows in batches, each DELETE a seek on idx_verif_usuario.
+--          Active codes are checked from the API's in-memory store, so the table only sees one
+--          INSERT per issued code and one UPDATE when it is used.
+
+USE DistribuidoraDB;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'idx_verif_expira' AND object_id = OBJECT_ID('VerificationCodes'))
+BEGIN
+    CREATE INDEX idx_verif_expira ON VerificationCodes(expira_en) INCLUDE (usuario_id);
+END
+GO